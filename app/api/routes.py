@@ -1,16 +1,28 @@
 """
 FastAPI routes for the GitHub PR Review Bot
 """
+import asyncio
+import json
 import logging
-from datetime import datetime
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 
+from ..config.settings import (
+    REVIEWS_PAGE_SIZE, REVIEWS_MAX_PAGE_SIZE, SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE, STATS_TOP_PATHS,
+    GITHUB_WEBHOOK_SECRET, REVIEW_EVENTS_KEEPALIVE_SECONDS
+)
 from ..models.schemas import PRReviewRequest, PRReviewResponse
 from ..services.review_service import ReviewService
-from ..database.operations import DatabaseOperations
+from ..services.job_service import ReviewJobQueue, QueueFullError
+from ..services.webhook_service import WebhookDebouncer, verify_signature
+from ..services.event_service import review_events, ReviewEvent, FINAL_EVENT, LAGGED_EVENT
+from ..database.async_operations import async_db_ops
+from ..prompts.prompt_loader import prompt_loader
 from ..utils.github_utils import parse_github_url
+from ..utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -20,7 +32,11 @@ templates = Jinja2Templates(directory="app/templates")
 
 # Initialize services
 review_service = ReviewService()
-db_ops = DatabaseOperations()
+review_queue = ReviewJobQueue(review_service)
+webhook_debouncer = WebhookDebouncer(review_queue)
+db_ops = async_db_ops
+
+WEBHOOK_PR_ACTIONS = ("opened", "synchronize")
 
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -37,9 +53,9 @@ async def review_page(request: Request, review_id: int):
     """Comments page to view comments for a review"""
     return templates.TemplateResponse("review-details.html", {"request": request})
 
-@router.post("/review", response_model=PRReviewResponse)
+@router.post("/review", response_model=PRReviewResponse, status_code=202)
 async def review_pr(request: PRReviewRequest):
-    """Review a GitHub PR"""
+    """Queue a GitHub PR for review and return its review_id immediately; concurrent submissions of the same head share one review"""
     logger.info(f"Received review request for: {request.pr_url}")
     
     # Validate URL format
@@ -48,39 +64,185 @@ async def review_pr(request: PRReviewRequest):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     
-    # Process review
-    result = await review_service.process_pr_review(request.pr_url)
-    
-    if result["status"] == "failed":
-        raise HTTPException(status_code=500, detail=result["message"])
-    elif result["status"] == "invalid":
-        raise HTTPException(status_code=400, detail=result["message"])
+    # Queue review; workers move it through running/completed/failed
+    try:
+        review_id, created = await review_queue.submit(request.pr_url, incremental=request.incremental)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     
+    if not created:
+        return PRReviewResponse(
+            status="in_progress",
+            message="A review of this PR head is already in progress",
+            review_id=review_id
+        )
     return PRReviewResponse(
-        status=result["status"],
-        message=result["message"],
-        review_id=result.get("review_id")
+        status="queued",
+        message="Review queued",
+        review_id=review_id
     )
 
+@router.post("/webhook/github", status_code=202)
+async def github_webhook(request: Request):
+    """Accept signed pull_request opened/synchronize deliveries and schedule a debounced review"""
+    if not GITHUB_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Webhook secret is not configured")
+    
+    body = await request.body()
+    if not verify_signature(GITHUB_WEBHOOK_SECRET, body, request.headers.get("X-Hub-Signature-256")):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    
+    event = request.headers.get("X-GitHub-Event")
+    if event == "ping":
+        return {"status": "pong"}
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    
+    action = payload.get("action")
+    if event != "pull_request" or action not in WEBHOOK_PR_ACTIONS:
+        return {"status": "ignored", "message": f"Ignoring {event} {action or ''}".strip()}
+    
+    pull_request = payload.get("pull_request") or {}
+    try:
+        pr_url = pull_request["html_url"]
+        head_sha = pull_request["head"]["sha"]
+        repo_name, pr_number = parse_github_url(pr_url)
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed pull_request payload: {e}")
+    
+    # A newly opened PR gets a full review; pushes only need the files changed since the last one
+    delay = webhook_debouncer.schedule(pr_url, repo_name, pr_number, head_sha, full_review=action == "opened")
+    logger.info(f"Webhook {action} for {repo_name}#{pr_number} at {head_sha[:7]}, review in {delay:.0f}s")
+    return {"status": "scheduled", "message": f"Review of {repo_name}#{pr_number} scheduled", "delay_seconds": round(delay, 1)}
+
+@router.get("/api/webhook/stats")
+async def get_webhook_stats():
+    """Webhook deliveries received, coalesced into pending reviews and submitted"""
+    return webhook_debouncer.stats()
+
+@router.get("/api/queue/stats")
+async def get_queue_stats():
+    """Review jobs ready, delayed for retry, leased by a worker, with an expired lease, or given up on"""
+    return await review_queue.stats()
+
 @router.get("/api/reviews")
-async def get_reviews():
-    """Get recent reviews"""
-    reviews = db_ops.get_recent_reviews()
-    return {"reviews": reviews}
+async def get_reviews(
+    limit: int = Query(REVIEWS_PAGE_SIZE, ge=1, le=REVIEWS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    repo: Optional[str] = None,
+    status: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None
+):
+    """Get reviews newest first; pass next_cursor back as cursor to get the following page"""
+    try:
+        return await db_ops.get_reviews_page(
+            limit,
+            cursor,
+            repo,
+            status,
+            _to_db_timestamp(created_after),
+            _to_db_timestamp(created_before)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+def _to_db_timestamp(value: Optional[str]) -> Optional[str]:
+    """Convert an ISO date/datetime to SQLite's CURRENT_TIMESTAMP format (UTC) so it compares with created_at"""
+    if not value:
+        return None
+    try:
+        value = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime("%Y-%m-%d %H:%M:%S")
 
 @router.get("/api/review/{review_id}")
 async def get_review_details(review_id: int):
     """Get review details by ID"""
-    review = db_ops.get_review_details(review_id)
+    review = await db_ops.get_review_details(review_id)
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
+    review["usage"] = await db_ops.get_review_usage(review_id)
+    review["skipped_files"] = await db_ops.get_skipped_files(review_id)
     return review
 
+@router.get("/api/review/{review_id}/events")
+async def stream_review_events(review_id: int, request: Request):
+    """Server-Sent Events: stage transitions, per-file results and posted comments of a review as they happen"""
+    try:
+        last_event_id = int(request.headers.get("Last-Event-ID", "0"))
+    except ValueError:
+        last_event_id = 0
+    
+    # Subscribe before reading the status, so an event published in between is not missed
+    queue = review_events.subscribe(review_id, last_event_id)
+    review = await db_ops.get_review_details(review_id)
+    if not review:
+        review_events.unsubscribe(review_id, queue)
+        raise HTTPException(status_code=404, detail="Review not found")
+    
+    def final_event(review: dict) -> ReviewEvent:
+        """The done event of a review that finished, read from its stored record"""
+        return ReviewEvent(0, FINAL_EVENT, {
+            "status": review["status"],
+            "message": review["error_message"],
+            "comments_count": review["comments_added"]
+        })
+    
+    async def stream():
+        try:
+            status = review["status"]
+            yield ReviewEvent(0, "status", {"status": status}).encode()
+            if status not in ("queued", "running") and queue.empty():
+                # Finished before this process buffered any events (or processed by another process)
+                yield final_event(review).encode()
+                return
+            while True:
+                try:
+                    review_event = await asyncio.wait_for(queue.get(), REVIEW_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Reviews run by worker.py publish their events in that process; follow them through the database
+                    current = await db_ops.get_review_details(review_id)
+                    if current and queue.empty():
+                        if current["status"] not in ("queued", "running"):
+                            yield final_event(current).encode()
+                            return
+                        if current["status"] != status:
+                            status = current["status"]
+                            yield ReviewEvent(0, "status", {"status": status}).encode()
+                            continue
+                    yield ": keepalive\n\n"
+                    continue
+                if review_event.event == "status":
+                    status = review_event.data.get("status", status)
+                yield review_event.encode()
+                if review_event.event in (FINAL_EVENT, LAGGED_EVENT):
+                    return
+        finally:
+            review_events.unsubscribe(review_id, queue)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/api/usage")
+async def get_usage_summary(days: int = 7, top: int = 10):
+    """Get aggregate token, latency and GitHub call usage for recent reviews"""
+    if days < 1 or top < 1:
+        raise HTTPException(status_code=400, detail="days and top must be positive")
+    return await db_ops.get_usage_summary(days, top)
+
 @router.get("/api/comments/{review_id}")
 async def get_comments(review_id: int):
     """Get comments for a review"""
-    comments = db_ops.get_comments_for_review(review_id)
+    comments = await db_ops.get_comments_for_review(review_id)
     return {"comments": [
         {
             "file_path": comment.file_path,
@@ -90,17 +252,110 @@ async def get_comments(review_id: int):
         for comment in comments
     ]}
 
+@router.get("/api/search")
+async def search_comments(
+    q: str,
+    repo: Optional[str] = None,
+    path: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=SEARCH_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0)
+):
+    """Full-text search over review comments, ranked by relevance"""
+    try:
+        results = await db_ops.search_comments(
+            q,
+            repo,
+            path,
+            _to_db_timestamp(created_after),
+            _to_db_timestamp(created_before),
+            limit,
+            offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"query": q, "results": results}
+
+@router.get("/api/stats")
+async def get_repo_stats(repo: Optional[str] = None, top_paths: int = Query(STATS_TOP_PATHS, ge=0, le=100)):
+    """Per-repository review volume, failure rate, latency and most commented paths"""
+    repos = await db_ops.get_repo_stats(repo, top_paths)
+    if repo and not repos:
+        raise HTTPException(status_code=404, detail="No reviews for this repository")
+    return {"repos": repos}
+
+@router.get("/api/cache/stats")
+async def get_cache_stats():
+    """Get LLM result cache statistics"""
+    cache = review_service.ai_service.cache
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **await db_ops.read(cache.stats)}
+
+@router.get("/api/github/rate-limit")
+async def get_github_rate_limit():
+    """Get the shared GitHub rate limiter state"""
+    limiter = review_service.github_service.api.limiter
+    if limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **await db_ops.read(limiter.status)}
+
+@router.get("/api/db/stats")
+async def get_database_stats():
+    """Get database operation timings for this process"""
+    return db_ops.stats()
 
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Pipeline stage latencies, errors, retries, tokens, queue depth and in-flight counts in the Prometheus text format"""
+    await review_queue.refresh_queue_depth()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.post("/admin/clear-llm-cache")
+async def clear_llm_cache():
+    """Remove all cached LLM results"""
+    cache = review_service.ai_service.cache
+    if cache is not None:
+        await db_ops.write(cache.clear)
+    return {"status": "success", "message": "LLM cache cleared"}
+
+@router.post("/admin/clear-github-cache")
+async def clear_github_cache():
+    """Remove all cached GitHub API responses"""
+    cache = review_service.github_service.api.cache
+    if cache is not None:
+        await db_ops.write(cache.clear)
+    return {"status": "success", "message": "GitHub HTTP cache cleared"}
+
+@router.post("/admin/rebuild-search-index")
+async def rebuild_search_index():
+    """Rebuild the full-text index of review comments"""
+    indexed = await db_ops.rebuild_search_index()
+    return {"status": "success", "message": f"Indexed {indexed} comments"}
+
+@router.post("/admin/backfill-stats")
+async def backfill_stats():
+    """Recompute per-repository analytics from stored reviews"""
+    repos = await db_ops.backfill_stats()
+    return {"status": "success", "message": f"Recomputed stats for {repos} repositories"}
+
+@router.post("/admin/reload-prompts")
+async def reload_prompts():
+    """Re-read prompt templates from disk; reviews already running keep the prompts they started with"""
+    cleared = prompt_loader.reload()
+    return {"status": "success", "message": f"Dropped {cleared} cached prompt templates"}
+
 @router.post("/admin/fix-database")
 async def fix_database():
     """Fix/repair database issues"""
     try:
-        success = db_ops.fix_database()
+        success = await db_ops.fix_database()
         if success:
             return {"status": "success", "message": "Database fixed successfully"}
         else:
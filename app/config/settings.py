@@ -8,12 +8,112 @@ from dotenv import load_dotenv
 # AI Model Configuration
 MODEL = "gpt-4o-mini"  # gpt-4o-mini, gpt-4o, gpt-4
 
+# AI Analysis Configuration
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "8"))  # Parallel LLM requests per review
+AI_REQUEST_TIMEOUT = 120  # Seconds per LLM request
+MODEL_CONTEXT_WINDOWS = {  # Context window in tokens per model
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4": 8192,
+}
+AI_PATCH_CONTEXT_FRACTION = 0.25  # Share of the context window one patch chunk may use
+AI_CHUNK_CONTEXT_LINES = 3  # Lines of surrounding context carried into split hunks
+AI_BATCH_SMALL_FILE_TOKENS = 400  # Patches up to this size are packed into multi-file requests
+AI_BATCH_MAX_TOKENS = 3000  # Patch tokens per multi-file request
+AI_BATCH_MAX_FILES = 12  # Files per multi-file request
+AI_PIPELINE_WINDOW = 16  # Chunks/batches queued or running per review before file fetching pauses
+AI_FILE_PREFETCH = 8  # PR files fetched ahead of analysis
+AI_STREAMING = os.getenv("AI_STREAMING", "true").lower() == "true"  # Parse comments from the completion as it streams in
+AI_MAX_COMMENTS_PER_FILE = 10  # Comments kept per file from one LLM request; a streamed completion is cut off at the cap
+PROMPT_RELOAD_INTERVAL = 2.0  # Seconds between prompt file mtime checks; edited templates apply to reviews started afterwards
+
+# File Filter Rules Configuration (applied before files reach the model)
+FILE_RULES_ENABLED = os.getenv("FILE_RULES_ENABLED", "true").lower() == "true"
+FILE_RULES_FILE = os.getenv("FILE_RULES_FILE", "file_rules.json")  # Per-repository overrides, re-read when the file changes
+FILE_RULES_RELOAD_INTERVAL = 2.0  # Seconds between rules file mtime checks
+FILE_RULES_IGNORE = (  # Paths never reviewed; patterns without "/" match the file name in any directory
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb", "poetry.lock",
+    "Pipfile.lock", "uv.lock", "Cargo.lock", "Gemfile.lock", "composer.lock", "go.sum", "*.min.js", "*.min.css",
+    "*.map", "*.snap", "*_pb2.py", "*_pb2_grpc.py", "*.pb.go", "**/__snapshots__/**", "**/node_modules/**",
+    "**/vendor/**", "**/third_party/**", "**/dist/**",
+)
+FILE_RULES_GENERATED_MARKERS = (  # Case-insensitive markers of generated code near the top of a file
+    "@generated", "do not edit", "code generated by", "autogenerated", "auto-generated",
+)
+FILE_RULES_MARKER_LINES = 10  # Leading lines of a file searched for generated-code markers
+FILE_RULES_MAX_PATCH_CHARS = 0  # Patches larger than this are skipped instead of chunked; 0 disables the limit
+FILE_RULES_MIN_HEURISTIC_CHARS = 2000  # Added text shorter than this is never judged minified or encoded
+FILE_RULES_MAX_AVG_LINE_LENGTH = 300  # Added lines longer than this on average indicate minified or bundled code
+FILE_RULES_MAX_ENTROPY = 5.5  # Bits per byte of added UTF-8 text; code and prose in any script sit below 5.2, base64 data near 6
+FILE_RULES_SKIP_WHITESPACE = True  # Drop hunks that only change whitespace; files left with no hunks are skipped
+FILE_RULES_INDENT_SENSITIVE = ("*.py", "*.pyi", "*.yml", "*.yaml", "Makefile", "*.mk")  # Re-indenting these is not whitespace-only
+
 # Environment Variables
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# GitHub API Configuration
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GITHUB_REQUEST_TIMEOUT = 30  # Seconds per GitHub API request
+GITHUB_PER_PAGE = 100  # Items per page for paginated reads (GitHub maximum)
+GITHUB_HTTP_CACHE_ENABLED = os.getenv("GITHUB_HTTP_CACHE_ENABLED", "true").lower() == "true"
+GITHUB_HTTP_CACHE_MAX_ENTRIES = 20000  # Least recently used URLs beyond this are evicted
+
+# GitHub Rate Limit Scheduling (shared by all processes using DB_FILE)
+GITHUB_RATE_LIMIT_ENABLED = os.getenv("GITHUB_RATE_LIMIT_ENABLED", "true").lower() == "true"
+GITHUB_RATE_LIMIT_DB_FILE = "github_rate_limits.db"  # Limiter state, updated on every request, kept out of DB_FILE's write lock
+GITHUB_REQUESTS_PER_SECOND = 5.0  # Token bucket refill rate per token
+GITHUB_BURST = 20  # Token bucket capacity
+GITHUB_LOW_PRIORITY_HEADROOM = 10  # Bucket tokens kept for in-flight reviews when starting new ones
+GITHUB_RATE_LIMIT_RESERVE = 200  # Hourly quota kept for in-flight reviews; new reviews wait for reset below this
+GITHUB_MAX_RATE_LIMIT_WAIT = 900  # Seconds a request may wait for quota before failing
+GITHUB_RATE_LIMIT_MAX_RETRIES = 3  # Retries after a primary/secondary rate limit response
+
+# LLM Result Cache Configuration
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600  # Entries older than this are treated as misses
+LLM_CACHE_MAX_ENTRIES = 50000  # Least recently used entries beyond this are evicted
+
+# Review Job Configuration
+REVIEW_WORKERS = int(os.getenv("REVIEW_WORKERS", "4"))  # Concurrent reviews per process; 0 leaves reviews to worker.py
+REVIEW_QUEUE_MAXSIZE = 100  # Pending reviews before /review rejects new submissions
+REVIEW_QUEUE_BACKEND = os.getenv("REVIEW_QUEUE_BACKEND", "sqlite")  # Durable job store shared by the API and worker.py processes
+REVIEW_JOB_LEASE_SECONDS = 120  # A claimed job is reclaimed by another worker if not heartbeated within this time
+REVIEW_JOB_HEARTBEAT_SECONDS = 30  # How often a worker extends the lease of the job it is running
+REVIEW_JOB_MAX_ATTEMPTS = 3  # Attempts before a review is recorded as failed
+REVIEW_JOB_RETRY_BACKOFF_SECONDS = 30  # Delay before the first retry, doubled on each further attempt
+REVIEW_JOB_RETRY_MAX_BACKOFF_SECONDS = 600  # Upper bound on the retry delay
+REVIEW_JOB_POLL_SECONDS = 1.0  # How often idle workers check for jobs submitted by other processes
+REVIEW_SUBMIT_HEAD_SHA_TIMEOUT = 5.0  # Seconds /review waits for the PR's head SHA; without it the review is not deduplicated
+REVIEW_ORPHAN_GRACE_SECONDS = 60  # Queued/running reviews without a job are failed on startup once this old
+
+# Review Progress Events Configuration
+REVIEW_EVENTS_HISTORY = 1000  # Events kept per review and replayed to subscribers that connect late or reconnect
+REVIEW_EVENTS_RETENTION_SECONDS = 300  # How long events of a review stay available after its last event
+REVIEW_EVENTS_SUBSCRIBER_QUEUE = 1000  # Undelivered events per subscriber before it is disconnected
+REVIEW_EVENTS_KEEPALIVE_SECONDS = 15  # Idle streams get a comment line this often so proxies keep them open
+
+# GitHub Webhook Configuration
+GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")  # /webhook/github rejects all deliveries when unset
+WEBHOOK_DEBOUNCE_SECONDS = float(os.getenv("WEBHOOK_DEBOUNCE_SECONDS", "60"))  # Quiet period after the last push before a PR is reviewed
+WEBHOOK_DEBOUNCE_MAX_SECONDS = 300  # Longest a continuously pushed PR waits for its review
+
 # Database Configuration
 DB_FILE = "pr_reviews.db"
+DB_BUSY_TIMEOUT = 30  # Seconds to wait for a lock held by another connection
+DB_CACHE_SIZE_KB = 16384  # Page cache per connection
+DB_MMAP_SIZE = 256 * 1024 * 1024  # Bytes of the database file read through mmap
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))  # Threads serving reads for async callers; writes use one dedicated thread
+DB_SLOW_QUERY_MS = 200  # Database operations slower than this are logged
+REVIEWS_PAGE_SIZE = 20  # Reviews per page of /api/reviews
+REVIEWS_MAX_PAGE_SIZE = 100  # Largest page a client may request
+SEARCH_PAGE_SIZE = 20  # Results per page of /api/search
+SEARCH_MAX_PAGE_SIZE = 100  # Largest search page a client may request
+STATS_TOP_PATHS = 10  # Most commented paths listed per repository by /api/stats
+
+# Metrics Configuration
+METRICS_NAMESPACE = "pr_review_bot"  # Prefix of metric names exposed at /metrics
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)  # Histogram bucket bounds in seconds
 
 # Application Settings
 APP_TITLE = "GitHub PR Review Bot"
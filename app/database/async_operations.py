@@ -0,0 +1,224 @@
+"""
+Async access to database operations without blocking the event loop
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..config.settings import DB_READ_POOL_SIZE, DB_SLOW_QUERY_MS
+from ..database.operations import DatabaseOperations
+from ..models.database import ReviewComment
+from ..utils.metrics import DB_OPERATION_DURATION
+
+logger = logging.getLogger(__name__)
+
+class AsyncDatabaseOperations:
+    """Run DatabaseOperations on dedicated threads: a pool for reads and a single writer thread"""
+    
+    def __init__(self, read_pool_size: int = DB_READ_POOL_SIZE, slow_query_ms: float = DB_SLOW_QUERY_MS):
+        """Initialize settings and timing counters; executors start on first use"""
+        self.read_pool_size = max(1, read_pool_size)
+        self.slow_query_ms = slow_query_ms
+        self._timings: Dict[str, List[float]] = {}  # name -> [calls, wait_ms, run_ms, max_run_ms]
+        self._lock = threading.Lock()
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+        self._write_executor: Optional[ThreadPoolExecutor] = None
+    
+    def _executor(self, write: bool) -> ThreadPoolExecutor:
+        """Return the read pool or the writer thread, starting it if needed"""
+        with self._lock:
+            if self._read_executor is None:
+                self._read_executor = ThreadPoolExecutor(max_workers=self.read_pool_size, thread_name_prefix="db-read")
+                # SQLite allows one writer at a time; queueing writes on one thread keeps them from
+                # tying up the read threads while they wait for the write lock
+                self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+            return self._write_executor if write else self._read_executor
+    
+    async def read(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking read on the read pool"""
+        return await self._run(self._executor(write=False), func, args, kwargs)
+    
+    async def write(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking write on the writer thread"""
+        return await self._run(self._executor(write=True), func, args, kwargs)
+    
+    def write_nowait(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Queue a blocking write on the writer thread without waiting for it; callable from any thread"""
+        future = self._executor(write=True).submit(self._timed(func, args, kwargs))
+        future.add_done_callback(self._log_failure)
+        return future
+    
+    async def _run(self, executor: ThreadPoolExecutor, func: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        """Execute func on executor, recording queue wait and run time"""
+        return await asyncio.get_running_loop().run_in_executor(executor, self._timed(func, args, kwargs))
+    
+    def _timed(self, func: Callable[..., Any], args: tuple, kwargs: dict) -> Callable[[], Any]:
+        """Wrap func so that its queue wait and run time are recorded, counting the wait from now"""
+        queued = time.perf_counter()
+        
+        def timed_call():
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._record(func.__name__, (started - queued) * 1000, (time.perf_counter() - started) * 1000)
+        
+        return timed_call
+    
+    @staticmethod
+    def _log_failure(future: Future):
+        """Log the error of a queued write nobody waits for"""
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Queued database write failed: {future.exception()}")
+    
+    def _record(self, name: str, wait_ms: float, run_ms: float):
+        """Update timing counters for an operation"""
+        DB_OPERATION_DURATION.observe(run_ms / 1000, operation=name)
+        if run_ms > self.slow_query_ms:
+            logger.warning(f"Slow database operation {name}: {run_ms:.0f}ms (waited {wait_ms:.0f}ms)")
+        with self._lock:
+            timing = self._timings.setdefault(name, [0, 0.0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += wait_ms
+            timing[2] += run_ms
+            timing[3] = max(timing[3], run_ms)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Per-operation call counts and timings for this process"""
+        with self._lock:
+            timings = {name: list(timing) for name, timing in self._timings.items()}
+        return {
+            "read_pool_size": self.read_pool_size,
+            "slow_query_ms": self.slow_query_ms,
+            "operations": {
+                name: {
+                    "calls": calls,
+                    "avg_wait_ms": round(wait_ms / calls, 2),
+                    "avg_ms": round(run_ms / calls, 2),
+                    "max_ms": round(max_run_ms, 2)
+                }
+                for name, (calls, wait_ms, run_ms, max_run_ms) in sorted(timings.items())
+            }
+        }
+    
+    def shutdown(self):
+        """Wait for pending operations and stop the executor threads"""
+        with self._lock:
+            executors = [self._read_executor, self._write_executor]
+            self._read_executor = self._write_executor = None
+        for executor in executors:
+            if executor is not None:
+                executor.shutdown(wait=True)
+    
+    async def init_database(self):
+        """Initialize SQLite database"""
+        await self.write(DatabaseOperations.init_database)
+    
+    async def fix_database(self) -> bool:
+        """Fix/repair database by recreating tables if needed"""
+        return await self.write(DatabaseOperations.fix_database)
+    
+    async def create_review(self, pr_url: str, repo_name: str, pr_number: int, status: str = "queued") -> int:
+        """Insert a review record before processing starts"""
+        return await self.write(DatabaseOperations.create_review, pr_url, repo_name, pr_number, status)
+    
+    async def create_or_attach_review(
+        self,
+        pr_url: str,
+        repo_name: str,
+        pr_number: int,
+        head_sha: Optional[str],
+        status: str = "queued"
+    ) -> Tuple[int, bool]:
+        """Insert a review of a PR head unless one is already in flight"""
+        return await self.write(DatabaseOperations.create_or_attach_review, pr_url, repo_name, pr_number, head_sha, status)
+    
+    async def get_active_review(self, repo_name: str, pr_number: int, head_sha: Optional[str]) -> Optional[int]:
+        """Get the queued/running review of a PR head"""
+        return await self.read(DatabaseOperations.get_active_review, repo_name, pr_number, head_sha)
+    
+    async def update_review_status(self, review_id: int, status: str):
+        """Update the status of an in-progress review"""
+        await self.write(DatabaseOperations.update_review_status, review_id, status)
+    
+    async def fail_interrupted_reviews(self, grace_seconds: float = 0) -> int:
+        """Mark queued/running reviews that no longer have a live job as failed"""
+        return await self.write(DatabaseOperations.fail_interrupted_reviews, grace_seconds)
+    
+    async def store_review_data(self, *args: Any, **kwargs: Any) -> int:
+        """Store review data in database (same arguments as DatabaseOperations.store_review_data)"""
+        return await self.write(DatabaseOperations.store_review_data, *args, **kwargs)
+    
+    async def get_review_usage(self, review_id: int) -> Optional[dict]:
+        """Get token, latency and API call telemetry for a review"""
+        return await self.read(DatabaseOperations.get_review_usage, review_id)
+    
+    async def get_skipped_files(self, review_id: int) -> List[dict]:
+        """Get the files of a review that were not sent to the model, with the rule that skipped each"""
+        return await self.read(DatabaseOperations.get_skipped_files, review_id)
+    
+    async def get_usage_summary(self, days: int = 7, top: int = 10) -> dict:
+        """Aggregate telemetry over recently completed reviews"""
+        return await self.read(DatabaseOperations.get_usage_summary, days, top)
+    
+    async def get_last_reviewed_head(self, repo_name: str, pr_number: int) -> Optional[dict]:
+        """Get the head SHA and per-file blob SHAs of the latest completed review of a PR"""
+        return await self.read(DatabaseOperations.get_last_reviewed_head, repo_name, pr_number)
+    
+    async def get_recent_reviews(self, limit: int = 20) -> List[dict]:
+        """Get recent reviews from database"""
+        return await self.read(DatabaseOperations.get_recent_reviews, limit)
+    
+    async def get_reviews_page(
+        self,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        repo_name: Optional[str] = None,
+        status: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None
+    ) -> dict:
+        """Get one page of reviews, newest first, continuing after cursor"""
+        return await self.read(
+            DatabaseOperations.get_reviews_page, limit, cursor, repo_name, status, created_after, created_before
+        )
+    
+    async def get_comments_for_review(self, review_id: int) -> List[ReviewComment]:
+        """Get comments for a review"""
+        return await self.read(DatabaseOperations.get_comments_for_review, review_id)
+    
+    async def get_review_details(self, review_id: int) -> Optional[dict]:
+        """Get review details by ID"""
+        return await self.read(DatabaseOperations.get_review_details, review_id)
+    
+    async def search_comments(
+        self,
+        query: str,
+        repo_name: Optional[str] = None,
+        path: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[dict]:
+        """Full-text search over review comments"""
+        return await self.read(
+            DatabaseOperations.search_comments, query, repo_name, path, created_after, created_before, limit, offset
+        )
+    
+    async def rebuild_search_index(self) -> int:
+        """Rebuild the full-text index of review comments"""
+        return await self.write(DatabaseOperations.rebuild_search_index)
+    
+    async def get_repo_stats(self, repo_name: Optional[str] = None, top_paths: int = 10) -> List[dict]:
+        """Get per-repository analytics from the summary tables"""
+        return await self.read(DatabaseOperations.get_repo_stats, repo_name, top_paths)
+    
+    async def backfill_stats(self) -> int:
+        """Recompute the per-repository summary tables"""
+        return await self.write(DatabaseOperations.backfill_stats)
+
+async_db_ops = AsyncDatabaseOperations()
@@ -0,0 +1,134 @@
+"""
+Shared SQLite connections with WAL journaling and tuned pragmas
+"""
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from ..config.settings import DB_FILE, DB_BUSY_TIMEOUT, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+
+logger = logging.getLogger(__name__)
+
+class ConnectionPool:
+    """One persistent connection per thread, opened on first use and reused by every operation"""
+    
+    def __init__(self, db_file: str = DB_FILE):
+        """Initialize pool state"""
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._reset()
+    
+    def _reset(self):
+        """Forget all connections (after close_all or in a forked child)"""
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._pid = os.getpid()
+        self._generation = 0  # Bumped by reopen(); connections opened under an older value are replaced
+    
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it if needed"""
+        if self._pid != os.getpid():
+            # SQLite handles must not be shared across fork; the parent keeps using its own
+            with self._lock:
+                self._reset()
+        
+        conn = getattr(self._local, "connection", None)
+        if conn is not None and self._local.generation != self._generation and not conn.in_transaction:
+            # The database file was replaced since this thread connected
+            self._discard(conn)
+            conn = None
+        if conn is None:
+            conn = self._open()
+            self._local.connection = conn
+            self._local.generation = self._generation
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _open(self) -> sqlite3.Connection:
+        """Open a connection in autocommit mode with WAL and performance pragmas"""
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=DB_BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False
+        )
+        # WAL lets readers proceed while a writer commits; NORMAL sync is durable in WAL mode except on power loss
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
+    @contextmanager
+    def transaction(self, immediate: bool = False) -> Iterator[sqlite3.Cursor]:
+        """Run statements in one transaction, committing on success and rolling back on error"""
+        conn = self.connection()
+        cursor = conn.cursor()
+        if conn.in_transaction:
+            # Nested use joins the outer transaction
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+            return
+        
+        # IMMEDIATE takes the write lock up front so read-modify-write sequences cannot interleave
+        cursor.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield cursor
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            cursor.close()
+    
+    @contextmanager
+    def cursor(self) -> Iterator[sqlite3.Cursor]:
+        """Cursor for reads outside an explicit transaction"""
+        cursor = self.connection().cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+    
+    def reopen(self):
+        """Make every thread reconnect: the caller's connection is closed now, other threads' on their next use"""
+        # Other threads may be mid-query, so their connections are not closed from here
+        with self._lock:
+            self._generation += 1
+        conn = getattr(self._local, "connection", None)
+        if conn is not None:
+            self._discard(conn)
+    
+    def _discard(self, conn: sqlite3.Connection):
+        """Close and forget the calling thread's connection"""
+        self._local.connection = None
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Error closing database connection: {e}")
+    
+    def close_all(self):
+        """Close every pooled connection; threads reopen on next use"""
+        with self._lock:
+            connections = self._connections
+            self._reset()
+        for conn in connections:
+            try:
+                # Refresh planner statistics where they are missing or stale, as SQLite recommends before closing
+                conn.execute("PRAGMA optimize")
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Error closing database connection: {e}")
+
+connection_pool = ConnectionPool()
@@ -0,0 +1,82 @@
+"""
+Persistent cache of GitHub API responses for conditional requests
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from ..config.settings import GITHUB_HTTP_CACHE_MAX_ENTRIES
+from ..database.async_operations import async_db_ops
+from ..database.connection import connection_pool
+
+logger = logging.getLogger(__name__)
+
+class GitHubHTTPCache:
+    """Store response bodies with their ETag/Last-Modified validators per URL"""
+
+    # Run eviction every N writes rather than on every insert
+    EVICTION_INTERVAL = 200
+
+    def __init__(self, max_entries: int = GITHUB_HTTP_CACHE_MAX_ENTRIES):
+        """Initialize cache limits"""
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return cached entry for url with its validators, or None"""
+        with connection_pool.cursor() as cursor:
+            cursor.execute(
+                "SELECT etag, last_modified, link, body FROM github_http_cache WHERE url = ?",
+                (url,)
+            )
+            row = cursor.fetchone()
+
+        if not row:
+            return None
+        return {
+            "etag": row[0],
+            "last_modified": row[1],
+            "link": row[2],
+            "body": row[3]
+        }
+
+    def touch(self, url: str):
+        """Mark an entry as revalidated (after a 304); the update is queued on the database writer thread"""
+        async_db_ops.write_nowait(self._touch, url, time.time())
+
+    @staticmethod
+    def _touch(url: str, now: float):
+        """Update the LRU timestamp of an entry"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("UPDATE github_http_cache SET last_accessed = ? WHERE url = ?", (now, url))
+
+    def set(self, url: str, body: str, etag: Optional[str], last_modified: Optional[str], link: Optional[str]):
+        """Store a response that carries a validator"""
+        now = time.time()
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.EVICTION_INTERVAL == 0
+
+        with connection_pool.transaction() as cursor:
+            cursor.execute("""
+                INSERT OR REPLACE INTO github_http_cache (url, etag, last_modified, link, body, fetched_at, last_accessed)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (url, etag, last_modified, link, body, now, now))
+            
+            if evict:
+                cursor.execute("""
+                    DELETE FROM github_http_cache WHERE url IN (
+                        SELECT url FROM github_http_cache
+                        ORDER BY last_accessed DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+                if cursor.rowcount:
+                    logger.info(f"GitHub HTTP cache evicted {cursor.rowcount} entries")
+
+    def clear(self):
+        """Remove all cached responses"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("DELETE FROM github_http_cache")
@@ -0,0 +1,186 @@
+"""
+Durable review job queue with leases, shared by the API and worker processes
+"""
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+from ..config.settings import REVIEW_QUEUE_BACKEND
+from ..database.connection import connection_pool
+from ..models.database import ReviewJob
+
+logger = logging.getLogger(__name__)
+
+class ReviewJobBackend(ABC):
+    """Storage for review jobs; a worker leases a job and must heartbeat it until it completes"""
+    
+    @abstractmethod
+    def enqueue(self, review_id: int, pr_url: str, incremental: bool, max_attempts: int) -> int:
+        """Add a job that is ready immediately; returns the job id"""
+    
+    @abstractmethod
+    def claim(self, owner: str, lease_seconds: float) -> Optional[ReviewJob]:
+        """Lease the oldest ready job, or one whose previous owner stopped heartbeating"""
+    
+    @abstractmethod
+    def heartbeat(self, job_id: int, owner: str, lease_seconds: float) -> bool:
+        """Extend a lease; False if the job is no longer leased by owner"""
+    
+    @abstractmethod
+    def complete(self, job_id: int, owner: str) -> bool:
+        """Remove a finished job"""
+    
+    @abstractmethod
+    def retry(self, job_id: int, owner: str, error: str, delay_seconds: float) -> bool:
+        """Return a failed job to the queue, ready again after delay_seconds"""
+    
+    @abstractmethod
+    def release(self, job_id: int, owner: str) -> bool:
+        """Return an unfinished job to the queue without counting the attempt"""
+    
+    @abstractmethod
+    def bury(self, job_id: int, owner: str, error: str) -> bool:
+        """Mark a job as dead so it is never claimed again"""
+    
+    @abstractmethod
+    def depth(self) -> int:
+        """Number of jobs waiting to be claimed, including delayed retries"""
+    
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Job counts by state"""
+
+class SQLiteReviewJobBackend(ReviewJobBackend):
+    """Review jobs in the review_jobs table of DB_FILE, for processes on hosts sharing that file"""
+    
+    def enqueue(self, review_id: int, pr_url: str, incremental: bool, max_attempts: int) -> int:
+        """Add a job that is ready immediately; returns the job id"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO review_jobs (review_id, pr_url, incremental, max_attempts, available_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (review_id, pr_url, int(incremental), max_attempts, time.time()))
+            return cursor.lastrowid
+    
+    def claim(self, owner: str, lease_seconds: float) -> Optional[ReviewJob]:
+        """Lease the oldest ready job, or one whose previous owner stopped heartbeating"""
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers cannot pick the same row
+        with connection_pool.transaction(immediate=True) as cursor:
+            # Jobs of crashed workers go first: they have waited longest
+            cursor.execute("""
+                SELECT id FROM review_jobs
+                WHERE status = 'leased' AND lease_expires_at < ?
+                ORDER BY lease_expires_at LIMIT 1
+            """, (now,))
+            row = cursor.fetchone()
+            if row:
+                logger.warning(f"Reclaiming review job {row[0]} after its lease expired")
+            else:
+                cursor.execute("""
+                    SELECT id FROM review_jobs
+                    WHERE status = 'queued' AND available_at <= ?
+                    ORDER BY available_at, id LIMIT 1
+                """, (now,))
+                row = cursor.fetchone()
+            if not row:
+                return None
+            
+            cursor.execute("""
+                UPDATE review_jobs
+                SET status = 'leased', lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1
+                WHERE id = ?
+            """, (owner, now + lease_seconds, row[0]))
+            cursor.execute("""
+                SELECT id, review_id, pr_url, incremental, attempts, max_attempts, lease_owner, last_error
+                FROM review_jobs WHERE id = ?
+            """, (row[0],))
+            job = cursor.fetchone()
+        
+        return ReviewJob(
+            id=job[0], review_id=job[1], pr_url=job[2], incremental=bool(job[3]),
+            attempts=job[4], max_attempts=job[5], lease_owner=job[6], last_error=job[7]
+        )
+    
+    def heartbeat(self, job_id: int, owner: str, lease_seconds: float) -> bool:
+        """Extend a lease; False if the job is no longer leased by owner"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("""
+                UPDATE review_jobs SET lease_expires_at = ?
+                WHERE id = ? AND lease_owner = ? AND status = 'leased'
+            """, (time.time() + lease_seconds, job_id, owner))
+            return cursor.rowcount == 1
+    
+    def complete(self, job_id: int, owner: str) -> bool:
+        """Remove a finished job"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM review_jobs WHERE id = ? AND lease_owner = ? AND status = 'leased'", (job_id, owner)
+            )
+            return cursor.rowcount == 1
+    
+    def retry(self, job_id: int, owner: str, error: str, delay_seconds: float) -> bool:
+        """Return a failed job to the queue, ready again after delay_seconds"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("""
+                UPDATE review_jobs
+                SET status = 'queued', available_at = ?, last_error = ?, lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ? AND lease_owner = ? AND status = 'leased'
+            """, (time.time() + delay_seconds, error, job_id, owner))
+            return cursor.rowcount == 1
+    
+    def release(self, job_id: int, owner: str) -> bool:
+        """Return an unfinished job to the queue without counting the attempt"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("""
+                UPDATE review_jobs
+                SET status = 'queued', available_at = ?, attempts = MAX(attempts - 1, 0),
+                    lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ? AND lease_owner = ? AND status = 'leased'
+            """, (time.time(), job_id, owner))
+            return cursor.rowcount == 1
+    
+    def bury(self, job_id: int, owner: str, error: str) -> bool:
+        """Mark a job as dead so it is never claimed again"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("""
+                UPDATE review_jobs
+                SET status = 'dead', last_error = ?, lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ? AND lease_owner = ? AND status = 'leased'
+            """, (error, job_id, owner))
+            return cursor.rowcount == 1
+    
+    def depth(self) -> int:
+        """Number of jobs waiting to be claimed, including delayed retries"""
+        with connection_pool.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM review_jobs WHERE status = 'queued'")
+            return cursor.fetchone()[0]
+    
+    def stats(self) -> Dict[str, int]:
+        """Job counts by state"""
+        now = time.time()
+        with connection_pool.cursor() as cursor:
+            cursor.execute("""
+                SELECT
+                    SUM(status = 'queued' AND available_at <= ?),
+                    SUM(status = 'queued' AND available_at > ?),
+                    SUM(status = 'leased' AND lease_expires_at >= ?),
+                    SUM(status = 'leased' AND lease_expires_at < ?),
+                    SUM(status = 'dead')
+                FROM review_jobs
+            """, (now, now, now, now))
+            ready, delayed, leased, expired, dead = (value or 0 for value in cursor.fetchone())
+        return {"ready": ready, "delayed": delayed, "leased": leased, "expired": expired, "dead": dead}
+
+# Backends selectable with REVIEW_QUEUE_BACKEND
+JOB_BACKENDS = {
+    "sqlite": SQLiteReviewJobBackend,
+}
+
+def create_job_backend(name: str = REVIEW_QUEUE_BACKEND) -> ReviewJobBackend:
+    """Instantiate the configured review job backend"""
+    try:
+        return JOB_BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown review queue backend: {name}. Available: {', '.join(JOB_BACKENDS)}")
@@ -0,0 +1,137 @@
+"""
+Persistent cache of LLM analysis results
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..config.settings import LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES
+from ..database.async_operations import async_db_ops
+from ..database.connection import connection_pool
+
+logger = logging.getLogger(__name__)
+
+class LLMCache:
+    """Content-addressed cache of parsed LLM responses with TTL and LRU eviction"""
+
+    # Run eviction every N writes rather than on every insert
+    EVICTION_INTERVAL = 100
+
+    def __init__(self, ttl_seconds: int = LLM_CACHE_TTL_SECONDS, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        """Initialize cache limits and counters"""
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_prompt: str, **params: Any) -> str:
+        """Hash the model, rendered prompts (which embed the patch) and request parameters"""
+        payload = json.dumps(
+            {"model": model, "system": system_prompt, "user": user_prompt, "params": params},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return cached comments for key, or None on miss or expiry"""
+        now = time.time()
+        with connection_pool.cursor() as cursor:
+            cursor.execute("SELECT response, created_at FROM llm_cache WHERE cache_key = ?", (cache_key,))
+            row = cursor.fetchone()
+        
+        # Bookkeeping goes to the writer thread so lookups never wait for the write lock
+        if row and now - row[1] <= self.ttl_seconds:
+            async_db_ops.write_nowait(self._record_hit, cache_key, now)
+            self._count(hit=True)
+            return json.loads(row[0])
+        
+        if row:
+            async_db_ops.write_nowait(self._delete_expired, cache_key, now - self.ttl_seconds)
+        self._count(hit=False)
+        return None
+
+    @staticmethod
+    def _record_hit(cache_key: str, now: float):
+        """Bump the LRU timestamp and hit count of an entry"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute(
+                "UPDATE llm_cache SET last_accessed = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+                (now, cache_key)
+            )
+
+    @staticmethod
+    def _delete_expired(cache_key: str, expired_before: float):
+        """Drop an entry if it is still expired (it may have been refreshed since the lookup)"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("DELETE FROM llm_cache WHERE cache_key = ? AND created_at < ?", (cache_key, expired_before))
+
+    def set(self, cache_key: str, model: str, comments: List[Dict[str, Any]]):
+        """Store parsed comments for key"""
+        now = time.time()
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.EVICTION_INTERVAL == 0
+
+        with connection_pool.transaction() as cursor:
+            cursor.execute("""
+                INSERT OR REPLACE INTO llm_cache (cache_key, model, response, created_at, last_accessed, hit_count)
+                VALUES (?, ?, ?, ?, ?, 0)
+            """, (cache_key, model, json.dumps(comments), now, now))
+            
+            if evict:
+                self._evict(cursor, now)
+
+    def _evict(self, cursor: sqlite3.Cursor, now: float):
+        """Drop expired entries, then least recently used entries over the size limit"""
+        cursor.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        expired = cursor.rowcount
+
+        cursor.execute("""
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM llm_cache
+                ORDER BY last_accessed DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        evicted = cursor.rowcount
+
+        if expired or evicted:
+            logger.info(f"LLM cache eviction: {expired} expired, {evicted} over size limit")
+
+    def clear(self):
+        """Remove all cached entries"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process and current cache size"""
+        with connection_pool.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM llm_cache")
+            entries = cursor.fetchone()[0]
+
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds
+        }
+
+    def _count(self, hit: bool):
+        """Update hit/miss counters"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
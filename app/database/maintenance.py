@@ -0,0 +1,35 @@
+"""
+Database maintenance commands
+
+Usage:
+    python -m app.database.maintenance rebuild-search
+    python -m app.database.maintenance backfill-stats
+"""
+import argparse
+import time
+from typing import List, Optional
+
+from ..config.settings import setup_logging
+from ..database.operations import DatabaseOperations
+
+def main(argv: Optional[List[str]] = None):
+    """Run a maintenance command against DB_FILE"""
+    parser = argparse.ArgumentParser(description="GitHub PR Review Bot database maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-search", help="Rebuild the full-text index of review comments")
+    commands.add_parser("backfill-stats", help="Recompute per-repository analytics from stored reviews")
+    args = parser.parse_args(argv)
+    
+    logger = setup_logging()
+    DatabaseOperations.init_database()
+    
+    started = time.perf_counter()
+    if args.command == "rebuild-search":
+        indexed = DatabaseOperations.rebuild_search_index()
+        logger.info(f"Indexed {indexed} review comments in {time.perf_counter() - started:.1f}s")
+    elif args.command == "backfill-stats":
+        repos = DatabaseOperations.backfill_stats()
+        logger.info(f"Recomputed stats for {repos} repositories in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
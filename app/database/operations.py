@@ -1,11 +1,52 @@
 """
 Database operations for PR reviews
 """
+import base64
+import json
+import logging
+import re
 import sqlite3
-from typing import List, Optional
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
 
 from ..config.settings import DB_FILE
-from ..models.database import ReviewComment, PR_REVIEWS_TABLE_SQL, REVIEW_COMMENTS_TABLE_SQL
+from ..database.connection import connection_pool
+from ..models.database import (
+    ReviewComment, ReviewUsage, SkippedFile, PR_REVIEWS_TABLE_SQL, REVIEW_COMMENTS_TABLE_SQL, REVIEW_FILES_TABLE_SQL,
+    REVIEW_FILES_INDEX_SQL, REVIEW_FILE_USAGE_TABLE_SQL, REVIEW_FILE_USAGE_INDEX_SQL,
+    REVIEW_SKIPPED_FILES_TABLE_SQL, REVIEW_SKIPPED_FILES_INDEX_SQL,
+    GITHUB_HTTP_CACHE_TABLE_SQL, GITHUB_HTTP_CACHE_INDEX_SQL, LLM_CACHE_TABLE_SQL, LLM_CACHE_INDEX_SQL,
+    REVIEW_COMMENTS_FTS_TABLE_SQL, REVIEW_COMMENTS_FTS_TRIGGERS_SQL, REVIEW_COMMENTS_FTS_REBUILD_SQL,
+    REPO_STATS_TABLE_SQL, REPO_PATH_STATS_TABLE_SQL, REPO_PATH_STATS_INDEX_SQL, REPO_STATS_BACKFILL_SQL,
+    REVIEW_JOBS_TABLE_SQL, REVIEW_JOBS_INDEXES_SQL,
+    SCHEMA_COLUMN_MIGRATIONS, SCHEMA_MIGRATIONS
+)
+
+SCHEMA_STATEMENTS = [
+    PR_REVIEWS_TABLE_SQL,
+    REVIEW_COMMENTS_TABLE_SQL,
+    REVIEW_FILES_TABLE_SQL,
+    REVIEW_FILES_INDEX_SQL,
+    REVIEW_FILE_USAGE_TABLE_SQL,
+    REVIEW_FILE_USAGE_INDEX_SQL,
+    REVIEW_SKIPPED_FILES_TABLE_SQL,
+    REVIEW_SKIPPED_FILES_INDEX_SQL,
+    GITHUB_HTTP_CACHE_TABLE_SQL,
+    GITHUB_HTTP_CACHE_INDEX_SQL,
+    LLM_CACHE_TABLE_SQL,
+    LLM_CACHE_INDEX_SQL,
+    REVIEW_COMMENTS_FTS_TABLE_SQL,
+    *REVIEW_COMMENTS_FTS_TRIGGERS_SQL,
+    REPO_STATS_TABLE_SQL,
+    REPO_PATH_STATS_TABLE_SQL,
+    REPO_PATH_STATS_INDEX_SQL,
+    REVIEW_JOBS_TABLE_SQL,
+    *REVIEW_JOBS_INDEXES_SQL,
+]
+
+FINAL_STATUSES = ('completed', 'failed')
+
+logger = logging.getLogger(__name__)
 
 class DatabaseOperations:
     """Handle all database operations"""
@@ -13,14 +54,30 @@ class DatabaseOperations:
     @staticmethod
     def init_database():
         """Initialize SQLite database"""
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        with connection_pool.transaction(immediate=True) as cursor:
+            DatabaseOperations._create_schema(cursor)
+    
+    @staticmethod
+    def _create_schema(cursor: sqlite3.Cursor):
+        """Create missing tables and indexes, add columns introduced after the initial schema and apply versioned migrations"""
+        for statement in SCHEMA_STATEMENTS:
+            cursor.execute(statement)
         
-        cursor.execute(PR_REVIEWS_TABLE_SQL)
-        cursor.execute(REVIEW_COMMENTS_TABLE_SQL)
+        for table, column, definition in SCHEMA_COLUMN_MIGRATIONS:
+            cursor.execute(f"PRAGMA table_info({table})")
+            existing_columns = [row[1] for row in cursor.fetchall()]
+            if column not in existing_columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
         
-        conn.commit()
-        conn.close()
+        cursor.execute("PRAGMA user_version")
+        schema_version = cursor.fetchone()[0]
+        for version, statements in SCHEMA_MIGRATIONS:
+            if version <= schema_version:
+                continue
+            for statement in statements:
+                cursor.execute(statement)
+            # PRAGMA does not accept bound parameters
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
     
     @staticmethod
     def fix_database():
@@ -31,49 +88,54 @@ class DatabaseOperations:
         logger = logging.getLogger(__name__)
         
         try:
-            # Test database connection
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            
             # Check if tables exist and have correct structure
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = [row[0] for row in cursor.fetchall()]
-            
-            expected_tables = ['pr_reviews', 'review_comments']
-            missing_tables = [table for table in expected_tables if table not in tables]
-            
-            if missing_tables:
-                logger.warning(f"Missing tables: {missing_tables}. Recreating...")
-                # Recreate missing tables
-                cursor.execute(PR_REVIEWS_TABLE_SQL)
-                cursor.execute(REVIEW_COMMENTS_TABLE_SQL)
-                conn.commit()
-                logger.info("Database tables recreated successfully")
-            
-            # Verify table structures
-            for table in expected_tables:
-                cursor.execute(f"PRAGMA table_info({table})")
-                columns = cursor.fetchall()
-                logger.info(f"Table {table} has {len(columns)} columns")
-            
-            conn.close()
+            with connection_pool.transaction(immediate=True) as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+                tables = [row[0] for row in cursor.fetchall()]
+                
+                expected_tables = ['pr_reviews', 'review_comments', 'review_comments_fts', 'review_files', 'review_file_usage', 'review_skipped_files', 'github_http_cache', 'llm_cache', 'repo_stats', 'repo_path_stats', 'review_jobs']
+                missing_tables = [table for table in expected_tables if table not in tables]
+                
+                if missing_tables:
+                    logger.warning(f"Missing tables: {missing_tables}. Recreating...")
+                # Recreate missing tables and apply pending migrations
+                DatabaseOperations._create_schema(cursor)
+                if 'review_comments_fts' in missing_tables:
+                    cursor.execute(REVIEW_COMMENTS_FTS_REBUILD_SQL)
+                if 'repo_stats' in missing_tables or 'repo_path_stats' in missing_tables:
+                    for statement in REPO_STATS_BACKFILL_SQL:
+                        cursor.execute(statement)
+                if missing_tables:
+                    logger.info("Database tables recreated successfully")
+                
+                # Verify table structures
+                for table in expected_tables:
+                    cursor.execute(f"PRAGMA table_info({table})")
+                    columns = cursor.fetchall()
+                    logger.info(f"Table {table} has {len(columns)} columns")
+            
             logger.info("Database integrity check completed")
             return True
-            
+        
         except sqlite3.Error as e:
             logger.error(f"Database error: {e}")
             # If there's a corruption, try to backup and recreate
             try:
+                # Pooled connections point at the old file; threads still using theirs reconnect when done
+                connection_pool.reopen()
                 if os.path.exists(DB_FILE):
                     backup_file = f"{DB_FILE}.backup"
                     os.rename(DB_FILE, backup_file)
                     logger.info(f"Corrupted database backed up to {backup_file}")
+                    for suffix in ("-wal", "-shm"):
+                        if os.path.exists(DB_FILE + suffix):
+                            os.rename(DB_FILE + suffix, backup_file + suffix)
                 
                 # Recreate database
                 DatabaseOperations.init_database()
                 logger.info("Database recreated from scratch")
                 return True
-                
+            
             except Exception as backup_error:
                 logger.error(f"Failed to fix database: {backup_error}")
                 return False
@@ -82,6 +144,105 @@ class DatabaseOperations:
             logger.error(f"Unexpected error during database fix: {e}")
             return False
     
+    @staticmethod
+    def create_review(pr_url: str, repo_name: str, pr_number: int, status: str = "queued") -> int:
+        """Insert a review record before processing starts"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO pr_reviews (pr_url, repo_name, pr_number, status)
+                VALUES (?, ?, ?, ?)
+            """, (pr_url, repo_name, pr_number, status))
+            
+            review_id = cursor.lastrowid
+            if review_id is None:
+                raise ValueError("Failed to insert review record")
+        
+        return review_id
+    
+    @staticmethod
+    def create_or_attach_review(
+        pr_url: str,
+        repo_name: str,
+        pr_number: int,
+        head_sha: Optional[str],
+        status: str = "queued"
+    ) -> Tuple[int, bool]:
+        """Insert a review of a PR head unless one is already queued/running; returns (review_id, created)"""
+        with connection_pool.transaction(immediate=True) as cursor:
+            # idx_pr_reviews_active_head makes the check atomic across processes; NULL heads never conflict
+            cursor.execute("""
+                INSERT INTO pr_reviews (pr_url, repo_name, pr_number, status, head_sha)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (repo_name, pr_number, head_sha) WHERE status IN ('queued', 'running') DO NOTHING
+            """, (pr_url, repo_name, pr_number, status, head_sha))
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+            
+            review_id = DatabaseOperations._find_active_review(cursor, repo_name, pr_number, head_sha)
+            if review_id is None:
+                raise ValueError("Failed to insert review record")
+            return review_id, False
+    
+    @staticmethod
+    def get_active_review(repo_name: str, pr_number: int, head_sha: Optional[str]) -> Optional[int]:
+        """Get the id of the queued/running review of a PR head, if any"""
+        with connection_pool.cursor() as cursor:
+            return DatabaseOperations._find_active_review(cursor, repo_name, pr_number, head_sha)
+    
+    @staticmethod
+    def _find_active_review(cursor: sqlite3.Cursor, repo_name: str, pr_number: int, head_sha: Optional[str]) -> Optional[int]:
+        """Look up a queued/running review through idx_pr_reviews_active_head"""
+        if head_sha is None:
+            return None
+        cursor.execute("""
+            SELECT id FROM pr_reviews
+            WHERE repo_name = ? AND pr_number = ? AND head_sha = ? AND status IN ('queued', 'running')
+        """, (repo_name, pr_number, head_sha))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    @staticmethod
+    def update_review_status(review_id: int, status: str):
+        """Update the status of an in-progress review"""
+        with connection_pool.transaction() as cursor:
+            cursor.execute("UPDATE pr_reviews SET status = ? WHERE id = ?", (status, review_id))
+    
+    @staticmethod
+    def fail_interrupted_reviews(grace_seconds: float = 0) -> int:
+        """Mark queued/running reviews that no longer have a live job as failed"""
+        # Reviews still owned by a queued or leased job are resumed by a worker; the grace period
+        # spares reviews whose job another process is about to enqueue
+        orphaned = """
+            status IN ('queued', 'running')
+            AND created_at <= datetime('now', ?)
+            AND NOT EXISTS (
+                SELECT 1 FROM review_jobs
+                WHERE review_jobs.review_id = pr_reviews.id AND review_jobs.status IN ('queued', 'leased')
+            )
+        """
+        cutoff = f"-{int(grace_seconds)} seconds"
+        with connection_pool.transaction() as cursor:
+            # Count the interrupted reviews as failures before their status changes
+            cursor.execute(f"""
+                INSERT INTO repo_stats (repo_name, reviews, failed, last_review_at)
+                SELECT repo_name, COUNT(*), COUNT(*), CURRENT_TIMESTAMP
+                FROM pr_reviews
+                WHERE {orphaned}
+                GROUP BY repo_name
+                ON CONFLICT (repo_name) DO UPDATE SET
+                    reviews = reviews + excluded.reviews,
+                    failed = failed + excluded.failed,
+                    last_review_at = excluded.last_review_at
+            """, (cutoff,))
+            cursor.execute(f"""
+                UPDATE pr_reviews
+                SET status = 'failed', error_message = 'Interrupted by server restart', completed_at = CURRENT_TIMESTAMP
+                WHERE {orphaned}
+            """, (cutoff,))
+            interrupted = cursor.rowcount
+        
+        return interrupted
+    
     @staticmethod
     def store_review_data(
         pr_url: str, 
@@ -89,50 +250,391 @@ class DatabaseOperations:
         pr_number: int, 
         status: str, 
         comments: Optional[List[ReviewComment]] = None, 
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        review_id: Optional[int] = None,
+        head_sha: Optional[str] = None,
+        file_shas: Optional[Dict[str, str]] = None,
+        usage: Optional[ReviewUsage] = None,
+        skipped_files: Optional[List[SkippedFile]] = None
     ) -> int:
-        """Store review data in database"""
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        """Store review data in database, finalizing an existing review record if review_id is given"""
+        # The status read below decides the writes, so take the write lock before it
+        with connection_pool.transaction(immediate=True) as cursor:
+            if review_id is None:
+                # Insert PR review record
+                cursor.execute("""
+                    INSERT INTO pr_reviews (pr_url, repo_name, pr_number, status, comments_added, error_message, head_sha, completed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """, (pr_url, repo_name, pr_number, status, len(comments) if comments else 0, error_message, head_sha))
+                
+                review_id = cursor.lastrowid
+                if review_id is None:
+                    raise ValueError("Failed to insert review record")
+                newly_finalized = True
+            else:
+                cursor.execute("SELECT status FROM pr_reviews WHERE id = ?", (review_id,))
+                row = cursor.fetchone()
+                if row is not None and row[0] in FINAL_STATUSES:
+                    # e.g. a job re-run after its worker stored the result but died before completing it;
+                    # the first result stands, so comment rows, counts and stats stay consistent
+                    logger.warning(f"Review {review_id} is already {row[0]}, not storing it again as {status}")
+                    return review_id
+                newly_finalized = row is not None
+                cursor.execute("""
+                    UPDATE pr_reviews
+                    SET status = ?, comments_added = ?, error_message = ?,
+                        head_sha = COALESCE(?, head_sha), completed_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (status, len(comments) if comments else 0, error_message, head_sha, review_id))
+            
+            # Insert individual comments
+            if comments:
+                cursor.executemany("""
+                    INSERT INTO review_comments (pr_review_id, file_path, line_number, comment)
+                    VALUES (?, ?, ?, ?)
+                """, [
+                    (review_id, comment.file_path, comment.line_number, comment.comment)
+                    for comment in comments
+                ])
+            
+            if usage is not None:
+                DatabaseOperations._store_usage(cursor, review_id, usage)
+            
+            # Record blob SHAs of the reviewed head for incremental re-reviews
+            if file_shas:
+                cursor.executemany("""
+                    INSERT INTO review_files (pr_review_id, file_path, blob_sha)
+                    VALUES (?, ?, ?)
+                """, [(review_id, file_path, blob_sha) for file_path, blob_sha in file_shas.items()])
+            
+            # Files the pre-filter kept from the model, and why
+            if skipped_files:
+                cursor.executemany("""
+                    INSERT INTO review_skipped_files (pr_review_id, file_path, rule, detail)
+                    VALUES (?, ?, ?, ?)
+                """, [(review_id, skipped.file_path, skipped.rule, skipped.detail) for skipped in skipped_files])
+            
+            # Finalizing the same review twice must not count it twice
+            if newly_finalized and status in FINAL_STATUSES:
+                DatabaseOperations._update_repo_stats(cursor, repo_name, status, comments or [], usage)
         
-        # Insert PR review record
+        return review_id
+    
+    @staticmethod
+    def _update_repo_stats(
+        cursor: sqlite3.Cursor,
+        repo_name: str,
+        status: str,
+        comments: List[ReviewComment],
+        usage: Optional[ReviewUsage]
+    ):
+        """Fold one finalized review into the per-repository summary tables"""
+        duration_ms = usage.duration_ms if usage is not None else None
+        cursor.execute("""
+            INSERT INTO repo_stats (
+                repo_name, reviews, completed, failed, comments, timed_reviews, duration_ms_total,
+                prompt_tokens, completion_tokens, last_review_at
+            )
+            VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (repo_name) DO UPDATE SET
+                reviews = reviews + 1,
+                completed = completed + excluded.completed,
+                failed = failed + excluded.failed,
+                comments = comments + excluded.comments,
+                timed_reviews = timed_reviews + excluded.timed_reviews,
+                duration_ms_total = duration_ms_total + excluded.duration_ms_total,
+                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                completion_tokens = completion_tokens + excluded.completion_tokens,
+                last_review_at = excluded.last_review_at
+        """, (
+            repo_name, int(status == 'completed'), int(status == 'failed'), len(comments),
+            int(duration_ms is not None), duration_ms or 0,
+            usage.prompt_tokens if usage is not None else 0,
+            usage.completion_tokens if usage is not None else 0
+        ))
+        
+        path_counts = Counter(comment.file_path for comment in comments)
+        if path_counts:
+            cursor.executemany("""
+                INSERT INTO repo_path_stats (repo_name, file_path, comments)
+                VALUES (?, ?, ?)
+                ON CONFLICT (repo_name, file_path) DO UPDATE SET comments = comments + excluded.comments
+            """, [(repo_name, file_path, count) for file_path, count in path_counts.items()])
+    
+    @staticmethod
+    def _store_usage(cursor: sqlite3.Cursor, review_id: int, usage: ReviewUsage):
+        """Persist review-level and per-file usage telemetry"""
         cursor.execute("""
-            INSERT INTO pr_reviews (pr_url, repo_name, pr_number, status, comments_added, error_message)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (pr_url, repo_name, pr_number, status, len(comments) if comments else 0, error_message))
+            UPDATE pr_reviews
+            SET prompt_tokens = ?, completion_tokens = ?, llm_requests = ?, llm_cache_hits = ?,
+                llm_latency_ms = ?, github_calls = ?, github_not_modified = ?, duration_ms = ?
+            WHERE id = ?
+        """, (
+            usage.prompt_tokens, usage.completion_tokens, usage.llm_requests, usage.cache_hits,
+            usage.llm_latency_ms, usage.github_calls, usage.github_not_modified, usage.duration_ms, review_id
+        ))
         
-        review_id = cursor.lastrowid
-        if review_id is None:
-            raise ValueError("Failed to insert review record")
+        cursor.executemany("""
+            INSERT INTO review_file_usage
+                (pr_review_id, file_path, llm_requests, cache_hits, prompt_tokens, completion_tokens, llm_latency_ms)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                review_id, file_usage.file_path, file_usage.llm_requests, file_usage.cache_hits,
+                file_usage.prompt_tokens, file_usage.completion_tokens, file_usage.llm_latency_ms
+            )
+            for file_usage in usage.files.values()
+        ])
+    
+    @staticmethod
+    def get_review_usage(review_id: int) -> Optional[dict]:
+        """Get token, latency and API call telemetry for a review"""
+        with connection_pool.cursor() as cursor:
+            cursor.execute("""
+                SELECT prompt_tokens, completion_tokens, llm_requests, llm_cache_hits,
+                       llm_latency_ms, github_calls, github_not_modified, duration_ms
+                FROM pr_reviews
+                WHERE id = ?
+            """, (review_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            cursor.execute("""
+                SELECT file_path, llm_requests, cache_hits, prompt_tokens, completion_tokens, llm_latency_ms
+                FROM review_file_usage
+                WHERE pr_review_id = ?
+                ORDER BY prompt_tokens + completion_tokens DESC
+            """, (review_id,))
+            files = [
+                {
+                    "file_path": file_row[0],
+                    "llm_requests": file_row[1],
+                    "cache_hits": file_row[2],
+                    "prompt_tokens": file_row[3],
+                    "completion_tokens": file_row[4],
+                    "llm_latency_ms": round(file_row[5] or 0, 1)
+                }
+                for file_row in cursor.fetchall()
+            ]
         
-        # Insert individual comments
-        if comments:
-            for comment in comments:
+        return {
+            "prompt_tokens": row[0] or 0,
+            "completion_tokens": row[1] or 0,
+            "llm_requests": row[2] or 0,
+            "llm_cache_hits": row[3] or 0,
+            "llm_latency_ms": round(row[4] or 0, 1),
+            "github_calls": row[5] or 0,
+            "github_not_modified": row[6] or 0,
+            "duration_ms": round(row[7], 1) if row[7] is not None else None,
+            "files": files
+        }
+    
+    @staticmethod
+    def get_skipped_files(review_id: int) -> List[dict]:
+        """Get the files of a review that were not sent to the model, with the rule that skipped each"""
+        with connection_pool.cursor() as cursor:
+            cursor.execute("""
+                SELECT file_path, rule, detail
+                FROM review_skipped_files
+                WHERE pr_review_id = ?
+                ORDER BY id
+            """, (review_id,))
+            return [{"file_path": row[0], "rule": row[1], "detail": row[2]} for row in cursor.fetchall()]
+    
+    @staticmethod
+    def get_usage_summary(days: int = 7, top: int = 10) -> dict:
+        """Aggregate telemetry over recently completed reviews, with the most expensive reviews"""
+        since = f"-{int(days)} days"
+        
+        with connection_pool.cursor() as cursor:
+            cursor.execute("""
+                SELECT COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(llm_requests),
+                       SUM(llm_cache_hits), SUM(github_calls), AVG(duration_ms), MAX(duration_ms),
+                       AVG(prompt_tokens + completion_tokens), SUM(github_not_modified)
+                FROM pr_reviews
+                WHERE status = 'completed' AND created_at >= datetime('now', ?)
+            """, (since,))
+            totals = cursor.fetchone()
+            
+            cursor.execute("""
+                SELECT repo_name, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), AVG(duration_ms), SUM(github_calls)
+                FROM pr_reviews
+                WHERE status = 'completed' AND created_at >= datetime('now', ?)
+                GROUP BY repo_name
+                ORDER BY SUM(prompt_tokens + completion_tokens) DESC
+            """, (since,))
+            repos = [
+                {
+                    "repo_name": row[0],
+                    "reviews": row[1],
+                    "prompt_tokens": row[2] or 0,
+                    "completion_tokens": row[3] or 0,
+                    "avg_duration_ms": round(row[4], 1) if row[4] is not None else None,
+                    "github_calls": row[5] or 0
+                }
+                for row in cursor.fetchall()
+            ]
+            
+            cursor.execute("""
+                SELECT id, repo_name, pr_number, prompt_tokens, completion_tokens, duration_ms, github_calls
+                FROM pr_reviews
+                WHERE status = 'completed' AND created_at >= datetime('now', ?)
+                ORDER BY prompt_tokens + completion_tokens DESC
+                LIMIT ?
+            """, (since, top))
+            most_expensive = [
+                {
+                    "id": row[0],
+                    "repo_name": row[1],
+                    "pr_number": row[2],
+                    "prompt_tokens": row[3] or 0,
+                    "completion_tokens": row[4] or 0,
+                    "duration_ms": round(row[5], 1) if row[5] is not None else None,
+                    "github_calls": row[6] or 0
+                }
+                for row in cursor.fetchall()
+            ]
+        
+        return {
+            "days": days,
+            "reviews": totals[0],
+            "prompt_tokens": totals[1] or 0,
+            "completion_tokens": totals[2] or 0,
+            "llm_requests": totals[3] or 0,
+            "llm_cache_hits": totals[4] or 0,
+            "github_calls": totals[5] or 0,
+            "github_not_modified": totals[9] or 0,
+            "avg_duration_ms": round(totals[6], 1) if totals[6] is not None else None,
+            "max_duration_ms": round(totals[7], 1) if totals[7] is not None else None,
+            "avg_tokens_per_review": round(totals[8], 1) if totals[8] is not None else None,
+            "repos": repos,
+            "most_expensive_reviews": most_expensive
+        }
+    
+    @staticmethod
+    def get_repo_stats(repo_name: Optional[str] = None, top_paths: int = 10) -> List[dict]:
+        """Per-repository review counts, failure rate, average duration and most commented paths from the summary tables"""
+        with connection_pool.cursor() as cursor:
+            if repo_name:
+                cursor.execute("SELECT * FROM repo_stats WHERE repo_name = ?", (repo_name,))
+            else:
+                cursor.execute("SELECT * FROM repo_stats ORDER BY reviews DESC, repo_name")
+            columns = [description[0] for description in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            
+            repos = []
+            for row in rows:
+                # Served by idx_repo_path_stats_comments without scanning comments
                 cursor.execute("""
-                    INSERT INTO review_comments (pr_review_id, file_path, line_number, comment)
-                    VALUES (?, ?, ?, ?)
-                """, (review_id, comment.file_path, comment.line_number, comment.comment))
+                    SELECT file_path, comments
+                    FROM repo_path_stats
+                    WHERE repo_name = ?
+                    ORDER BY comments DESC
+                    LIMIT ?
+                """, (row["repo_name"], top_paths))
+                repos.append({
+                    "repo_name": row["repo_name"],
+                    "reviews": row["reviews"],
+                    "completed": row["completed"],
+                    "failed": row["failed"],
+                    "failure_rate": round(row["failed"] / row["reviews"], 4) if row["reviews"] else 0.0,
+                    "comments": row["comments"],
+                    "avg_comments_per_review": round(row["comments"] / row["reviews"], 2) if row["reviews"] else 0.0,
+                    "avg_duration_ms": round(row["duration_ms_total"] / row["timed_reviews"], 1) if row["timed_reviews"] else None,
+                    "prompt_tokens": row["prompt_tokens"],
+                    "completion_tokens": row["completion_tokens"],
+                    "last_review_at": row["last_review_at"],
+                    "top_paths": [{"file_path": path_row[0], "comments": path_row[1]} for path_row in cursor.fetchall()]
+                })
         
-        conn.commit()
-        conn.close()
+        return repos
+    
+    @staticmethod
+    def backfill_stats() -> int:
+        """Recompute the per-repository summary tables from stored reviews, returning the number of repositories"""
+        with connection_pool.transaction(immediate=True) as cursor:
+            for statement in REPO_STATS_BACKFILL_SQL:
+                cursor.execute(statement)
+            cursor.execute("SELECT COUNT(*) FROM repo_stats")
+            return cursor.fetchone()[0]
+    
+    @staticmethod
+    def get_last_reviewed_head(repo_name: str, pr_number: int) -> Optional[dict]:
+        """Get the head SHA and per-file blob SHAs of the latest completed review of a PR"""
+        with connection_pool.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, head_sha
+                FROM pr_reviews
+                WHERE repo_name = ? AND pr_number = ? AND status = 'completed' AND head_sha IS NOT NULL
+                ORDER BY id DESC
+                LIMIT 1
+            """, (repo_name, pr_number))
+            
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            cursor.execute("""
+                SELECT file_path, blob_sha
+                FROM review_files
+                WHERE pr_review_id = ?
+            """, (row[0],))
+            file_shas = {file_path: blob_sha for file_path, blob_sha in cursor.fetchall()}
         
-        return review_id
+        return {
+            "review_id": row[0],
+            "head_sha": row[1],
+            "file_shas": file_shas
+        }
     
     @staticmethod
     def get_recent_reviews(limit: int = 20) -> List[dict]:
         """Get recent reviews from database"""
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        return DatabaseOperations.get_reviews_page(limit)["reviews"]
+    
+    @staticmethod
+    def get_reviews_page(
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        repo_name: Optional[str] = None,
+        status: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None
+    ) -> dict:
+        """Get one page of reviews, newest first, continuing after cursor (keyset pagination on created_at, id)"""
+        conditions = []
+        params: list = []
+        if repo_name:
+            conditions.append("repo_name = ?")
+            params.append(repo_name)
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if created_after:
+            conditions.append("created_at >= ?")
+            params.append(created_after)
+        if created_before:
+            conditions.append("created_at < ?")
+            params.append(created_before)
+        if cursor:
+            conditions.append("(created_at, id) < (?, ?)")
+            params.extend(DatabaseOperations._decode_cursor(cursor))
         
-        cursor.execute("""
-            SELECT id, pr_url, repo_name, pr_number, status, created_at, comments_added
-            FROM pr_reviews
-            ORDER BY created_at DESC
-            LIMIT ?
-        """, (limit,))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with connection_pool.cursor() as db_cursor:
+            # One extra row tells whether another page exists
+            db_cursor.execute(f"""
+                SELECT id, pr_url, repo_name, pr_number, status, created_at, comments_added
+                FROM pr_reviews
+                {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            """, (*params, limit + 1))
+            rows = db_cursor.fetchall()
         
         reviews = []
-        for row in cursor.fetchall():
+        for row in rows[:limit]:
             reviews.append({
                 "id": row[0],
                 "pr_url": row[1],
@@ -143,47 +645,59 @@ class DatabaseOperations:
                 "comments_added": row[6]
             })
         
-        conn.close()
-        return reviews
+        next_cursor = None
+        if len(rows) > limit and reviews:
+            next_cursor = DatabaseOperations._encode_cursor(reviews[-1]["created_at"], reviews[-1]["id"])
+        return {"reviews": reviews, "next_cursor": next_cursor}
+    
+    @staticmethod
+    def _encode_cursor(created_at: str, review_id: int) -> str:
+        """Opaque cursor pointing just after a review"""
+        return base64.urlsafe_b64encode(json.dumps([created_at, review_id]).encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def _decode_cursor(cursor: str) -> Tuple[str, int]:
+        """Parse a cursor from _encode_cursor; raises ValueError if it is malformed"""
+        try:
+            created_at, review_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, TypeError, UnicodeEncodeError) as e:
+            raise ValueError("Invalid cursor") from e
+        if not isinstance(created_at, str) or not isinstance(review_id, int):
+            raise ValueError("Invalid cursor")
+        return created_at, review_id
     
-
     @staticmethod
     def get_comments_for_review(review_id: int) -> List[ReviewComment]:
         """Get comments for a review"""
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        with connection_pool.cursor() as cursor:
+            cursor.execute("""
+                SELECT file_path, line_number, comment
+                FROM review_comments
+                WHERE pr_review_id = ?
+                ORDER BY id
+            """, (review_id,))
+            
+            comments = []
+            for row in cursor.fetchall():
+                comments.append(ReviewComment(
+                    file_path=row[0],
+                    line_number=row[1],
+                    comment=row[2]
+                ))
         
-        cursor.execute("""
-            SELECT file_path, line_number, comment
-            FROM review_comments
-            WHERE pr_review_id = ?
-        """, (review_id,))
-        
-        comments = []
-        for row in cursor.fetchall():
-            comments.append(ReviewComment(
-                file_path=row[0],
-                line_number=row[1],
-                comment=row[2]
-            ))
-        
-        conn.close()
         return comments
     
     @staticmethod
     def get_review_details(review_id: int) -> Optional[dict]:
         """Get review details by ID"""
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, pr_url, repo_name, pr_number, status, created_at, comments_added, error_message
-            FROM pr_reviews
-            WHERE id = ?
-        """, (review_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        with connection_pool.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, pr_url, repo_name, pr_number, status, created_at, comments_added, error_message, completed_at, head_sha
+                FROM pr_reviews
+                WHERE id = ?
+            """, (review_id,))
+            
+            row = cursor.fetchone()
         
         if row:
             return {
@@ -194,6 +708,93 @@ class DatabaseOperations:
                 "status": row[4],
                 "created_at": row[5],
                 "comments_added": row[6],
-                "error_message": row[7]
+                "error_message": row[7],
+                "completed_at": row[8],
+                "head_sha": row[9]
             }
-        return None
\ No newline at end of file
+        return None
+    
+    @staticmethod
+    def search_comments(
+        query: str,
+        repo_name: Optional[str] = None,
+        path: Optional[str] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> List[dict]:
+        """Full-text search over review comments, best matches first, with highlighted snippets"""
+        match = DatabaseOperations._fts_query(query)
+        if not match:
+            raise ValueError("Search query is empty")
+        
+        conditions = ["review_comments_fts MATCH ?"]
+        params: list = [match]
+        if repo_name:
+            conditions.append("r.repo_name = ?")
+            params.append(repo_name)
+        if path:
+            # Directory or file prefix; escape LIKE wildcards in the path itself
+            conditions.append("c.file_path LIKE ? ESCAPE '\\'")
+            params.append(re.sub(r'([\\%_])', r'\\\1', path) + '%')
+        if created_after:
+            conditions.append("c.created_at >= ?")
+            params.append(created_after)
+        if created_before:
+            conditions.append("c.created_at < ?")
+            params.append(created_before)
+        
+        with connection_pool.cursor() as cursor:
+            # CROSS JOIN pins the full-text index as the outer loop: rows come out in rank order and
+            # each match costs two rowid lookups, instead of the planner probing the index per comment
+            cursor.execute(f"""
+                SELECT c.id, c.pr_review_id, r.repo_name, r.pr_number, r.pr_url, c.file_path, c.line_number,
+                       c.comment, snippet(review_comments_fts, 0, '**', '**', '…', 16),
+                       review_comments_fts.rank, c.created_at
+                FROM review_comments_fts
+                CROSS JOIN review_comments c ON c.rowid = review_comments_fts.rowid
+                CROSS JOIN pr_reviews r ON r.id = c.pr_review_id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY review_comments_fts.rank
+                LIMIT ? OFFSET ?
+            """, (*params, limit, offset))
+            rows = cursor.fetchall()
+        
+        return [
+            {
+                "comment_id": row[0],
+                "review_id": row[1],
+                "repo_name": row[2],
+                "pr_number": row[3],
+                "pr_url": row[4],
+                "file_path": row[5],
+                "line_number": row[6],
+                "comment": row[7],
+                "snippet": row[8],
+                "score": round(-row[9], 4),
+                "created_at": row[10]
+            }
+            for row in rows
+        ]
+    
+    @staticmethod
+    def _fts_query(query: str) -> str:
+        """Turn free text into an FTS5 query: every term (or "quoted phrase") must match; a trailing * matches a prefix"""
+        terms = []
+        for term in re.findall(r'"[^"]*"\*?|\S+', query):
+            prefix = term.endswith('*')
+            term = term.rstrip('*').strip('"').strip()
+            if term:
+                # Quoting keeps punctuation such as "SQL-injection" from being read as FTS5 operators
+                terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+        return ' '.join(terms)
+    
+    @staticmethod
+    def rebuild_search_index() -> int:
+        """Rebuild and optimize the full-text index from review_comments, returning the number of indexed comments"""
+        with connection_pool.transaction(immediate=True) as cursor:
+            cursor.execute(REVIEW_COMMENTS_FTS_REBUILD_SQL)
+            cursor.execute("INSERT INTO review_comments_fts (review_comments_fts) VALUES ('optimize')")
+            cursor.execute("SELECT COUNT(*) FROM review_comments")
+            return cursor.fetchone()[0]
\ No newline at end of file
@@ -4,9 +4,10 @@ Main FastAPI application for GitHub PR Review Bot
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 
-from .config.settings import APP_TITLE, APP_VERSION, setup_logging, validate_environment
-from .database.operations import DatabaseOperations
-from .api.routes import router
+from .config.settings import APP_TITLE, APP_VERSION, REVIEW_ORPHAN_GRACE_SECONDS, setup_logging, validate_environment
+from .database.connection import connection_pool
+from .database.async_operations import async_db_ops
+from .api.routes import router, review_service, review_queue, webhook_debouncer
 
 # Setup logging
 logger = setup_logging()
@@ -25,6 +26,20 @@ app.include_router(router)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
-    DatabaseOperations.init_database()
-    logger.info("PR Review Bot started") 
\ No newline at end of file
+    """Initialize database and start review workers on startup"""
+    await async_db_ops.init_database()
+    interrupted = await async_db_ops.fail_interrupted_reviews(REVIEW_ORPHAN_GRACE_SECONDS)
+    if interrupted:
+        logger.warning(f"Marked {interrupted} interrupted reviews as failed")
+    await review_queue.start()
+    logger.info("PR Review Bot started") 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop review workers and release shared HTTP clients and database connections on shutdown"""
+    await webhook_debouncer.stop()
+    await review_queue.stop()
+    await review_service.ai_service.close()
+    async_db_ops.shutdown()
+    connection_pool.close_all()
+    logger.info("PR Review Bot stopped")
\ No newline at end of file
@@ -1,8 +1,8 @@
 """
 Database models and structures
 """
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
 
 @dataclass
 class ReviewComment:
@@ -23,6 +23,84 @@ class PRReview:
     completed_at: Optional[str] = None
     comments_added: int = 0
     error_message: Optional[str] = None
+    head_sha: Optional[str] = None
+
+@dataclass
+class SkippedFile:
+    """A PR file the pre-filter kept from the model, with the rule that matched"""
+    file_path: str
+    rule: str
+    detail: Optional[str] = None
+
+@dataclass
+class ReviewJob:
+    """A review job claimed from the job queue"""
+    id: int
+    review_id: int
+    pr_url: str
+    incremental: bool
+    attempts: int
+    max_attempts: int
+    lease_owner: Optional[str] = None
+    last_error: Optional[str] = None
+
+@dataclass
+class FileUsage:
+    """LLM usage attributed to one file of a review"""
+    file_path: str
+    llm_requests: int = 0
+    cache_hits: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    llm_latency_ms: float = 0.0
+
+@dataclass
+class ReviewUsage:
+    """Token, latency and GitHub API call accounting for one review"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    llm_requests: int = 0
+    cache_hits: int = 0
+    llm_latency_ms: float = 0.0  # Summed over requests, so exceeds wall time when they overlap
+    github_calls: int = 0
+    github_not_modified: int = 0  # Conditional requests answered 304 (free against the rate limit)
+    duration_ms: float = 0.0
+    files: Dict[str, FileUsage] = field(default_factory=dict)
+    
+    def record_llm_call(
+        self,
+        attribution: List[Tuple[str, float]],
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_ms: float,
+        cached: bool = False
+    ):
+        """Record one LLM request, splitting its cost across files by weight"""
+        if cached:
+            self.cache_hits += 1
+        else:
+            self.llm_requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.llm_latency_ms += latency_ms
+        
+        total_weight = sum(weight for _, weight in attribution) or 1
+        for file_path, weight in attribution:
+            share = weight / total_weight
+            file_usage = self.files.setdefault(file_path, FileUsage(file_path=file_path))
+            if cached:
+                file_usage.cache_hits += 1
+                continue
+            file_usage.llm_requests += 1
+            file_usage.prompt_tokens += round(prompt_tokens * share)
+            file_usage.completion_tokens += round(completion_tokens * share)
+            file_usage.llm_latency_ms += latency_ms * share
+    
+    def record_github_calls(self, count: int = 1, not_modified: bool = False):
+        """Record GitHub API requests made for this review"""
+        self.github_calls += count
+        if not_modified:
+            self.github_not_modified += count
 
 # Database schema definitions
 PR_REVIEWS_TABLE_SQL = """
@@ -35,7 +113,16 @@ PR_REVIEWS_TABLE_SQL = """
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         completed_at TIMESTAMP,
         comments_added INTEGER DEFAULT 0,
-        error_message TEXT
+        error_message TEXT,
+        head_sha TEXT,
+        prompt_tokens INTEGER DEFAULT 0,
+        completion_tokens INTEGER DEFAULT 0,
+        llm_requests INTEGER DEFAULT 0,
+        llm_cache_hits INTEGER DEFAULT 0,
+        llm_latency_ms REAL DEFAULT 0,
+        github_calls INTEGER DEFAULT 0,
+        github_not_modified INTEGER DEFAULT 0,
+        duration_ms REAL
     )
 """
 
@@ -49,4 +136,256 @@ REVIEW_COMMENTS_TABLE_SQL = """
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (pr_review_id) REFERENCES pr_reviews (id)
     )
-""" 
\ No newline at end of file
+"""
+
+REVIEW_FILES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS review_files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pr_review_id INTEGER NOT NULL,
+        file_path TEXT NOT NULL,
+        blob_sha TEXT,
+        FOREIGN KEY (pr_review_id) REFERENCES pr_reviews (id)
+    )
+"""
+
+REVIEW_FILES_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_review_files_review ON review_files (pr_review_id)
+"""
+
+REVIEW_FILE_USAGE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS review_file_usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pr_review_id INTEGER NOT NULL,
+        file_path TEXT NOT NULL,
+        llm_requests INTEGER DEFAULT 0,
+        cache_hits INTEGER DEFAULT 0,
+        prompt_tokens INTEGER DEFAULT 0,
+        completion_tokens INTEGER DEFAULT 0,
+        llm_latency_ms REAL DEFAULT 0,
+        FOREIGN KEY (pr_review_id) REFERENCES pr_reviews (id)
+    )
+"""
+
+REVIEW_FILE_USAGE_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_review_file_usage_review ON review_file_usage (pr_review_id)
+"""
+
+REVIEW_SKIPPED_FILES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS review_skipped_files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pr_review_id INTEGER NOT NULL,
+        file_path TEXT NOT NULL,
+        rule TEXT NOT NULL,
+        detail TEXT,
+        FOREIGN KEY (pr_review_id) REFERENCES pr_reviews (id)
+    )
+"""
+
+REVIEW_SKIPPED_FILES_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_review_skipped_files_review ON review_skipped_files (pr_review_id)
+"""
+
+# Full-text index over review comments (external content: rows live in review_comments)
+REVIEW_COMMENTS_FTS_TABLE_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS review_comments_fts USING fts5(
+        comment,
+        file_path,
+        content='review_comments',
+        content_rowid='id',
+        tokenize='porter unicode61'
+    )
+"""
+
+REVIEW_COMMENTS_FTS_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS review_comments_fts_insert AFTER INSERT ON review_comments BEGIN
+        INSERT INTO review_comments_fts (rowid, comment, file_path) VALUES (new.id, new.comment, new.file_path);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_comments_fts_delete AFTER DELETE ON review_comments BEGIN
+        INSERT INTO review_comments_fts (review_comments_fts, rowid, comment, file_path)
+        VALUES ('delete', old.id, old.comment, old.file_path);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS review_comments_fts_update AFTER UPDATE ON review_comments BEGIN
+        INSERT INTO review_comments_fts (review_comments_fts, rowid, comment, file_path)
+        VALUES ('delete', old.id, old.comment, old.file_path);
+        INSERT INTO review_comments_fts (rowid, comment, file_path) VALUES (new.id, new.comment, new.file_path);
+    END
+    """,
+]
+
+REVIEW_COMMENTS_FTS_REBUILD_SQL = "INSERT INTO review_comments_fts (review_comments_fts) VALUES ('rebuild')"
+
+# Per-repository analytics, updated as each review is finalized
+REPO_STATS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS repo_stats (
+        repo_name TEXT PRIMARY KEY,
+        reviews INTEGER NOT NULL DEFAULT 0,
+        completed INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        comments INTEGER NOT NULL DEFAULT 0,
+        timed_reviews INTEGER NOT NULL DEFAULT 0,
+        duration_ms_total REAL NOT NULL DEFAULT 0,
+        prompt_tokens INTEGER NOT NULL DEFAULT 0,
+        completion_tokens INTEGER NOT NULL DEFAULT 0,
+        last_review_at TIMESTAMP
+    )
+"""
+
+REPO_PATH_STATS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS repo_path_stats (
+        repo_name TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        comments INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (repo_name, file_path)
+    )
+"""
+
+REPO_PATH_STATS_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_repo_path_stats_comments ON repo_path_stats (repo_name, comments)
+"""
+
+# Recompute the analytics tables from pr_reviews/review_comments
+REPO_STATS_BACKFILL_SQL = [
+    "DELETE FROM repo_stats",
+    "DELETE FROM repo_path_stats",
+    """
+    INSERT INTO repo_stats (
+        repo_name, reviews, completed, failed, comments, timed_reviews, duration_ms_total,
+        prompt_tokens, completion_tokens, last_review_at
+    )
+    SELECT repo_name, COUNT(*), SUM(status = 'completed'), SUM(status = 'failed'), SUM(comments_added),
+           COUNT(duration_ms), COALESCE(SUM(duration_ms), 0), SUM(COALESCE(prompt_tokens, 0)),
+           SUM(COALESCE(completion_tokens, 0)), MAX(COALESCE(completed_at, created_at))
+    FROM pr_reviews
+    WHERE status IN ('completed', 'failed')
+    GROUP BY repo_name
+    """,
+    """
+    INSERT INTO repo_path_stats (repo_name, file_path, comments)
+    SELECT r.repo_name, c.file_path, COUNT(*)
+    FROM review_comments c
+    JOIN pr_reviews r ON r.id = c.pr_review_id
+    GROUP BY r.repo_name, c.file_path
+    """,
+]
+
+# Columns added after the initial schema: (table, column, definition)
+SCHEMA_COLUMN_MIGRATIONS = [
+    ("pr_reviews", "head_sha", "TEXT"),
+    ("pr_reviews", "prompt_tokens", "INTEGER DEFAULT 0"),
+    ("pr_reviews", "completion_tokens", "INTEGER DEFAULT 0"),
+    ("pr_reviews", "llm_requests", "INTEGER DEFAULT 0"),
+    ("pr_reviews", "llm_cache_hits", "INTEGER DEFAULT 0"),
+    ("pr_reviews", "llm_latency_ms", "REAL DEFAULT 0"),
+    ("pr_reviews", "github_calls", "INTEGER DEFAULT 0"),
+    ("pr_reviews", "github_not_modified", "INTEGER DEFAULT 0"),
+    ("pr_reviews", "duration_ms", "REAL"),
+]
+
+# Versioned schema changes, applied once in order and tracked with PRAGMA user_version
+SCHEMA_MIGRATIONS = [
+    (1, [
+        "CREATE INDEX IF NOT EXISTS idx_review_comments_review ON review_comments (pr_review_id)",
+        "CREATE INDEX IF NOT EXISTS idx_pr_reviews_created_at ON pr_reviews (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_pr_reviews_pr ON pr_reviews (repo_name, pr_number, status)",
+    ]),
+    # Keyset pagination of the reviews list, filtered by repo and/or status (rowid is implied as the last key)
+    (2, [
+        "CREATE INDEX IF NOT EXISTS idx_pr_reviews_repo_created_at ON pr_reviews (repo_name, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_pr_reviews_status_created_at ON pr_reviews (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_pr_reviews_repo_status_created_at ON pr_reviews (repo_name, status, created_at)",
+    ]),
+    # Index comments stored before the full-text table existed. Also drop statistics collected by earlier
+    # versions of migrations 1-2: gathered on a near-empty database they mislead the planner; PRAGMA optimize
+    # (run when connections close) collects fresh ones
+    (3, [
+        REVIEW_COMMENTS_FTS_REBUILD_SQL,
+        "DROP TABLE IF EXISTS sqlite_stat1",
+    ]),
+    # Populate analytics from reviews stored before the summary tables existed
+    (4, REPO_STATS_BACKFILL_SQL),
+    # At most one queued/running review per PR head, across all processes sharing DB_FILE
+    (5, [
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pr_reviews_active_head ON pr_reviews (repo_name, pr_number, head_sha)
+        WHERE status IN ('queued', 'running')
+        """,
+    ]),
+    # GitHub rate limiter state moved to GITHUB_RATE_LIMIT_DB_FILE
+    (6, [
+        "DROP TABLE IF EXISTS github_rate_limits",
+    ]),
+]
+
+REVIEW_JOBS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS review_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        review_id INTEGER NOT NULL,
+        pr_url TEXT NOT NULL,
+        incremental INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL DEFAULT 'queued',  -- queued, leased or dead; finished jobs are deleted
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        available_at REAL NOT NULL,
+        lease_owner TEXT,
+        lease_expires_at REAL,
+        last_error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (review_id) REFERENCES pr_reviews (id)
+    )
+"""
+
+# Claiming scans only the jobs that are ready or whose lease ran out
+REVIEW_JOBS_INDEXES_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_review_jobs_queued ON review_jobs (available_at) WHERE status = 'queued'",
+    "CREATE INDEX IF NOT EXISTS idx_review_jobs_leased ON review_jobs (lease_expires_at) WHERE status = 'leased'",
+    "CREATE INDEX IF NOT EXISTS idx_review_jobs_review ON review_jobs (review_id)",
+]
+
+GITHUB_HTTP_CACHE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS github_http_cache (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        link TEXT,
+        body TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        last_accessed REAL NOT NULL
+    )
+"""
+
+GITHUB_HTTP_CACHE_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_github_http_cache_last_accessed ON github_http_cache (last_accessed)
+"""
+
+GITHUB_RATE_LIMITS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS github_rate_limits (
+        token_key TEXT PRIMARY KEY,
+        remaining INTEGER,
+        limit_total INTEGER,
+        reset_at REAL,
+        blocked_until REAL DEFAULT 0,
+        backoff_seconds REAL DEFAULT 0,
+        bucket_tokens REAL NOT NULL,
+        bucket_updated REAL NOT NULL
+    )
+"""
+
+LLM_CACHE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        cache_key TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_accessed REAL NOT NULL,
+        hit_count INTEGER DEFAULT 0
+    )
+"""
+
+LLM_CACHE_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache (last_accessed)
+"""
\ No newline at end of file
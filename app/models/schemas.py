@@ -7,6 +7,7 @@ from pydantic import BaseModel
 class PRReviewRequest(BaseModel):
     """Request model for PR review"""
     pr_url: str
+    incremental: bool = False  # Only review files changed since the last reviewed head SHA
 
 class PRReviewResponse(BaseModel):
     """Response model for PR review"""
@@ -2,31 +2,106 @@
 Utility for loading and formatting prompt templates
 """
 import os
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Any
+from string import Formatter
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..config.settings import PROMPT_RELOAD_INTERVAL
+
+class PromptTemplate:
+    """Prompt template pre-parsed into literal text and named fields"""
+    
+    def __init__(self, parts: List[Tuple[str, Optional[str]]]):
+        """Initialize from (literal, field name or None) pairs"""
+        self.parts = parts
+        self.fields = {field for _, field in parts if field is not None}
+    
+    @classmethod
+    def compile(cls, template: str) -> "PromptTemplate":
+        """Parse str.format syntax once; only plain {name} fields are supported"""
+        parts = []
+        for literal, field, format_spec, conversion in Formatter().parse(template):
+            if field is not None and (not field.isidentifier() or format_spec or conversion):
+                raise ValueError(f"Unsupported prompt field: {{{field}}}")
+            parts.append((literal, field))
+        return cls(parts)
+    
+    def bind(self, **kwargs) -> "PromptTemplate":
+        """Substitute some fields now and keep the rest for render()"""
+        parts = []
+        pending = ""
+        for literal, field in self.parts:
+            pending += literal
+            if field is None:
+                continue
+            if field in kwargs:
+                pending += str(kwargs[field])
+            else:
+                parts.append((pending, field))
+                pending = ""
+        parts.append((pending, None))
+        return PromptTemplate(parts)
+    
+    def render(self, **kwargs) -> str:
+        """Substitute all remaining fields"""
+        # Values are inserted verbatim, so braces in a PR body or patch are never re-parsed
+        return "".join([literal + (str(kwargs[field]) if field is not None else "") for literal, field in self.parts])
 
 class PromptLoader:
     """Load and format prompt templates from files"""
     
-    def __init__(self):
+    def __init__(self, reload_interval: float = PROMPT_RELOAD_INTERVAL):
         """Initialize with prompts directory path"""
         self.prompts_dir = Path(__file__).parent
+        self.reload_interval = reload_interval
+        # prompt name -> (file mtime, last mtime check, text, compiled template)
+        self._cache: Dict[str, Tuple[int, float, str, PromptTemplate]] = {}
+        self._lock = threading.Lock()
     
-    def load_prompt(self, prompt_name: str) -> str:
-        """Load a prompt template from file"""
-        prompt_file = self.prompts_dir / f"{prompt_name}.txt"
+    def _entry(self, prompt_name: str) -> Tuple[int, float, str, PromptTemplate]:
+        """Return the cached template, re-reading the file if its mtime changed"""
+        entry = self._cache.get(prompt_name)
+        now = time.monotonic()
+        if entry is not None and now - entry[1] < self.reload_interval:
+            return entry
         
-        if not prompt_file.exists():
+        prompt_file = self.prompts_dir / f"{prompt_name}.txt"
+        try:
+            mtime = os.stat(prompt_file).st_mtime_ns
+        except FileNotFoundError:
             raise FileNotFoundError(f"Prompt file not found: {prompt_file}")
         
-        with open(prompt_file, 'r', encoding='utf-8') as f:
-            return f.read()
+        with self._lock:
+            entry = self._cache.get(prompt_name)
+            if entry is not None and entry[0] == mtime:
+                entry = (mtime, now, entry[2], entry[3])
+            else:
+                with open(prompt_file, 'r', encoding='utf-8') as f:
+                    text = f.read()
+                entry = (mtime, now, text, PromptTemplate.compile(text))
+            self._cache[prompt_name] = entry
+        return entry
     
-    def format_prompt(self, prompt_name: str, **kwargs) -> str:
-        """Load and format a prompt template with variables"""
-        template = self.load_prompt(prompt_name)
-        
-        # Handle None values by replacing with default text
+    def load_prompt(self, prompt_name: str) -> str:
+        """Load a prompt template from file"""
+        return self._entry(prompt_name)[2]
+    
+    def get_template(self, prompt_name: str) -> PromptTemplate:
+        """Get the compiled form of a prompt template"""
+        return self._entry(prompt_name)[3]
+    
+    def reload(self) -> int:
+        """Drop cached templates so the next use re-reads them, returning how many were cached"""
+        with self._lock:
+            cached = len(self._cache)
+            self._cache.clear()
+        return cached
+    
+    @staticmethod
+    def _prepare_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle None values by replacing with default text"""
         formatted_kwargs = {}
         for key, value in kwargs.items():
             if value is None:
@@ -36,8 +111,35 @@ class PromptLoader:
                     formatted_kwargs[key] = ''
             else:
                 formatted_kwargs[key] = value
-        
-        return template.format(**formatted_kwargs)
+        return formatted_kwargs
+    
+    def format_prompt(self, prompt_name: str, **kwargs) -> str:
+        """Load and format a prompt template with variables"""
+        return self.get_template(prompt_name).render(**self._prepare_kwargs(kwargs))
+    
+    def bind_review(self, pr_title: Optional[str], pr_body: Optional[str]) -> "ReviewPrompts":
+        """Render the prompts of one review with its PR-level fields filled in"""
+        return ReviewPrompts(self, pr_title, pr_body)
+
+class ReviewPrompts:
+    """Prompts of a single review: system prompt and PR title/body are rendered once, per-file fields per request"""
+    
+    def __init__(self, loader: PromptLoader, pr_title: Optional[str], pr_body: Optional[str]):
+        """Bind the current templates to one PR"""
+        pr_fields = loader._prepare_kwargs({"pr_title": pr_title, "pr_body": pr_body})
+        self.system_prompt = loader.load_prompt("system_prompt")
+        self.file_prompt = loader.get_template("code_review_prompt").bind(**pr_fields)
+        self.batch_prompt = loader.get_template("multi_file_review_prompt").bind(**pr_fields)
+        self.section = loader.get_template("multi_file_section")
+    
+    def single_file(self, filename: str, patch: str) -> str:
+        """User prompt reviewing one file or chunk"""
+        return self.file_prompt.render(filename=filename, patch=patch)
+    
+    def multi_file(self, files: List[Tuple[str, str]]) -> str:
+        """User prompt reviewing several (filename, patch) pairs in one request"""
+        sections = [self.section.render(filename=filename, patch=patch) for filename, patch in files]
+        return self.batch_prompt.render(file_count=len(files), files="\n".join(sections))
 
 # Global instance for easy importing
-prompt_loader = PromptLoader() 
\ No newline at end of file
+prompt_loader = PromptLoader()
\ No newline at end of file
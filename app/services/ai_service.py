@@ -1,89 +1,545 @@
 """
 AI service for code analysis using OpenAI
 """
+import asyncio
 import json
 import logging
-from typing import List, Dict, Any
+import time
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional, Tuple
+import aiohttp
 import openai
 
-from ..config.settings import OPENAI_API_KEY, MODEL
-from ..models.database import ReviewComment
-from ..prompts.prompt_loader import prompt_loader
+from ..config.settings import (
+    OPENAI_API_KEY, MODEL, AI_MAX_CONCURRENCY, AI_REQUEST_TIMEOUT, LLM_CACHE_ENABLED,
+    MODEL_CONTEXT_WINDOWS, AI_PATCH_CONTEXT_FRACTION, AI_CHUNK_CONTEXT_LINES,
+    AI_BATCH_SMALL_FILE_TOKENS, AI_BATCH_MAX_TOKENS, AI_BATCH_MAX_FILES, AI_PIPELINE_WINDOW,
+    AI_STREAMING, AI_MAX_COMMENTS_PER_FILE
+)
+from ..models.database import ReviewComment, ReviewUsage
+from ..database.llm_cache import LLMCache
+from ..utils.patch_utils import PatchChunk, split_patch, estimate_tokens
+from ..utils.json_stream import JSONArrayItemParser
+from ..prompts.prompt_loader import prompt_loader, ReviewPrompts
+from ..utils.metrics import (
+    stage, LLM_REQUESTS, LLM_REQUESTS_IN_FLIGHT, LLM_REQUEST_DURATION, LLM_FIRST_COMMENT, LLM_TOKENS, STAGE_ERRORS
+)
 
 logger = logging.getLogger(__name__)
 
 class AIService:
     """Service for AI-powered code analysis"""
     
-    def __init__(self):
+    # Completion parameters; part of the cache key
+    TEMPERATURE = 0.3
+    MAX_TOKENS = 1000
+    BATCH_MAX_TOKENS = 2000
+    
+    def __init__(
+        self,
+        max_concurrency: int = AI_MAX_CONCURRENCY,
+        cache: Optional[LLMCache] = None,
+        streaming: bool = AI_STREAMING,
+        max_comments_per_file: int = AI_MAX_COMMENTS_PER_FILE
+    ):
         """Initialize OpenAI client"""
         openai.api_key = OPENAI_API_KEY
+        self.max_concurrency = max(1, max_concurrency)
+        self.streaming = streaming
+        self.max_comments_per_file = max(1, max_comments_per_file)
+        self.cache = cache if cache is not None else (LLMCache() if LLM_CACHE_ENABLED else None)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
     
-    def analyze_code_with_ai(self, files: List[Dict[str, Any]], pr_title: str, pr_body: str) -> List[ReviewComment]:
-        """Analyze code changes using OpenAI"""
-        comments = []
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared keep-alive HTTP session, creating it on first use"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            await self._close_stale_session()
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=AI_REQUEST_TIMEOUT)
+            )
+            self._session_loop = loop
+        return self._session
+    
+    async def _close_stale_session(self):
+        """Close a session left over from another event loop so its connector is not leaked"""
+        session, session_loop = self._session, self._session_loop
+        if session is None or session.closed:
+            return
+        if session_loop is not None and session_loop.is_running():
+            # Its connections belong to a loop running in another thread
+            asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+            return
+        try:
+            await session.close()
+        except Exception as e:
+            # Pooled connections of a closed loop cannot be shut down cleanly; the session is dropped anyway
+            logger.warning(f"Error closing HTTP session of a previous event loop: {e}")
+    
+    async def close(self):
+        """Close the shared HTTP session"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    
+    async def analyze_code_with_ai(
+        self,
+        files: List[Dict[str, Any]],
+        pr_title: str,
+        pr_body: str,
+        usage: Optional[ReviewUsage] = None
+    ) -> List[ReviewComment]:
+        """Analyze code changes using OpenAI, chunking large patches and batching small ones"""
+        async def iterate_files():
+            for file_info in files:
+                yield file_info
         
-        for file_info in files:
-            filename = file_info['filename']
-            patch = file_info['patch']
+        return await self.analyze_file_stream(iterate_files(), pr_title, pr_body, usage)
+    
+    async def analyze_file_stream(
+        self,
+        files: AsyncIterator[Dict[str, Any]],
+        pr_title: str,
+        pr_body: str,
+        usage: Optional[ReviewUsage] = None,
+        on_result: Optional[Callable[[str, int, List[ReviewComment]], None]] = None,
+        on_comment: Optional[Callable[[ReviewComment], None]] = None
+    ) -> List[ReviewComment]:
+        """Analyze files as they arrive, pausing the stream while the in-flight window is full"""
+        # on_result(filename, chunk_index, comments) is called as each file or chunk finishes, in completion order;
+        # on_comment(comment) as soon as each comment has been parsed, before its request completes
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        window = asyncio.Semaphore(max(self.max_concurrency, AI_PIPELINE_WINDOW))
+        # Templates, system prompt and PR title/body are resolved once for the whole review
+        prompts = prompt_loader.bind_review(pr_title, pr_body)
+        budget = self._patch_token_budget(prompts)
+        tasks: List[asyncio.Task] = []
+        filenames: List[str] = []
+        
+        # openai reads the session from a ContextVar; tasks created below inherit it
+        openai.aiosession.set(await self._get_session())
+        
+        async def analyze_chunk(order: tuple, filename: str, chunk: PatchChunk) -> List[tuple]:
+            return [(order, await self._analyze_chunk(filename, chunk, prompts, usage, on_comment))]
+        
+        async def analyze_batch(batch: List[tuple]) -> List[tuple]:
+            if len(batch) == 1:
+                return await analyze_chunk(*batch[0])
+            return await self._analyze_batch(batch, prompts, usage, on_comment)
+        
+        async def dispatch(analyze, *args):
+            # Blocking here stops pulling files, which in turn pauses GitHub paging
+            await window.acquire()
             
-            # Skip very large files
-            if len(patch) > 10000:
-                logger.warning(f"Skipping large file: {filename}")
-                continue
+            async def run() -> List[tuple]:
+                try:
+                    async with semaphore:
+                        unit_results = await analyze(*args)
+                finally:
+                    window.release()
+                if on_result is not None:
+                    for (file_index, chunk_index), unit_comments in unit_results:
+                        on_result(filenames[file_index], chunk_index, unit_comments)
+                return unit_results
             
-            file_comments = self._analyze_single_file(filename, patch, pr_title, pr_body)
-            comments.extend(file_comments)
+            tasks.append(asyncio.create_task(run()))
+        
+        # Small files are packed next-fit in arrival order; they are at most
+        # AI_BATCH_SMALL_FILE_TOKENS each, so little of a batch goes unused
+        batch: List[tuple] = []
+        batch_tokens = 0
+        file_index = -1
+        try:
+            async for file_info in files:
+                file_index += 1
+                filenames.append(file_info['filename'])
+                chunks = split_patch(file_info['patch'], budget, AI_CHUNK_CONTEXT_LINES)
+                if len(chunks) > 1:
+                    logger.info(f"Split {file_info['filename']} into {len(chunks)} chunks")
+                elif chunks and estimate_tokens(chunks[0].patch) <= AI_BATCH_SMALL_FILE_TOKENS:
+                    tokens = estimate_tokens(chunks[0].patch)
+                    if batch and (batch_tokens + tokens > AI_BATCH_MAX_TOKENS or len(batch) >= AI_BATCH_MAX_FILES):
+                        await dispatch(analyze_batch, batch)
+                        batch, batch_tokens = [], 0
+                    batch.append(((file_index, 0), file_info['filename'], chunks[0]))
+                    batch_tokens += tokens
+                    continue
+                for chunk_index, chunk in enumerate(chunks):
+                    await dispatch(analyze_chunk, (file_index, chunk_index), file_info['filename'], chunk)
+            
+            if batch:
+                await dispatch(analyze_batch, batch)
+            task_results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        
+        results = [item for unit_results in task_results for item in unit_results]
         
+        # Restore PR file and hunk order regardless of how work was grouped
+        results.sort(key=lambda item: item[0])
+        comments = []
+        for _, unit_comments in results:
+            comments.extend(unit_comments)
+        return comments
+    
+    def _patch_token_budget(self, prompts: ReviewPrompts) -> int:
+        """Token budget for one patch chunk, derived from the model's context window"""
+        context_window = MODEL_CONTEXT_WINDOWS.get(MODEL, min(MODEL_CONTEXT_WINDOWS.values()))
+        prompt_overhead = estimate_tokens(prompts.system_prompt + prompts.single_file("", ""))
+        available = context_window - self.MAX_TOKENS - prompt_overhead
+        return max(256, min(int(context_window * AI_PATCH_CONTEXT_FRACTION), available))
+    
+    async def _analyze_chunk(
+        self,
+        filename: str,
+        chunk: PatchChunk,
+        prompts: ReviewPrompts,
+        usage: Optional[ReviewUsage] = None,
+        on_comment: Optional[Callable[[ReviewComment], None]] = None
+    ) -> List[ReviewComment]:
+        """Analyze one chunk and map returned line numbers back to lines of the file it covers"""
+        comments = []
+        seen = set()
+        
+        def accept(comment: ReviewComment):
+            line_number = chunk.map_line(comment.line_number)
+            if line_number is None or (line_number, comment.comment) in seen:
+                return
+            seen.add((line_number, comment.comment))
+            comment.line_number = line_number
+            comments.append(comment)
+            if on_comment is not None:
+                on_comment(comment)
+        
+        await self._analyze_single_file(filename, chunk.patch, prompts, usage, accept)
         return comments
     
-    def _analyze_single_file(self, filename: str, patch: str, pr_title: str, pr_body: str) -> List[ReviewComment]:
+    async def _analyze_batch(
+        self,
+        batch: List[tuple],
+        prompts: ReviewPrompts,
+        usage: Optional[ReviewUsage] = None,
+        on_comment: Optional[Callable[[ReviewComment], None]] = None
+    ) -> List[tuple]:
+        """Analyze several small files in one request and demultiplex comments by file_path"""
+        filenames = [filename for _, filename, _ in batch]
+        prompt = prompts.multi_file([(filename, chunk.patch) for _, filename, chunk in batch])
+        
+        label = f"batch of {len(batch)} files ({filenames[0]}, ...)"
+        attribution = [(filename, estimate_tokens(chunk.patch)) for _, filename, chunk in batch]
+        results = {order: [] for order, _, _ in batch}
+        seen = set()
+        
+        def accept(data: Dict[str, Any]):
+            match = self._match_batch_file(data.get('file_path'), batch)
+            if match is None:
+                logger.warning(f"Dropping comment for unknown file {data.get('file_path')!r} in {label}")
+                return
+            order, filename, chunk = match
+            line_number = chunk.map_line(data['line_number'])
+            if line_number is None or (filename, line_number, data['comment']) in seen:
+                return
+            if len(results[order]) >= self.max_comments_per_file:
+                return
+            seen.add((filename, line_number, data['comment']))
+            comment = ReviewComment(file_path=filename, line_number=line_number, comment=data['comment'])
+            results[order].append(comment)
+            if on_comment is not None:
+                on_comment(comment)
+        
+        with stage("analyze_batch"):
+            await self._complete(
+                prompts.system_prompt, prompt, label, self.BATCH_MAX_TOKENS, usage, attribution,
+                self.max_comments_per_file * len(batch), accept, "analyze_batch"
+            )
+        
+        return list(results.items())
+    
+    @staticmethod
+    def _match_batch_file(file_path: Optional[str], batch: List[tuple]) -> Optional[tuple]:
+        """Find the batch entry a comment's file_path refers to"""
+        if not file_path:
+            return None
+        file_path = file_path.strip()
+        if file_path.startswith('./'):
+            file_path = file_path[2:]
+        for item in batch:
+            if item[1] == file_path:
+                return item
+        # Tolerate the model shortening paths to a unique suffix
+        suffix_matches = [item for item in batch if item[1].endswith('/' + file_path)]
+        return suffix_matches[0] if len(suffix_matches) == 1 else None
+    
+    async def _analyze_single_file(
+        self,
+        filename: str,
+        patch: str,
+        prompts: ReviewPrompts,
+        usage: Optional[ReviewUsage] = None,
+        on_comment: Optional[Callable[[ReviewComment], None]] = None
+    ) -> List[ReviewComment]:
         """Analyze a single file with AI"""
-        # Load and format AI prompt from template
-        prompt = prompt_loader.format_prompt(
-            "code_review_prompt",
-            pr_title=pr_title,
-            pr_body=pr_body,
-            filename=filename,
-            patch=patch
-        )
-
-        try:
-            # Load system prompt from file
-            system_prompt = prompt_loader.load_prompt("system_prompt")
-            
-            response = openai.ChatCompletion.create(
-                model=MODEL,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3,
-                max_tokens=1000
+        # Fill the per-file fields of the review's pre-bound template
+        prompt = prompts.single_file(filename, patch)
+        comments = []
+        
+        def accept(data: Dict[str, Any]):
+            comment = self._to_review_comments(filename, [data])[0]
+            comments.append(comment)
+            if on_comment is not None:
+                on_comment(comment)
+        
+        with stage("analyze_file"):
+            await self._complete(
+                prompts.system_prompt, prompt, filename, self.MAX_TOKENS, usage, [(filename, 1)],
+                self.max_comments_per_file, accept, "analyze_file"
             )
+        return comments
+    
+    async def _complete(
+        self,
+        system_prompt: str,
+        prompt: str,
+        label: str,
+        max_tokens: int,
+        usage: Optional[ReviewUsage] = None,
+        attribution: Optional[List[Tuple[str, float]]] = None,
+        max_comments: Optional[int] = None,
+        on_comment: Optional[Callable[[Dict[str, Any]], None]] = None,
+        stage_name: Optional[str] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Run one chat completion through the LLM cache and return parsed comment dicts, passing each to on_comment"""
+        attribution = attribution or [(label, 1)]
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = LLMCache.make_key(
+                MODEL, system_prompt, prompt, temperature=self.TEMPERATURE, max_tokens=max_tokens,
+                max_comments=max_comments
+            )
+            try:
+                cached = await asyncio.to_thread(self.cache.get, cache_key)
+            except Exception as e:
+                logger.warning(f"LLM cache lookup failed for {label}: {e}")
+                cached = None
+            if cached is not None:
+                LLM_REQUESTS.inc(result="cache_hit")
+                logger.info(f"LLM cache hit for {label}")
+                if usage is not None:
+                    usage.record_llm_call(attribution, 0, 0, 0.0, cached=True)
+                for comment in cached:
+                    if on_comment is not None:
+                        on_comment(comment)
+                return cached
+        
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        try:
+            started = time.perf_counter()
+            LLM_REQUESTS_IN_FLIGHT.inc()
+            try:
+                if self.streaming:
+                    comment_data, token_usage, truncated = await self._stream_completion(
+                        messages, max_tokens, label, started, max_comments, on_comment
+                    )
+                else:
+                    comment_data, token_usage, truncated = await self._request_completion(
+                        messages, max_tokens, started, max_comments, on_comment
+                    )
+            finally:
+                LLM_REQUESTS_IN_FLIGHT.dec()
+            latency_ms = (time.perf_counter() - started) * 1000
+            LLM_REQUEST_DURATION.observe(latency_ms / 1000)
             
-            # Parse AI response
-            ai_response = response.choices[0].message.content
-            
-            # Extract JSON from response
-            json_start = ai_response.find('{')
-            json_end = ai_response.rfind('}') + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_str = ai_response[json_start:json_end]
-                result = json.loads(json_str)
-                
-                comments = []
-                for comment_data in result.get('comments', []):
-                    if comment_data.get('line_number') and comment_data.get('comment'):
-                        comments.append(ReviewComment(
-                            file_path=filename,
-                            line_number=comment_data['line_number'],
-                            comment=comment_data['comment']
-                        ))
-                return comments
+            LLM_TOKENS.inc(token_usage.get("prompt_tokens", 0), type="prompt")
+            LLM_TOKENS.inc(token_usage.get("completion_tokens", 0), type="completion")
+            if usage is not None:
+                usage.record_llm_call(
+                    attribution,
+                    token_usage.get("prompt_tokens", 0),
+                    token_usage.get("completion_tokens", 0),
+                    latency_ms
+                )
+            if truncated:
+                # Comments from a completion cut off by max_tokens are used, but are not the full answer to cache
+                LLM_REQUESTS.inc(result="truncated")
+                logger.warning(f"Completion for {label} hit max_tokens, {len(comment_data or [])} comments kept")
+            else:
+                LLM_REQUESTS.inc(result="ok" if comment_data is not None else "unparsable")
             
+            if comment_data is not None and cache_key is not None and not truncated:
+                try:
+                    await asyncio.to_thread(self.cache.set, cache_key, MODEL, comment_data)
+                except Exception as e:
+                    logger.warning(f"LLM cache store failed for {label}: {e}")
+            return comment_data
+        
         except Exception as e:
-            logger.error(f"Error analyzing file {filename}: {str(e)}")
+            LLM_REQUESTS.inc(result="error")
+            # The failure is swallowed here, so the caller's stage() never sees it
+            if stage_name is not None:
+                STAGE_ERRORS.inc(stage=stage_name)
+            logger.error(f"Error analyzing {label}: {str(e)}")
+        
+        return None
+    
+    async def _request_completion(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        started: float,
+        max_comments: Optional[int],
+        on_comment: Optional[Callable[[Dict[str, Any]], None]]
+    ) -> Tuple[Optional[List[Dict[str, Any]]], Dict[str, int], bool]:
+        """Wait for the whole completion, then parse it; returns (comments, token usage, cut off by max_tokens)"""
+        response = await openai.ChatCompletion.acreate(
+            model=MODEL,
+            messages=messages,
+            temperature=self.TEMPERATURE,
+            max_tokens=max_tokens,
+            request_timeout=AI_REQUEST_TIMEOUT
+        )
+        content = response.choices[0].message.content
+        truncated = response.choices[0].get("finish_reason") == "length"
+        try:
+            comment_data = self._parse_comments(content)
+        except json.JSONDecodeError:
+            if not truncated:
+                raise
+            # Keep the comments that were complete before the cut-off
+            items = JSONArrayItemParser("comments").feed(content)
+            comment_data = [comment for comment in map(self._normalize_comment, items) if comment is not None]
+        if comment_data is not None:
+            comment_data = comment_data[:max_comments]
+            if comment_data:
+                LLM_FIRST_COMMENT.observe(time.perf_counter() - started)
+            for comment in comment_data:
+                if on_comment is not None:
+                    on_comment(comment)
+        return comment_data, getattr(response, "usage", None) or {}, truncated
+    
+    async def _stream_completion(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        label: str,
+        started: float,
+        max_comments: Optional[int],
+        on_comment: Optional[Callable[[Dict[str, Any]], None]]
+    ) -> Tuple[Optional[List[Dict[str, Any]]], Dict[str, int], bool]:
+        """Parse comments as the completion streams in, hanging up once max_comments are in; returns (comments, token usage, cut off by max_tokens)"""
+        parser = JSONArrayItemParser("comments")
+        parts: List[str] = []
+        comments: List[Dict[str, Any]] = []
+        token_usage: Dict[str, int] = {}
+        capped = False
+        truncated = False
+        
+        stream = await openai.ChatCompletion.acreate(
+            model=MODEL,
+            messages=messages,
+            temperature=self.TEMPERATURE,
+            max_tokens=max_tokens,
+            request_timeout=AI_REQUEST_TIMEOUT,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        try:
+            async for chunk in stream:
+                if chunk.get("usage"):
+                    token_usage = chunk["usage"]
+                if not chunk.get("choices"):
+                    continue
+                if chunk["choices"][0].get("finish_reason") == "length":
+                    truncated = True
+                text = chunk["choices"][0].get("delta", {}).get("content")
+                if not text:
+                    continue
+                parts.append(text)
+                for item in parser.feed(text):
+                    comment = self._normalize_comment(item)
+                    if comment is None:
+                        continue
+                    if not comments:
+                        LLM_FIRST_COMMENT.observe(time.perf_counter() - started)
+                    comments.append(comment)
+                    if on_comment is not None:
+                        on_comment(comment)
+                    if max_comments is not None and len(comments) >= max_comments:
+                        capped = True
+                        break
+                if capped:
+                    # Closing the stream drops the connection, which stops generation and billing
+                    logger.info(f"Stopped completion for {label} at {len(comments)} comments")
+                    break
+        finally:
+            await stream.aclose()
+        
+        if not token_usage:
+            # Usage only arrives in the final chunk, which a cut-off stream never receives
+            token_usage = {
+                "prompt_tokens": sum(estimate_tokens(message["content"]) for message in messages),
+                "completion_tokens": estimate_tokens("".join(parts))
+            }
+        if comments or capped or parser.finished or truncated:
+            return comments, token_usage, truncated
+        
+        # Nothing recognisable streamed (e.g. an unexpected layout): fall back to parsing the whole text
+        comment_data = self._parse_comments("".join(parts))
+        if comment_data is not None:
+            comment_data = comment_data[:max_comments]
+            for comment in comment_data:
+                if on_comment is not None:
+                    on_comment(comment)
+        return comment_data, token_usage, False
+    
+    @staticmethod
+    def _parse_comments(ai_response: str) -> Optional[List[Dict[str, Any]]]:
+        """Extract valid comment dicts from the model's JSON response"""
+        # Extract JSON from response
+        json_start = ai_response.find('{')
+        json_end = ai_response.rfind('}') + 1
+        
+        if json_start < 0 or json_end <= json_start:
+            return None
         
-        return [] 
\ No newline at end of file
+        result = json.loads(ai_response[json_start:json_end])
+        comments = []
+        for comment_data in result.get('comments', []):
+            parsed = AIService._normalize_comment(comment_data)
+            if parsed is not None:
+                comments.append(parsed)
+        return comments
+    
+    @staticmethod
+    def _normalize_comment(comment_data: Any) -> Optional[Dict[str, Any]]:
+        """Validate one comment object from the model, or None if it lacks a usable line and text"""
+        if not isinstance(comment_data, dict) or not (comment_data.get('line_number') and comment_data.get('comment')):
+            return None
+        try:
+            line_number = int(comment_data['line_number'])
+        except (TypeError, ValueError):
+            return None
+        parsed = {"line_number": line_number, "comment": comment_data['comment']}
+        if comment_data.get('file_path'):
+            parsed["file_path"] = comment_data['file_path']
+        return parsed
+    
+    @staticmethod
+    def _to_review_comments(filename: str, comment_data: List[Dict[str, Any]]) -> List[ReviewComment]:
+        """Convert parsed comment dicts to ReviewComment objects"""
+        return [
+            ReviewComment(
+                file_path=filename,
+                line_number=data['line_number'],
+                comment=data['comment']
+            )
+            for data in comment_data
+        ]
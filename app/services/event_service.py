@@ -0,0 +1,115 @@
+"""
+In-process fan-out of review progress events to Server-Sent Events subscribers
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Set
+
+from ..config.settings import REVIEW_EVENTS_HISTORY, REVIEW_EVENTS_RETENTION_SECONDS, REVIEW_EVENTS_SUBSCRIBER_QUEUE
+
+logger = logging.getLogger(__name__)
+
+# Last event of a review; subscribers stop after it
+FINAL_EVENT = "done"
+# Sent in place of further events to a subscriber that fell too far behind
+LAGGED_EVENT = "lagged"
+
+@dataclass
+class ReviewEvent:
+    """One progress event of a review"""
+    id: int  # Sequence number within the review, sent as the SSE id for Last-Event-ID resumption; 0 sends none
+    event: str
+    data: Dict[str, Any]
+    
+    def encode(self) -> str:
+        """Render as a text/event-stream message"""
+        message = f"event: {self.event}\ndata: {json.dumps(self.data)}\n\n"
+        return f"id: {self.id}\n{message}" if self.id else message
+
+@dataclass
+class ReviewEventStream:
+    """Replay buffer and live subscriber queues of one review"""
+    history: Deque[ReviewEvent]
+    subscribers: Set[asyncio.Queue] = field(default_factory=set)
+    next_id: int = 1
+    expiry: Optional[asyncio.TimerHandle] = None
+
+class ReviewEventBus:
+    """Publish review pipeline events and deliver them to subscribers in this process"""
+    
+    def __init__(
+        self,
+        history_size: int = REVIEW_EVENTS_HISTORY,
+        retention_seconds: float = REVIEW_EVENTS_RETENTION_SECONDS,
+        queue_size: int = REVIEW_EVENTS_SUBSCRIBER_QUEUE
+    ):
+        """Initialize buffer limits"""
+        self.history_size = history_size
+        self.retention_seconds = retention_seconds
+        self.queue_size = queue_size
+        self._streams: Dict[int, ReviewEventStream] = {}
+    
+    def _stream(self, review_id: int) -> ReviewEventStream:
+        """Get or create the stream of a review"""
+        stream = self._streams.get(review_id)
+        if stream is None:
+            stream = self._streams[review_id] = ReviewEventStream(history=deque(maxlen=self.history_size))
+        return stream
+    
+    def publish(self, review_id: int, event: str, **data: Any):
+        """Record an event and hand it to every subscriber without waiting for them"""
+        stream = self._stream(review_id)
+        review_event = ReviewEvent(stream.next_id, event, data)
+        stream.next_id += 1
+        stream.history.append(review_event)
+        
+        for queue in list(stream.subscribers):
+            try:
+                queue.put_nowait(review_event)
+            except asyncio.QueueFull:
+                # A slow client must not hold up the review; it can reconnect and resume from history
+                stream.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(ReviewEvent(0, LAGGED_EVENT, {}))
+                logger.warning(f"Disconnected a slow event subscriber of review {review_id}")
+        
+        self._schedule_expiry(review_id, stream)
+    
+    def subscribe(self, review_id: int, last_event_id: int = 0) -> asyncio.Queue:
+        """Queue of the review's events after last_event_id: buffered ones first, then live ones"""
+        stream = self._stream(review_id)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        for review_event in stream.history:
+            if review_event.id > last_event_id and not queue.full():
+                queue.put_nowait(review_event)
+        stream.subscribers.add(queue)
+        self._schedule_expiry(review_id, stream)
+        return queue
+    
+    def unsubscribe(self, review_id: int, queue: asyncio.Queue):
+        """Stop delivering events to a queue"""
+        stream = self._streams.get(review_id)
+        if stream is not None:
+            stream.subscribers.discard(queue)
+    
+    def _schedule_expiry(self, review_id: int, stream: ReviewEventStream):
+        """Drop the review's buffer once it has been idle for the retention period"""
+        if stream.expiry is not None:
+            stream.expiry.cancel()
+        stream.expiry = asyncio.get_running_loop().call_later(self.retention_seconds, self._expire, review_id)
+    
+    def _expire(self, review_id: int):
+        """Forget an idle review, unless someone is still listening"""
+        stream = self._streams.get(review_id)
+        if stream is None:
+            return
+        if stream.subscribers:
+            self._schedule_expiry(review_id, stream)
+            return
+        del self._streams[review_id]
+
+# Global instance for easy importing
+review_events = ReviewEventBus()
@@ -0,0 +1,202 @@
+"""
+Minimal GitHub REST client with ETag-based conditional reads
+"""
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlencode
+import requests
+
+from ..config.settings import (
+    GITHUB_TOKEN, GITHUB_API_URL, GITHUB_REQUEST_TIMEOUT, GITHUB_PER_PAGE, GITHUB_HTTP_CACHE_ENABLED,
+    GITHUB_RATE_LIMIT_ENABLED, GITHUB_RATE_LIMIT_MAX_RETRIES
+)
+from ..database.http_cache import GitHubHTTPCache
+from ..models.database import ReviewUsage
+from ..services.rate_limiter import GitHubRateLimiter, PRIORITY_HIGH
+from ..utils.metrics import GITHUB_REQUESTS, GITHUB_REQUEST_DURATION, GITHUB_RETRIES
+
+logger = logging.getLogger(__name__)
+
+class GitHubAPIError(Exception):
+    """Raised for unsuccessful GitHub API responses"""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"{status} {message}")
+        self.status = status
+        self.headers = headers or {}
+
+class GitHubAPIClient:
+    """GitHub REST client that revalidates cached reads with If-None-Match / If-Modified-Since"""
+    
+    def __init__(
+        self,
+        token: Optional[str] = GITHUB_TOKEN,
+        base_url: str = GITHUB_API_URL,
+        cache: Optional[GitHubHTTPCache] = None,
+        limiter: Optional[GitHubRateLimiter] = None
+    ):
+        """Initialize client settings, response cache and rate limiter"""
+        self.token = token
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache if cache is not None else (GitHubHTTPCache() if GITHUB_HTTP_CACHE_ENABLED else None)
+        self.limiter = limiter if limiter is not None else (GitHubRateLimiter(token) if GITHUB_RATE_LIMIT_ENABLED else None)
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """Keep-alive session per thread (requests.Session is not thread-safe)"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update({
+                "Accept": "application/vnd.github+json",
+                "User-Agent": "github-code-reviewer"
+            })
+            if self.token:
+                session.headers["Authorization"] = f"token {self.token}"
+            self._local.session = session
+        return session
+
+    def url_for(self, path: str, params: Optional[Dict[str, Any]] = None) -> str:
+        """Build an absolute API URL"""
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+        return url
+    
+    def get(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        usage: Optional[ReviewUsage] = None,
+        priority: str = PRIORITY_HIGH,
+        max_wait: Optional[float] = None
+    ) -> Any:
+        """GET a JSON resource, served from cache when GitHub answers 304 Not Modified"""
+        body, _ = self._get(self.url_for(path, params), usage, priority, max_wait)
+        return body
+    
+    def get_paginated(
+        self,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        usage: Optional[ReviewUsage] = None,
+        priority: str = PRIORITY_HIGH
+    ) -> Iterator[Any]:
+        """Iterate over items of a paginated list resource, revalidating each page"""
+        url = self.url_for(path, {"per_page": GITHUB_PER_PAGE, **(params or {})})
+        while url:
+            items, link = self._get(url, usage, priority)
+            yield from items
+            url = self._next_page_url(link)
+    
+    def post(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        usage: Optional[ReviewUsage] = None,
+        priority: str = PRIORITY_HIGH
+    ) -> Any:
+        """POST a JSON payload and return the decoded response"""
+        response = self._send("POST", self.url_for(path), priority, json=payload)
+        if usage is not None:
+            usage.record_github_calls()
+        self._raise_for_status(response)
+        return response.json()
+    
+    def delete(self, path: str, usage: Optional[ReviewUsage] = None, priority: str = PRIORITY_HIGH):
+        """DELETE a resource"""
+        response = self._send("DELETE", self.url_for(path), priority)
+        if usage is not None:
+            usage.record_github_calls()
+        self._raise_for_status(response)
+    
+    def _send(self, method: str, url: str, priority: str, max_wait: Optional[float] = None, **kwargs) -> requests.Response:
+        """Send a request through the rate limiter, retrying after rate limit responses"""
+        for attempt in range(GITHUB_RATE_LIMIT_MAX_RETRIES + 1):
+            if self.limiter is not None:
+                self.limiter.acquire(priority, max_wait)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=GITHUB_REQUEST_TIMEOUT, **kwargs)
+            except requests.RequestException:
+                GITHUB_REQUESTS.inc(method=method, status="error")
+                raise
+            finally:
+                GITHUB_REQUEST_DURATION.observe(time.perf_counter() - started, method=method)
+            GITHUB_REQUESTS.inc(method=method, status=str(response.status_code))
+            if self.limiter is None:
+                return response
+            
+            wait = self.limiter.update(response.status_code, response.headers, self._error_message(response))
+            if wait is None or attempt == GITHUB_RATE_LIMIT_MAX_RETRIES:
+                return response
+            # The limiter now blocks every process until the window passes; acquire() waits it out
+            GITHUB_RETRIES.inc(reason="rate_limit")
+            logger.info(f"Retrying {method} {url} after rate limit (attempt {attempt + 1})")
+        return response
+    
+    def _get(
+        self,
+        url: str,
+        usage: Optional[ReviewUsage],
+        priority: str = PRIORITY_HIGH,
+        max_wait: Optional[float] = None
+    ) -> Tuple[Any, Optional[str]]:
+        """Perform a conditional GET and return (decoded body, Link header)"""
+        cached = self.cache.get(url) if self.cache is not None else None
+        headers = {}
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self._send("GET", url, priority, max_wait, headers=headers)
+
+        if response.status_code == 304 and cached:
+            if usage is not None:
+                usage.record_github_calls(not_modified=True)
+            self.cache.touch(url)
+            return json.loads(cached["body"]), cached["link"]
+
+        if usage is not None:
+            usage.record_github_calls()
+        self._raise_for_status(response)
+
+        link = response.headers.get("Link")
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if self.cache is not None and (etag or last_modified):
+            self.cache.set(url, response.text, etag, last_modified, link)
+        return response.json(), link
+
+    @staticmethod
+    def _error_message(response: requests.Response) -> str:
+        """Extract GitHub's error message from a failed response"""
+        if response.status_code < 400:
+            return ""
+        try:
+            return response.json().get("message", response.reason)
+        except ValueError:
+            return response.reason or ""
+    
+    def _raise_for_status(self, response: requests.Response):
+        """Raise GitHubAPIError for non-2xx responses"""
+        if response.status_code < 400:
+            return
+        raise GitHubAPIError(response.status_code, self._error_message(response), dict(response.headers))
+    
+    @staticmethod
+    def _next_page_url(link: Optional[str]) -> Optional[str]:
+        """Extract the rel="next" URL from a Link header"""
+        if not link:
+            return None
+        for part in link.split(','):
+            section = part.split(';')
+            if len(section) >= 2 and 'rel="next"' in section[1]:
+                return section[0].strip()[1:-1]
+        return None
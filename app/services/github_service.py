@@ -2,87 +2,243 @@
 GitHub API service for managing PR operations
 """
 import logging
-from typing import List
+from typing import Dict, List, Optional, Set
 from github import Github
 from github.PullRequest import PullRequest
 
-from ..config.settings import GITHUB_TOKEN
-from ..models.database import ReviewComment
+from ..config.settings import GITHUB_TOKEN, GITHUB_API_URL
+from ..models.database import ReviewComment, ReviewUsage
+from ..services.github_api import GitHubAPIClient, GitHubAPIError
+from ..services.rate_limiter import PRIORITY_LOW
 from ..utils.github_utils import parse_github_url, get_pr_files
+from ..utils.metrics import GITHUB_RETRIES
 
 logger = logging.getLogger(__name__)
 
 class GitHubService:
     """Service for GitHub API operations"""
     
+    REVIEW_SUMMARY = "🤖 **Automated Code Review**\n\nI've analyzed the changes in this PR and found some areas for improvement. Please review the comments below."
+    # GitHub rejects comment bodies longer than this
+    MAX_COMMENT_LENGTH = 65536
+    
     def __init__(self):
-        """Initialize GitHub client"""
-        self.client = Github(GITHUB_TOKEN)
+        """Initialize GitHub clients"""
+        self.client = Github(GITHUB_TOKEN, base_url=GITHUB_API_URL)
+        # Reads go through the conditional-request client so unchanged resources cost a 304
+        self.api = GitHubAPIClient()
     
-    def get_pull_request(self, pr_url: str) -> tuple[PullRequest, str, int]:
-        """Get PR object from GitHub URL"""
+    def get_pull_request(
+        self,
+        pr_url: str,
+        usage: Optional[ReviewUsage] = None,
+        max_wait: Optional[float] = None
+    ) -> tuple[PullRequest, str, int]:
+        """Get PR object from GitHub URL; max_wait bounds the wait for rate limit quota"""
         repo_name, pr_number = parse_github_url(pr_url)
-        repo = self.client.get_repo(repo_name)
-        pr = repo.get_pull(pr_number)
+        # Starting a new review: yields quota to reviews already in flight
+        data = self.api.get(
+            f"/repos/{repo_name}/pulls/{pr_number}", usage=usage, priority=PRIORITY_LOW, max_wait=max_wait
+        )
+        # Wrap the (possibly cached) payload so write operations can still use PyGithub
+        pr = self.client.create_from_raw_data(PullRequest, data)
         return pr, repo_name, pr_number
     
-    def get_pr_details(self, pr: PullRequest) -> dict:
-        """Extract PR details"""
+    def get_pr_details(self, pr: PullRequest, usage: Optional[ReviewUsage] = None) -> dict:
+        """Extract PR details; files are fetched lazily, page by page, as they are consumed"""
+        repo_name = pr.base.repo.full_name
+        files = self.api.get_paginated(f"/repos/{repo_name}/pulls/{pr.number}/files", usage=usage)
         return {
             'title': pr.title,
             'body': pr.body,
-            'files': get_pr_files(pr)
+            'files': get_pr_files(files)
+        }
+    
+    def get_changed_patches(
+        self,
+        pr: PullRequest,
+        base_sha: str,
+        head_sha: str,
+        usage: Optional[ReviewUsage] = None
+    ) -> Dict[str, str]:
+        """Get patches of files changed between two commits, keyed by filename"""
+        # Comparisons between fixed SHAs never change, so repeat requests are always 304s
+        comparison = self.api.get(f"/repos/{pr.base.repo.full_name}/compare/{base_sha}...{head_sha}", usage=usage)
+        return {
+            file['filename']: file['patch']
+            for file in comparison.get('files', [])
+            if file.get('patch')
         }
     
-    def add_review_comments_to_pr(self, pr: PullRequest, comments: List[ReviewComment]) -> int:
-        """Add review comments to GitHub PR"""
+    def add_review_comments_to_pr(
+        self,
+        pr: PullRequest,
+        comments: List[ReviewComment],
+        usage: Optional[ReviewUsage] = None,
+        commentable: Optional[Dict[str, Set[int]]] = None
+    ) -> int:
+        """Post all comments as a single PR review with inline comments on the head commit"""
         if not comments:
             return 0
         
-        # Get the latest commit SHA
-        commits = list(pr.get_commits())
-        if not commits:
-            raise ValueError("No commits found in PR")
-        
-        latest_commit = commits[-1]
-        
-        # Prepare review comments
-        review_comments = []
+        repo_name = pr.base.repo.full_name
+        inline_comments = []
+        outside_diff = []
         for comment in comments:
-            review_comments.append({
-                "path": comment.file_path,
-                "line": comment.line_number,
-                "body": comment.comment
-            })
+            if self._is_commentable(comment, commentable):
+                inline_comments.append(comment)
+            else:
+                outside_diff.append(comment)
+        
+        if outside_diff:
+            logger.info(f"{len(outside_diff)} comments are outside the diff and go in the review body")
         
-        # Create review with summary
         try:
-            pr.create_review(
-                commit=latest_commit,
-                body="🤖 **Automated Code Review**\n\nI've analyzed the changes in this PR and found some areas for improvement. Please review the comments below.",
-                event="COMMENT"
+            rejected = self._submit_review(
+                repo_name, pr.number, pr.head.sha, inline_comments, self.REVIEW_SUMMARY, outside_diff, usage
             )
-            
-            # Add individual comments as issue comments
-            added_comments = 0
-            for comment in comments:
-                try:
-                    pr.create_issue_comment(f"**{comment.file_path}:{comment.line_number}**\n{comment.comment}")
-                    added_comments += 1
-                except Exception as e2:
-                    logger.error(f"Error adding comment: {str(e2)}")
-                    continue
-            
-            return added_comments
         except Exception as e:
             logger.error(f"Error creating review: {str(e)}")
-            # Fallback: add individual comments
-            added_comments = 0
-            for comment in comments:
-                try:
-                    pr.create_issue_comment(f"**{comment.file_path}:{comment.line_number}**\n{comment.comment}")
-                    added_comments += 1
-                except Exception as e2:
-                    logger.error(f"Error adding comment: {str(e2)}")
-                    continue
-            return added_comments 
\ No newline at end of file
+            # Fallback: everything in one issue comment
+            rejected = comments
+        
+        if rejected:
+            try:
+                self.api.post(
+                    f"/repos/{repo_name}/issues/{pr.number}/comments",
+                    {"body": self._format_comment_list(self.REVIEW_SUMMARY, rejected)},
+                    usage=usage
+                )
+            except Exception as e:
+                logger.error(f"Error adding fallback comment: {str(e)}")
+                return len(comments) - len(rejected)
+        
+        return len(comments)
+    
+    def _submit_review(
+        self,
+        repo_name: str,
+        pr_number: int,
+        head_sha: str,
+        inline_comments: List[ReviewComment],
+        body: str,
+        body_comments: List[ReviewComment],
+        usage: Optional[ReviewUsage]
+    ) -> List[ReviewComment]:
+        """Create one review; on 422 leave out the inline comments GitHub rejects and return them"""
+        path = f"/repos/{repo_name}/pulls/{pr_number}/reviews"
+        if body_comments:
+            body = self._format_comment_list(body, body_comments)
+        try:
+            self.api.post(path, self._review_payload(head_sha, body, inline_comments, "COMMENT"), usage=usage)
+            return []
+        except GitHubAPIError as e:
+            if e.status != 422 or not inline_comments:
+                raise
+        
+        GITHUB_RETRIES.inc(reason="review_rejected")
+        self._discard_pending_reviews(path, usage)
+        # If the body alone is rejected no subset of the comments can help; nothing has been posted yet
+        if not self._review_accepted(path, head_sha, body, [], usage):
+            raise GitHubAPIError(422, "GitHub rejected the review body")
+        
+        rejected = self._find_rejected(path, head_sha, inline_comments, usage)
+        for comment in rejected:
+            logger.warning(f"GitHub rejected comment on {comment.file_path}:{comment.line_number}")
+        rejected_ids = {id(comment) for comment in rejected}
+        accepted = [comment for comment in inline_comments if id(comment) not in rejected_ids]
+        self.api.post(path, self._review_payload(head_sha, body, accepted, "COMMENT"), usage=usage)
+        return rejected
+    
+    def _find_rejected(
+        self,
+        path: str,
+        head_sha: str,
+        inline_comments: List[ReviewComment],
+        usage: Optional[ReviewUsage]
+    ) -> List[ReviewComment]:
+        """Bisect inline comments that GitHub rejects together down to the individual rejected ones"""
+        if len(inline_comments) == 1:
+            return inline_comments
+        
+        rejected = []
+        middle = len(inline_comments) // 2
+        for half in (inline_comments[:middle], inline_comments[middle:]):
+            if not self._review_accepted(path, head_sha, "", half, usage):
+                rejected += self._find_rejected(path, head_sha, half, usage)
+        return rejected
+    
+    def _review_accepted(
+        self,
+        path: str,
+        head_sha: str,
+        body: str,
+        inline_comments: List[ReviewComment],
+        usage: Optional[ReviewUsage]
+    ) -> bool:
+        """Check whether GitHub accepts a review by creating it as a pending draft and deleting it again"""
+        try:
+            review = self.api.post(path, self._review_payload(head_sha, body, inline_comments), usage=usage)
+        except GitHubAPIError as e:
+            if e.status != 422:
+                raise
+            return False
+        # Only one draft may exist per user and PR; a draft left behind would fail every later probe,
+        # so a failed delete aborts the bisection instead of counting as a rejection
+        try:
+            self.api.delete(f"{path}/{review['id']}", usage=usage)
+        except Exception as e:
+            raise RuntimeError(f"Could not delete draft review {review['id']}: {e}") from e
+        return True
+    
+    def _discard_pending_reviews(self, path: str, usage: Optional[ReviewUsage]):
+        """Delete drafts the token's user has on the PR, e.g. from an interrupted bisection"""
+        # GitHub lists a pending review only to its author
+        for review in self.api.get_paginated(path, usage=usage):
+            if review.get("state") == "PENDING":
+                logger.warning(f"Deleting pending review {review['id']} before checking rejected comments")
+                self.api.delete(f"{path}/{review['id']}", usage=usage)
+    
+    def _review_payload(
+        self,
+        head_sha: str,
+        body: str,
+        inline_comments: List[ReviewComment],
+        event: Optional[str] = None
+    ) -> dict:
+        """Request body creating a review; without an event the review stays a pending draft"""
+        payload = {
+            "commit_id": head_sha,
+            "comments": [
+                {
+                    "path": comment.file_path,
+                    "line": comment.line_number,
+                    "side": "RIGHT",
+                    "body": comment.comment[:self.MAX_COMMENT_LENGTH]
+                }
+                for comment in inline_comments
+            ]
+        }
+        if body:
+            payload["body"] = body
+        if event:
+            payload["event"] = event
+        return payload
+    
+    @staticmethod
+    def _is_commentable(comment: ReviewComment, commentable: Optional[Dict[str, Set[int]]]) -> bool:
+        """Check a comment targets a line inside the PR diff"""
+        if not comment.comment or not comment.comment.strip():
+            return False
+        if commentable is None:
+            return True
+        return comment.line_number in commentable.get(comment.file_path, set())
+    
+    @staticmethod
+    def _format_comment_list(header: str, comments: List[ReviewComment]) -> str:
+        """Render comments that cannot be posted inline as markdown"""
+        sections = [header] + [
+            f"**{comment.file_path}:{comment.line_number}**\n{comment.comment}"
+            for comment in comments
+        ]
+        return "\n\n".join(sections)
@@ -0,0 +1,215 @@
+"""
+Durable review job queue and the workers that process it
+"""
+import asyncio
+import logging
+import os
+import socket
+from typing import List, Optional, Tuple
+
+from ..config.settings import (
+    REVIEW_WORKERS, REVIEW_QUEUE_MAXSIZE, REVIEW_JOB_LEASE_SECONDS, REVIEW_JOB_HEARTBEAT_SECONDS,
+    REVIEW_JOB_MAX_ATTEMPTS, REVIEW_JOB_RETRY_BACKOFF_SECONDS, REVIEW_JOB_RETRY_MAX_BACKOFF_SECONDS,
+    REVIEW_JOB_POLL_SECONDS, REVIEW_SUBMIT_HEAD_SHA_TIMEOUT
+)
+from ..services.review_service import ReviewService
+from ..services.event_service import review_events, FINAL_EVENT
+from ..database.async_operations import async_db_ops
+from ..database.job_queue import ReviewJobBackend, create_job_backend
+from ..models.database import ReviewJob
+from ..utils.github_utils import parse_github_url
+from ..utils.metrics import REVIEW_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Raised when the review queue cannot accept more jobs"""
+
+class ReviewJobQueue:
+    """Queue review jobs in a durable backend and process them with a pool of async workers"""
+    
+    def __init__(
+        self,
+        review_service: ReviewService,
+        worker_count: int = REVIEW_WORKERS,
+        max_queue_size: int = REVIEW_QUEUE_MAXSIZE,
+        backend: Optional[ReviewJobBackend] = None
+    ):
+        """Initialize queue and worker settings; worker_count 0 only submits jobs"""
+        self.review_service = review_service
+        self.db_ops = async_db_ops
+        self.worker_count = max(0, worker_count)
+        self.max_queue_size = max_queue_size
+        self.backend = backend or create_job_backend()
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+    
+    async def start(self):
+        """Start worker tasks"""
+        self._workers = [
+            asyncio.create_task(self._worker(f"{self.worker_name}:{worker_id}"), name=f"review-worker-{worker_id}")
+            for worker_id in range(self.worker_count)
+        ]
+        logger.info(f"Started {self.worker_count} review workers")
+    
+    async def stop(self):
+        """Cancel worker tasks; jobs they were running are handed back to the queue"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Review workers stopped")
+    
+    async def submit(self, pr_url: str, incremental: bool = False, head_sha: Optional[str] = None) -> Tuple[int, bool]:
+        """Queue a review of the PR's head, or attach to the one already in flight; returns (review_id, created)"""
+        repo_name, pr_number = parse_github_url(pr_url)
+        if head_sha is None:
+            head_sha = await self._resolve_head_sha(pr_url)
+        
+        if await self.refresh_queue_depth() >= self.max_queue_size:
+            # Joining an existing run needs no queue slot
+            review_id = await self.db_ops.get_active_review(repo_name, pr_number, head_sha)
+            if review_id is not None:
+                logger.info(f"Attached to in-flight review {review_id} of {repo_name}#{pr_number}")
+                return review_id, False
+            raise QueueFullError("Review queue is full, please retry later")
+        
+        review_id, created = await self.db_ops.create_or_attach_review(pr_url, repo_name, pr_number, head_sha, "queued")
+        if not created:
+            logger.info(f"Attached to in-flight review {review_id} of {repo_name}#{pr_number} at {head_sha[:7]}")
+            return review_id, False
+        
+        # A crash before this write leaves an orphaned review, failed by the next startup
+        try:
+            await self.db_ops.write(self.backend.enqueue, review_id, pr_url, incremental, REVIEW_JOB_MAX_ATTEMPTS)
+        except Exception as e:
+            # A queued review without a job would capture every later submission of this head
+            error = f"Failed to queue review: {e}"
+            await self.db_ops.store_review_data(pr_url, repo_name, pr_number, "failed", None, error, review_id)
+            review_events.publish(review_id, FINAL_EVENT, status="failed", message=error, comments_count=0)
+            raise
+        self._wakeup.set()
+        logger.info(f"Queued review {review_id} for {repo_name}#{pr_number}")
+        return review_id, True
+    
+    async def _resolve_head_sha(self, pr_url: str) -> Optional[str]:
+        """Current head SHA of the PR, the key that concurrent submissions are deduplicated on"""
+        # Submissions must return quickly, so this lookup does not wait out rate limits
+        try:
+            pr, _, _ = await asyncio.wait_for(
+                asyncio.to_thread(
+                    self.review_service.github_service.get_pull_request, pr_url, None, REVIEW_SUBMIT_HEAD_SHA_TIMEOUT
+                ),
+                REVIEW_SUBMIT_HEAD_SHA_TIMEOUT
+            )
+            return pr.head.sha
+        except asyncio.TimeoutError:
+            logger.warning(f"Head SHA of {pr_url} not resolved within {REVIEW_SUBMIT_HEAD_SHA_TIMEOUT}s, queueing without it")
+            return None
+        except Exception as e:
+            # The worker reports inaccessible PRs; such a review just cannot be deduplicated
+            logger.warning(f"Could not resolve head SHA of {pr_url}: {e}")
+            return None
+    
+    async def refresh_queue_depth(self) -> int:
+        """Read the number of waiting jobs, across all processes, into the queue depth gauge"""
+        depth = await self.db_ops.read(self.backend.depth)
+        REVIEW_QUEUE_DEPTH.set(depth)
+        return depth
+    
+    async def stats(self) -> dict:
+        """Job counts by state and this process's worker count"""
+        counts = await self.db_ops.read(self.backend.stats)
+        return {**counts, "workers": self.worker_count, "max_queue_size": self.max_queue_size}
+    
+    async def _worker(self, owner: str):
+        """Claim and process jobs until cancelled"""
+        while True:
+            try:
+                job = await self.db_ops.write(self.backend.claim, owner, REVIEW_JOB_LEASE_SECONDS)
+            except Exception as e:
+                logger.error(f"Worker {owner} failed to claim a job: {e}")
+                job = None
+            
+            if job is None:
+                # Local submissions wake the worker at once; other processes' are seen on the next poll
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), REVIEW_JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+            
+            try:
+                await self._run_job(job, owner)
+            except Exception as e:
+                # The job is left leased and is reclaimed once its lease expires
+                logger.error(f"Worker {owner} crashed on review {job.review_id}: {e}")
+    
+    async def _run_job(self, job: ReviewJob, owner: str):
+        """Run a claimed job while heartbeating its lease, then complete, retry or hand it back"""
+        if job.attempts > job.max_attempts:
+            # Only jobs reclaimed from workers that died mid-review get here
+            await self._give_up(job, owner, f"Review worker stopped responding {job.max_attempts} times")
+            return
+        
+        logger.info(f"Worker {owner} processing review {job.review_id} (attempt {job.attempts}/{job.max_attempts})")
+        review = asyncio.create_task(self.review_service.process_pr_review(
+            job.pr_url, review_id=job.review_id, incremental=job.incremental,
+            raise_errors=job.attempts < job.max_attempts
+        ))
+        heartbeat = asyncio.create_task(self._heartbeat(job, owner))
+        try:
+            await asyncio.wait({review, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            # Shutting down: let the next worker restart the review without waiting for the lease to expire
+            review.cancel()
+            heartbeat.cancel()
+            await asyncio.gather(review, heartbeat, return_exceptions=True)
+            if await self.db_ops.write(self.backend.release, job.id, owner):
+                await self.db_ops.update_review_status(job.review_id, "queued")
+                review_events.publish(job.review_id, "status", status="queued", reason="worker stopped")
+                logger.info(f"Returned review {job.review_id} to the queue")
+            raise
+        
+        heartbeat.cancel()
+        await asyncio.gather(heartbeat, return_exceptions=True)
+        if not review.done():
+            # Another worker has reclaimed the job; stop so the review is not posted twice
+            review.cancel()
+            await asyncio.gather(review, return_exceptions=True)
+            logger.warning(f"Worker {owner} lost the lease on review {job.review_id}, abandoning it")
+            return
+        
+        error = review.exception()
+        if error is None:
+            await self.db_ops.write(self.backend.complete, job.id, owner)
+            return
+        
+        delay = min(REVIEW_JOB_RETRY_MAX_BACKOFF_SECONDS, REVIEW_JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+        if await self.db_ops.write(self.backend.retry, job.id, owner, str(error), delay):
+            await self.db_ops.update_review_status(job.review_id, "queued")
+            review_events.publish(
+                job.review_id, "status", status="queued", reason=str(error), attempt=job.attempts, retry_in=delay
+            )
+            logger.warning(f"Review {job.review_id} failed on attempt {job.attempts}, retrying in {delay}s: {error}")
+    
+    async def _heartbeat(self, job: ReviewJob, owner: str):
+        """Extend the job's lease periodically; returns once the lease has been lost"""
+        while True:
+            await asyncio.sleep(REVIEW_JOB_HEARTBEAT_SECONDS)
+            try:
+                if not await self.db_ops.write(self.backend.heartbeat, job.id, owner, REVIEW_JOB_LEASE_SECONDS):
+                    return
+            except Exception as e:
+                # The lease may still be valid; try again on the next beat
+                logger.warning(f"Heartbeat of review job {job.id} failed: {e}")
+    
+    async def _give_up(self, job: ReviewJob, owner: str, error: str):
+        """Record the review as failed and bury its job"""
+        logger.error(f"Giving up on review {job.review_id}: {error}")
+        repo_name, pr_number = parse_github_url(job.pr_url)
+        await self.db_ops.store_review_data(job.pr_url, repo_name, pr_number, "failed", None, error, job.review_id)
+        await self.db_ops.write(self.backend.bury, job.id, owner, error)
+        review_events.publish(job.review_id, FINAL_EVENT, status="failed", message=error, comments_count=0)
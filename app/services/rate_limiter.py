@@ -0,0 +1,199 @@
+"""
+GitHub rate limit scheduler shared across workers and processes
+"""
+import hashlib
+import logging
+import sqlite3
+import time
+from typing import Mapping, Optional
+
+from ..config.settings import (
+    GITHUB_REQUESTS_PER_SECOND, GITHUB_BURST, GITHUB_LOW_PRIORITY_HEADROOM,
+    GITHUB_RATE_LIMIT_RESERVE, GITHUB_MAX_RATE_LIMIT_WAIT, GITHUB_RATE_LIMIT_DB_FILE
+)
+from ..database.connection import ConnectionPool
+from ..models.database import GITHUB_RATE_LIMITS_TABLE_SQL
+
+logger = logging.getLogger(__name__)
+
+# Request priorities: reads for reviews already in progress go before starting new reviews
+PRIORITY_HIGH = "high"
+PRIORITY_LOW = "low"
+
+# GitHub asks clients to wait at least a minute after a secondary rate limit without Retry-After
+SECONDARY_LIMIT_MIN_BACKOFF = 60
+SECONDARY_LIMIT_MAX_BACKOFF = 900
+
+class RateLimitWaitExceeded(Exception):
+    """Raised when quota would not be available within the maximum wait"""
+
+class GitHubRateLimiter:
+    """Token bucket plus GitHub quota tracking, stored in SQLite so every process shares it"""
+    
+    def __init__(
+        self,
+        token: Optional[str],
+        rate: float = GITHUB_REQUESTS_PER_SECOND,
+        burst: int = GITHUB_BURST,
+        max_wait: float = GITHUB_MAX_RATE_LIMIT_WAIT,
+        db_file: str = GITHUB_RATE_LIMIT_DB_FILE
+    ):
+        """Initialize limiter for one API token"""
+        # Never store the token itself
+        self.token_key = hashlib.sha256((token or "anonymous").encode('utf-8')).hexdigest()[:16]
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        # Two write transactions per request would contend with reviews for the main database's write lock
+        self.pool = ConnectionPool(db_file)
+        self._schema_ready = False
+    
+    def _transaction(self):
+        """Write transaction on the limiter database, creating its table on first use"""
+        if not self._schema_ready:
+            with self.pool.transaction(immediate=True) as cursor:
+                cursor.execute(GITHUB_RATE_LIMITS_TABLE_SQL)
+            self._schema_ready = True
+        # BEGIN IMMEDIATE serializes the read-modify-write across threads and processes
+        return self.pool.transaction(immediate=True)
+    
+    def acquire(self, priority: str = PRIORITY_HIGH, max_wait: Optional[float] = None):
+        """Block until a request may be sent, for at most max_wait seconds (default: the limiter's)"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        deadline = time.time() + max_wait
+        while True:
+            wait = self._try_acquire(priority)
+            if wait <= 0:
+                return
+            if time.time() + wait > deadline:
+                raise RateLimitWaitExceeded(
+                    f"GitHub rate limit: no quota available within {int(max_wait)}s (next slot in {int(wait)}s)"
+                )
+            if wait > 1:
+                logger.info(f"Waiting {wait:.1f}s for GitHub rate limit ({priority} priority)")
+            time.sleep(min(wait, 5.0))
+    
+    def _try_acquire(self, priority: str) -> float:
+        """Take a bucket token if allowed; otherwise return seconds to wait"""
+        now = time.time()
+        with self._transaction() as cursor:
+            row = self._load(cursor, now)
+            remaining, reset_at, blocked_until, bucket_tokens, bucket_updated = row
+            
+            if blocked_until and blocked_until > now:
+                return blocked_until - now
+            
+            # Hourly quota: low priority keeps a reserve for in-flight reviews
+            quota_floor = GITHUB_RATE_LIMIT_RESERVE if priority == PRIORITY_LOW else 0
+            if remaining is not None and reset_at and reset_at > now and remaining <= quota_floor:
+                return reset_at - now + 1
+            
+            bucket_tokens = min(self.burst, bucket_tokens + (now - bucket_updated) * self.rate)
+            needed = 1 + (GITHUB_LOW_PRIORITY_HEADROOM if priority == PRIORITY_LOW else 0)
+            if bucket_tokens < needed:
+                cursor.execute(
+                    "UPDATE github_rate_limits SET bucket_tokens = ?, bucket_updated = ? WHERE token_key = ?",
+                    (bucket_tokens, now, self.token_key)
+                )
+                return (needed - bucket_tokens) / self.rate
+            
+            cursor.execute("""
+                UPDATE github_rate_limits
+                SET bucket_tokens = ?, bucket_updated = ?,
+                    remaining = CASE WHEN remaining IS NULL THEN NULL ELSE remaining - 1 END
+                WHERE token_key = ?
+            """, (bucket_tokens - 1, now, self.token_key))
+            return 0
+    
+    def _load(self, cursor: sqlite3.Cursor, now: float) -> tuple:
+        """Read (creating if needed) limiter state for this token"""
+        cursor.execute("""
+            INSERT OR IGNORE INTO github_rate_limits (token_key, bucket_tokens, bucket_updated)
+            VALUES (?, ?, ?)
+        """, (self.token_key, self.burst, now))
+        cursor.execute("""
+            SELECT remaining, reset_at, blocked_until, bucket_tokens, bucket_updated
+            FROM github_rate_limits
+            WHERE token_key = ?
+        """, (self.token_key,))
+        return cursor.fetchone()
+    
+    def update(self, status: int, headers: Mapping[str, str], message: str = "") -> Optional[float]:
+        """Record quota headers from a response; return seconds to wait if it was rate limited"""
+        now = time.time()
+        remaining = self._int_header(headers, "X-RateLimit-Remaining")
+        limit_total = self._int_header(headers, "X-RateLimit-Limit")
+        reset_at = self._int_header(headers, "X-RateLimit-Reset")
+        retry_after = self._int_header(headers, "Retry-After")
+        
+        rate_limited = status in (403, 429) and (
+            retry_after is not None or remaining == 0 or "rate limit" in message.lower()
+        )
+        
+        with self._transaction() as cursor:
+            self._load(cursor, now)
+            if remaining is not None:
+                cursor.execute("""
+                    UPDATE github_rate_limits
+                    SET remaining = ?, limit_total = COALESCE(?, limit_total), reset_at = COALESCE(?, reset_at)
+                    WHERE token_key = ?
+                """, (remaining, limit_total, reset_at, self.token_key))
+            
+            wait = None
+            if rate_limited:
+                if retry_after is not None:
+                    wait = retry_after
+                elif remaining == 0 and reset_at:
+                    wait = max(1, reset_at - now)
+                else:
+                    # Secondary limit without Retry-After: exponential backoff from one minute
+                    cursor.execute(
+                        "SELECT backoff_seconds FROM github_rate_limits WHERE token_key = ?",
+                        (self.token_key,)
+                    )
+                    backoff = cursor.fetchone()[0] or 0
+                    wait = min(SECONDARY_LIMIT_MAX_BACKOFF, max(SECONDARY_LIMIT_MIN_BACKOFF, backoff * 2))
+                    cursor.execute(
+                        "UPDATE github_rate_limits SET backoff_seconds = ? WHERE token_key = ?",
+                        (wait, self.token_key)
+                    )
+                cursor.execute(
+                    "UPDATE github_rate_limits SET blocked_until = MAX(COALESCE(blocked_until, 0), ?) WHERE token_key = ?",
+                    (now + wait, self.token_key)
+                )
+                logger.warning(f"GitHub rate limited (HTTP {status}); pausing requests for {wait:.0f}s")
+            elif status < 400:
+                cursor.execute(
+                    "UPDATE github_rate_limits SET backoff_seconds = 0 WHERE token_key = ?",
+                    (self.token_key,)
+                )
+        return wait
+    
+    def status(self) -> dict:
+        """Current limiter state for this token"""
+        with self._transaction() as cursor:
+            cursor.execute("""
+                SELECT remaining, limit_total, reset_at, blocked_until, bucket_tokens
+                FROM github_rate_limits
+                WHERE token_key = ?
+            """, (self.token_key,))
+            row = cursor.fetchone()
+        
+        if not row:
+            return {"remaining": None, "limit": None, "reset_at": None, "blocked_until": None, "bucket_tokens": self.burst}
+        return {
+            "remaining": row[0],
+            "limit": row[1],
+            "reset_at": row[2],
+            "blocked_until": row[3] if row[3] and row[3] > time.time() else None,
+            "bucket_tokens": round(row[4], 2)
+        }
+    
+    @staticmethod
+    def _int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+        """Parse an integer header, tolerating absence"""
+        value = headers.get(name)
+        try:
+            return int(value) if value is not None else None
+        except ValueError:
+            return None
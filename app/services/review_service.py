@@ -1,13 +1,25 @@
 """
 Main review service that orchestrates the PR review process
 """
+import asyncio
 import logging
-from typing import Dict, Any
+import time
+from dataclasses import asdict
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Set
 
+from ..config.settings import AI_FILE_PREFETCH
 from ..services.github_service import GitHubService
 from ..services.ai_service import AIService
-from ..database.operations import DatabaseOperations
+from ..services.event_service import review_events, FINAL_EVENT
+from ..database.async_operations import async_db_ops
+from ..models.database import ReviewComment, ReviewUsage, SkippedFile
 from ..utils.github_utils import parse_github_url
+from ..utils.file_rules import FileRules, file_rules, evaluate_file
+from ..utils.patch_utils import commentable_lines
+from ..utils.stream_utils import iterate_in_thread
+from ..utils.metrics import (
+    stage, REVIEWS, REVIEW_DURATION, REVIEWS_IN_FLIGHT, REVIEW_FILES, STAGE_DURATION, STAGE_ERRORS, FILES_SKIPPED, HUNKS_SKIPPED
+)
 
 logger = logging.getLogger(__name__)
 
@@ -18,20 +30,65 @@ class ReviewService:
         """Initialize services"""
         self.github_service = GitHubService()
         self.ai_service = AIService()
-        self.db_ops = DatabaseOperations()
+        self.db_ops = async_db_ops
+        self.events = review_events
     
-    async def process_pr_review(self, pr_url: str) -> Dict[str, Any]:
-        """Process PR review end-to-end"""
+    async def process_pr_review(
+        self,
+        pr_url: str,
+        review_id: Optional[int] = None,
+        incremental: bool = False,
+        raise_errors: bool = False
+    ) -> Dict[str, Any]:
+        """Process PR review end-to-end, updating the queued review record if review_id is given"""
+        # With raise_errors, failures before the comments are posted propagate unrecorded so the job queue can retry them
+        REVIEWS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        status = "failed"
+        try:
+            result = await self._process_pr_review(pr_url, review_id, incremental, raise_errors)
+            status = result["status"]
+            self._publish(
+                review_id, FINAL_EVENT, status=status, message=result["message"],
+                comments_count=result.get("comments_count", 0)
+            )
+            return result
+        except Exception:
+            if raise_errors:
+                status = "retrying"
+            raise
+        finally:
+            REVIEWS_IN_FLIGHT.dec()
+            REVIEWS.inc(status=status)
+            REVIEW_DURATION.observe(time.perf_counter() - started, status=status)
+    
+    async def _process_pr_review(
+        self,
+        pr_url: str,
+        review_id: Optional[int],
+        incremental: bool,
+        raise_errors: bool = False
+    ) -> Dict[str, Any]:
+        """Run the review pipeline and record its outcome"""
         logger.info(f"Starting review for PR: {pr_url}")
+        started = time.perf_counter()
+        usage = ReviewUsage()
+        posted = False
         
         try:
             # Parse GitHub URL
             repo_name, pr_number = parse_github_url(pr_url)
             logger.info(f"Parsed PR: {repo_name}#{pr_number}")
             
+            if review_id is not None:
+                await self.db_ops.update_review_status(review_id, "running")
+            self._publish(review_id, "status", status="running")
+            
             # Check if PR exists and get PR from GitHub
+            self._publish(review_id, "stage", stage="get_pull_request")
             try:
-                pr, repo_name, pr_number = self.github_service.get_pull_request(pr_url)
+                with stage("get_pull_request"):
+                    pr, repo_name, pr_number = await asyncio.to_thread(self.github_service.get_pull_request, pr_url, usage)
                 logger.info(f"Found PR: {pr.title}")
             except Exception as e:
                 error_msg = ""
@@ -44,45 +101,112 @@ class ReviewService:
                 
                 logger.warning(f"PR access failed: {error_msg}")
                 
+                if review_id is not None:
+                    usage.duration_ms = (time.perf_counter() - started) * 1000
+                    with stage("store_review_data"):
+                        await self.db_ops.store_review_data(
+                            pr_url, repo_name, pr_number, "failed", None, error_msg, review_id,
+                            usage=usage
+                        )
+                
                 return {
                     "status": "invalid",
                     "message": error_msg,
-                    "review_id": None
+                    "review_id": review_id
                 }
             
-            # Get PR details
-            pr_details = self.github_service.get_pr_details(pr)
+            # Get PR details; files stream in page by page while analysis runs
+            self._publish(review_id, "stage", stage="analyze", head_sha=pr.head.sha)
+            pr_details = await asyncio.to_thread(self.github_service.get_pr_details, pr, usage)
             pr_title = pr_details['title']
             pr_body = pr_details['body']
-            pr_files = pr_details['files']
+            head_sha = pr.head.sha
+            file_shas: Dict[str, str] = {}
+            # Lines GitHub accepts inline comments on, from the full PR diff
+            commentable: Dict[str, Set[int]] = {}
+            reviewed_files: List[str] = []
+            skipped_files: List[SkippedFile] = []
+            rules = file_rules.rules_for(repo_name)
+            
+            no_files_message = "No files to review"
+            previous = None
+            if incremental:
+                previous = await self.db_ops.get_last_reviewed_head(repo_name, pr_number)
+                if previous:
+                    no_files_message = f"No changes since last review of {previous['head_sha'][:7]}"
             
-            logger.info(f"Found {len(pr_files)} modified files")
+            def on_skip(skipped: SkippedFile):
+                skipped_files.append(skipped)
+                self._publish(review_id, "file_skipped", **asdict(skipped))
             
-            if not pr_files:
-                review_id = self.db_ops.store_review_data(
-                    pr_url, repo_name, pr_number, "completed", [], "No files to review"
+            files = iterate_in_thread(pr_details['files'], AI_FILE_PREFETCH)
+            files = self._collect_files(
+                files, pr, previous, head_sha, file_shas, commentable, reviewed_files, rules, on_skip, usage
+            )
+            
+            # Analyze code with AI
+            logger.info("Analyzing code with AI...")
+            
+            def on_result(filename: str, chunk_index: int, file_comments: List[ReviewComment]):
+                self._publish(
+                    review_id, "file_analyzed", file=filename, chunk=chunk_index, files_seen=len(file_shas),
+                    comments=len(file_comments)
                 )
+            
+            # Streamed completions report each comment as soon as its JSON object is complete
+            def on_comment(comment: ReviewComment):
+                self._publish(review_id, "comment", **asdict(comment))
+            
+            comments = await self.ai_service.analyze_file_stream(files, pr_title, pr_body, usage, on_result, on_comment)
+            
+            logger.info(f"Found {len(file_shas)} modified files at {head_sha[:7]}")
+            if previous:
+                logger.info(f"Incremental review: {len(reviewed_files)} files changed since {previous['head_sha'][:7]}")
+            if skipped_files:
+                logger.info(f"Skipped {len(skipped_files)} files by file rules")
+            
+            if not reviewed_files:
+                if skipped_files:
+                    no_files_message += f" ({len(skipped_files)} skipped by file rules)"
+                usage.duration_ms = (time.perf_counter() - started) * 1000
+                with stage("store_review_data"):
+                    review_id = await self.db_ops.store_review_data(
+                        pr_url, repo_name, pr_number, "completed", [], no_files_message, review_id,
+                        head_sha, file_shas, usage, skipped_files
+                    )
                 return {
-                    "status": "completed", 
-                    "message": "No files to review", 
+                    "status": "completed",
+                    "message": no_files_message,
                     "review_id": review_id
                 }
             
-            # Analyze code with AI
-            logger.info("Analyzing code with AI...")
-            comments = self.ai_service.analyze_code_with_ai(pr_files, pr_title, pr_body)
-            logger.info(f"Generated {len(comments)} review comments")
+            logger.info(
+                f"Generated {len(comments)} review comments using {usage.llm_requests} LLM requests "
+                f"({usage.prompt_tokens} prompt + {usage.completion_tokens} completion tokens, {usage.cache_hits} cache hits)"
+            )
             
             # Add comments to PR
             if comments:
-                added_comments = self.github_service.add_review_comments_to_pr(pr, comments)
+                self._publish(review_id, "stage", stage="add_review_comments_to_pr", comments=len(comments))
+                with stage("add_review_comments_to_pr"):
+                    added_comments = await asyncio.to_thread(
+                        self.github_service.add_review_comments_to_pr, pr, comments, usage, commentable
+                    )
+                posted = True
                 logger.info(f"Added {added_comments} comments to PR")
             else:
                 added_comments = 0
                 logger.info("No issues found - no comments added")
+            self._publish(review_id, "comments_posted", posted=added_comments, generated=len(comments))
             
             # Store in database
-            review_id = self.db_ops.store_review_data(pr_url, repo_name, pr_number, "completed", comments)
+            self._publish(review_id, "stage", stage="store_review_data")
+            usage.duration_ms = (time.perf_counter() - started) * 1000
+            with stage("store_review_data"):
+                review_id = await self.db_ops.store_review_data(
+                    pr_url, repo_name, pr_number, "completed", comments, None, review_id,
+                    head_sha, file_shas, usage, skipped_files
+                )
             
             return {
                 "status": "completed",
@@ -90,16 +214,23 @@ class ReviewService:
                 "review_id": review_id,
                 "comments_count": len(comments)
             }
-            
+        
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Error processing PR review: {error_msg}")
+            # A retry after the comments are on the PR would post them a second time
+            if raise_errors and not posted:
+                raise
+            if posted:
+                error_msg = f"Comments were posted but the review could not be recorded: {error_msg}"
             
             # Store error in database
             try:
                 repo_name, pr_number = parse_github_url(pr_url)
-                review_id = self.db_ops.store_review_data(
-                    pr_url, repo_name, pr_number, "failed", None, error_msg
+                usage.duration_ms = (time.perf_counter() - started) * 1000
+                review_id = await self.db_ops.store_review_data(
+                    pr_url, repo_name, pr_number, "failed", None, error_msg, review_id,
+                    usage=usage
                 )
             except:
                 review_id = None
@@ -108,4 +239,87 @@ class ReviewService:
                 "status": "failed",
                 "message": f"Review failed: {error_msg}",
                 "review_id": review_id
-            } 
\ No newline at end of file
+            }
+    
+    def _publish(self, review_id: Optional[int], event: str, **data: Any):
+        """Send a progress event to subscribers of the review; reviews without a record have none"""
+        if review_id is not None:
+            self.events.publish(review_id, event, **data)
+    
+    async def _collect_files(
+        self,
+        files: AsyncIterator[Dict[str, Any]],
+        pr,
+        previous: Optional[Dict[str, Any]],
+        head_sha: str,
+        file_shas: Dict[str, str],
+        commentable: Dict[str, Set[int]],
+        reviewed_files: List[str],
+        rules: FileRules,
+        on_skip: Callable[[SkippedFile], None],
+        usage: Optional[ReviewUsage] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Record each streamed file and yield the ones to review (for incremental reviews, changed files narrowed to new hunks)"""
+        new_patches = None
+        # Time the review spends blocked on GitHub file pages, excluding analysis downstream
+        waited = 0.0
+        files = files.__aiter__()
+        try:
+            while True:
+                requested = time.perf_counter()
+                try:
+                    file_info = await files.__anext__()
+                except StopAsyncIteration:
+                    break
+                except Exception:
+                    STAGE_ERRORS.inc(stage="get_pr_files")
+                    raise
+                finally:
+                    waited += time.perf_counter() - requested
+                
+                filename = file_info['filename']
+                file_shas[filename] = file_info['sha']
+                commentable[filename] = commentable_lines(file_info['patch'])
+                
+                if previous:
+                    if previous['head_sha'] == head_sha or previous['file_shas'].get(filename) == file_info['sha']:
+                        REVIEW_FILES.inc(outcome="unchanged")
+                        continue
+                    # Compare the previously reviewed head with the new head once, on the first changed file
+                    if new_patches is None:
+                        new_patches = await self._get_changed_patches(pr, previous['head_sha'], head_sha, usage)
+                    file_info = {**file_info, 'patch': new_patches.get(filename, file_info['patch'])}
+                
+                # Lockfiles, generated code, bundles and whitespace churn never reach the model
+                decision = evaluate_file(filename, file_info['patch'], rules)
+                if decision.dropped_hunks:
+                    HUNKS_SKIPPED.inc(decision.dropped_hunks)
+                if decision.patch is None:
+                    REVIEW_FILES.inc(outcome="skipped")
+                    FILES_SKIPPED.inc(rule=decision.rule)
+                    on_skip(SkippedFile(filename, decision.rule, decision.detail))
+                    continue
+                if decision.dropped_hunks:
+                    file_info = {**file_info, 'patch': decision.patch}
+                
+                REVIEW_FILES.inc(outcome="reviewed")
+                reviewed_files.append(filename)
+                yield file_info
+        finally:
+            STAGE_DURATION.observe(waited, stage="get_pr_files")
+    
+    async def _get_changed_patches(
+        self,
+        pr,
+        base_sha: str,
+        head_sha: str,
+        usage: Optional[ReviewUsage] = None
+    ) -> Dict[str, str]:
+        """Patches changed between two heads, or none if the comparison is unavailable"""
+        try:
+            with stage("get_changed_patches"):
+                return await asyncio.to_thread(self.github_service.get_changed_patches, pr, base_sha, head_sha, usage)
+        except Exception as e:
+            # e.g. the old head was force-pushed away; fall back to the full PR patch of changed files
+            logger.warning(f"Compare {base_sha[:7]}...{head_sha[:7]} failed, using full patches: {e}")
+            return {}
@@ -0,0 +1,135 @@
+"""
+GitHub webhook verification and debouncing of pull request pushes
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from ..config.settings import WEBHOOK_DEBOUNCE_SECONDS, WEBHOOK_DEBOUNCE_MAX_SECONDS
+from ..services.job_service import ReviewJobQueue
+from ..database.async_operations import async_db_ops
+
+logger = logging.getLogger(__name__)
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """Check an X-Hub-Signature-256 header against the HMAC-SHA256 of the raw request body"""
+    if not secret or not signature or not signature.startswith("sha256="):
+        return False
+    expected = "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+@dataclass
+class PendingReview:
+    """Latest push seen for a PR while its debounce window is open"""
+    pr_url: str
+    head_sha: str
+    full_review: bool
+    first_seen: float
+    deadline: float
+    events: int = 1
+
+class WebhookDebouncer:
+    """Coalesce bursts of pull_request events per PR so only the latest head SHA is reviewed"""
+    
+    def __init__(
+        self,
+        review_queue: ReviewJobQueue,
+        window: float = WEBHOOK_DEBOUNCE_SECONDS,
+        max_delay: float = WEBHOOK_DEBOUNCE_MAX_SECONDS
+    ):
+        """Initialize debounce settings"""
+        self.review_queue = review_queue
+        self.db_ops = async_db_ops
+        self.window = max(0.0, window)
+        self.max_delay = max(self.window, max_delay)
+        self._pending: Dict[Tuple[str, int], PendingReview] = {}
+        self._timers: Dict[Tuple[str, int], asyncio.Task] = {}
+        self.received = 0
+        self.coalesced = 0
+        self.submitted = 0
+        self.skipped = 0
+    
+    def schedule(self, pr_url: str, repo_name: str, pr_number: int, head_sha: str, full_review: bool) -> float:
+        """Record a push and (re)start the PR's quiet window, returning seconds until the review is queued"""
+        key = (repo_name, pr_number)
+        now = time.monotonic()
+        self.received += 1
+        
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = PendingReview(pr_url, head_sha, full_review, now, now + self.window)
+            self._pending[key] = pending
+            self._timers[key] = asyncio.create_task(self._fire(key), name=f"webhook-debounce-{repo_name}#{pr_number}")
+        else:
+            # Trailing-edge debounce, capped so a PR pushed to non-stop is still reviewed
+            self.coalesced += 1
+            pending.events += 1
+            pending.pr_url = pr_url
+            pending.head_sha = head_sha
+            pending.full_review = pending.full_review or full_review
+            pending.deadline = min(now + self.window, pending.first_seen + self.max_delay)
+        return max(0.0, pending.deadline - now)
+    
+    async def _fire(self, key: Tuple[str, int]):
+        """Wait out the quiet window, then queue a review of the latest head"""
+        try:
+            while True:
+                delay = self._pending[key].deadline - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            pending = self._pending.pop(key, None)
+            self._timers.pop(key, None)
+        
+        repo_name, pr_number = key
+        try:
+            # Redelivered or already reviewed heads do not need another LLM pass
+            last_reviewed = await self.db_ops.get_last_reviewed_head(repo_name, pr_number)
+            if last_reviewed and last_reviewed["head_sha"] == pending.head_sha:
+                self.skipped += 1
+                logger.info(f"Skipping webhook review of {repo_name}#{pr_number}: head {pending.head_sha[:7]} already reviewed")
+                return
+            
+            review_id, created = await self.review_queue.submit(
+                pending.pr_url, incremental=not pending.full_review, head_sha=pending.head_sha
+            )
+            if not created:
+                self.skipped += 1
+                logger.info(f"Webhook review of {repo_name}#{pr_number} joined in-flight review {review_id}")
+                return
+            self.submitted += 1
+            logger.info(
+                f"Queued review {review_id} for {repo_name}#{pr_number} at {pending.head_sha[:7]} "
+                f"after coalescing {pending.events} webhook events"
+            )
+        except Exception as e:
+            logger.error(f"Failed to queue webhook review of {repo_name}#{pr_number}: {e}")
+    
+    async def stop(self):
+        """Cancel open debounce windows; their pushes are dropped"""
+        timers: List[asyncio.Task] = list(self._timers.values())
+        if timers:
+            logger.warning(f"Dropping {len(timers)} debounced webhook reviews on shutdown")
+        for timer in timers:
+            timer.cancel()
+        await asyncio.gather(*timers, return_exceptions=True)
+        # Timers cancelled before they first ran never reach their cleanup
+        self._pending.clear()
+        self._timers.clear()
+    
+    def stats(self) -> dict:
+        """Webhook event counters and PRs waiting for their window to close"""
+        return {
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "submitted": self.submitted,
+            "skipped_already_reviewed": self.skipped,  # Includes heads with a review already in flight
+            "pending": len(self._pending),
+            "window_seconds": self.window,
+            "max_delay_seconds": self.max_delay
+        }
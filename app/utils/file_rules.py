@@ -0,0 +1,230 @@
+"""
+Local rules that keep noise (lockfiles, generated code, bundles, whitespace churn) away from the model
+"""
+import fnmatch
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..config.settings import (
+    FILE_RULES_ENABLED, FILE_RULES_FILE, FILE_RULES_RELOAD_INTERVAL, FILE_RULES_IGNORE, FILE_RULES_GENERATED_MARKERS,
+    FILE_RULES_MARKER_LINES, FILE_RULES_MAX_PATCH_CHARS, FILE_RULES_MIN_HEURISTIC_CHARS, FILE_RULES_MAX_AVG_LINE_LENGTH,
+    FILE_RULES_MAX_ENTROPY, FILE_RULES_SKIP_WHITESPACE, FILE_RULES_INDENT_SENSITIVE
+)
+from .patch_utils import HUNK_HEADER_RE, parse_hunks
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class FileRules:
+    """Pre-filter settings in effect for one repository"""
+    enabled: bool = FILE_RULES_ENABLED
+    ignore: List[str] = field(default_factory=lambda: list(FILE_RULES_IGNORE))
+    include: List[str] = field(default_factory=list)  # Paths always reviewed, whatever the other rules say
+    generated_markers: List[str] = field(default_factory=lambda: list(FILE_RULES_GENERATED_MARKERS))
+    marker_lines: int = FILE_RULES_MARKER_LINES
+    max_patch_chars: int = FILE_RULES_MAX_PATCH_CHARS
+    min_heuristic_chars: int = FILE_RULES_MIN_HEURISTIC_CHARS
+    max_avg_line_length: int = FILE_RULES_MAX_AVG_LINE_LENGTH
+    max_entropy: float = FILE_RULES_MAX_ENTROPY
+    skip_whitespace: bool = FILE_RULES_SKIP_WHITESPACE
+    indent_sensitive: List[str] = field(default_factory=lambda: list(FILE_RULES_INDENT_SENSITIVE))
+    
+    def merge(self, overrides: Dict[str, Any]) -> "FileRules":
+        """Apply one entry of the rules file: lists are extended, other values replaced"""
+        changes = {}
+        for key, value in overrides.items():
+            if key not in self.__dataclass_fields__:
+                raise ValueError(f"Unknown file rules option: {key}")
+            current = getattr(self, key)
+            if isinstance(current, list):
+                if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                    raise ValueError(f"File rules option {key} must be a list of strings")
+                changes[key] = [*current, *value]
+                continue
+            expected = (int, float) if isinstance(current, float) else type(current)
+            # bool is an int subclass, so check it both ways
+            if not isinstance(value, expected) or isinstance(value, bool) != isinstance(current, bool):
+                raise ValueError(f"File rules option {key} must be of type {type(current).__name__}")
+            changes[key] = value
+        return replace(self, **changes)
+
+@dataclass
+class FileDecision:
+    """Outcome of the rules for one file"""
+    patch: Optional[str]  # Patch to review, without whitespace-only hunks; None if the file is skipped
+    rule: Optional[str] = None
+    detail: Optional[str] = None
+    dropped_hunks: int = 0
+
+def match_glob(file_path: str, patterns: Sequence[str]) -> Optional[str]:
+    """First pattern matching the path; patterns without "/" match the file name, a leading "**/" also matches at the root"""
+    file_name = file_path.rsplit('/', 1)[-1]
+    for pattern in patterns:
+        if '/' not in pattern:
+            if fnmatch.fnmatchcase(file_name, pattern):
+                return pattern
+        elif fnmatch.fnmatchcase(file_path, pattern) or (
+            pattern.startswith('**/') and fnmatch.fnmatchcase(file_path, pattern[3:])
+        ):
+            return pattern
+    return None
+
+def shannon_entropy(text: str) -> float:
+    """Bits per byte of the UTF-8 encoded text"""
+    # Per byte, not per character: non-ASCII scripts have large alphabets but share lead bytes
+    data = text.encode('utf-8')
+    if not data:
+        return 0.0
+    total = len(data)
+    return -sum(count / total * math.log2(count / total) for count in Counter(data).values())
+
+def find_generated_marker(patch: str, markers: Sequence[str], max_line: int) -> Optional[str]:
+    """Marker found on the first lines of the new file, as far as the patch shows them"""
+    lowered_markers = [marker.lower() for marker in markers]
+    for _, lines in parse_hunks(patch):
+        for line in lines:
+            if line.new_line is None or line.new_line > max_line:
+                continue
+            text = line.text.lower()
+            for marker, lowered in zip(markers, lowered_markers):
+                if lowered in text:
+                    return marker
+    return None
+
+def is_whitespace_only(hunk: List[str], indent_sensitive: bool = False) -> bool:
+    """Whether every change in a hunk only adds/removes blank lines or changes leading/trailing whitespace"""
+    removed: List[str] = []
+    added: List[str] = []
+    # A trailing context line closes the last run of changes
+    for line in [*hunk[1:], ' ']:
+        marker, text = line[:1], line[1:]
+        if marker == '\\':
+            continue
+        if marker in ('+', '-'):
+            # Leading whitespace is syntax in indentation-sensitive files
+            text = text.rstrip() if indent_sensitive else text.strip()
+            if text:
+                (added if marker == '+' else removed).append(text)
+            continue
+        # Compare each run of changes on its own, so lines moved across context do not cancel out
+        if removed != added:
+            return False
+        removed, added = [], []
+    return True
+
+def strip_whitespace_hunks(patch: str, indent_sensitive: bool = False) -> Tuple[str, int]:
+    """Patch without its whitespace-only hunks (empty if none remain) and how many were dropped"""
+    preamble: List[str] = []
+    hunks: List[List[str]] = []
+    for line in patch.split('\n'):
+        if HUNK_HEADER_RE.match(line):
+            hunks.append([line])
+        elif hunks:
+            hunks[-1].append(line)
+        else:
+            preamble.append(line)
+    
+    kept = [hunk for hunk in hunks if not is_whitespace_only(hunk, indent_sensitive)]
+    dropped = len(hunks) - len(kept)
+    if not dropped:
+        return patch, 0
+    if not kept:
+        return "", dropped
+    return '\n'.join(preamble + [line for hunk in kept for line in hunk]), dropped
+
+def evaluate_file(file_path: str, patch: str, rules: FileRules) -> FileDecision:
+    """Decide whether a file is sent to the model, cheapest checks first"""
+    if not rules.enabled or match_glob(file_path, rules.include):
+        return FileDecision(patch)
+    
+    pattern = match_glob(file_path, rules.ignore)
+    if pattern:
+        return FileDecision(None, "ignored_path", f"matches {pattern}")
+    if rules.max_patch_chars and len(patch) > rules.max_patch_chars:
+        return FileDecision(None, "too_large", f"{len(patch)} patch characters, limit {rules.max_patch_chars}")
+    
+    marker = find_generated_marker(patch, rules.generated_markers, rules.marker_lines)
+    if marker:
+        return FileDecision(None, "generated", f"'{marker}' in the first {rules.marker_lines} lines")
+    
+    dropped = 0
+    if rules.skip_whitespace:
+        patch, dropped = strip_whitespace_hunks(patch, bool(match_glob(file_path, rules.indent_sensitive)))
+        if not patch:
+            return FileDecision(None, "whitespace_only", "every hunk changes only whitespace", dropped)
+    
+    added = [line[1:] for line in patch.split('\n') if line.startswith('+')]
+    added_chars = sum(len(line) for line in added)
+    if added_chars >= rules.min_heuristic_chars:
+        average = added_chars / len(added)
+        if average > rules.max_avg_line_length:
+            return FileDecision(None, "minified", f"added lines average {average:.0f} characters", dropped)
+        entropy = shannon_entropy('\n'.join(added))
+        if entropy > rules.max_entropy:
+            return FileDecision(None, "high_entropy", f"added text has {entropy:.2f} bits per byte", dropped)
+    
+    return FileDecision(patch, dropped_hunks=dropped)
+
+class FileRulesLoader:
+    """Per-repository rules from FILE_RULES_FILE, re-read when the file changes"""
+    
+    def __init__(self, path: str = FILE_RULES_FILE, reload_interval: float = FILE_RULES_RELOAD_INTERVAL):
+        """Initialize with the rules file path; a missing file means defaults for every repository"""
+        self.path = path
+        self.reload_interval = reload_interval
+        # (repository name pattern, overrides) in file order
+        self._entries: List[Tuple[str, Dict[str, Any]]] = []
+        self._mtime: Optional[int] = None
+        self._checked = float('-inf')
+        self._lock = threading.Lock()
+    
+    def rules_for(self, repo_name: str) -> FileRules:
+        """Defaults overlaid with every rules file entry whose key matches the repository, in file order"""
+        rules = FileRules()
+        for pattern, overrides in self._load():
+            if fnmatch.fnmatchcase(repo_name, pattern):
+                rules = rules.merge(overrides)
+        return rules
+    
+    def _load(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Return the parsed entries, re-reading the file if its mtime changed"""
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return self._entries
+        
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                self._entries, self._mtime = [], None
+                return self._entries
+            if mtime == self._mtime:
+                return self._entries
+            
+            self._mtime = mtime
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                if not isinstance(config, dict) or not all(isinstance(entry, dict) for entry in config.values()):
+                    raise ValueError("expected an object mapping repository patterns to rule objects")
+                # Reject bad options now rather than failing reviews later
+                for overrides in config.values():
+                    FileRules().merge(overrides)
+            except (OSError, ValueError) as e:
+                logger.error(f"Invalid file rules in {self.path}, keeping the previous rules: {e}")
+                return self._entries
+            
+            self._entries = list(config.items())
+            logger.info(f"Loaded file rules for {len(self._entries)} repository patterns from {self.path}")
+            return self._entries
+
+# Global instance for easy importing
+file_rules = FileRulesLoader()
@@ -2,8 +2,7 @@
 GitHub utility functions
 """
 import re
-from typing import Dict, List, Any
-from github.PullRequest import PullRequest
+from typing import Dict, Iterable, Iterator, Any
 
 def parse_github_url(url: str) -> tuple[str, int]:
     """Parse GitHub PR URL to extract owner/repo and PR number"""
@@ -18,15 +17,14 @@ def parse_github_url(url: str) -> tuple[str, int]:
     repo_name = f"{owner}/{repo}"
     return repo_name, int(pr_number)
 
-def get_pr_files(pr: PullRequest) -> List[Dict[str, Any]]:
-    """Get modified files from PR"""
-    files = []
-    for file in pr.get_files():
-        if file.status in ['modified', 'added'] and file.patch:
-            files.append({
-                'filename': file.filename,
-                'patch': file.patch,
-                'additions': file.additions,
-                'deletions': file.deletions
-            })
-    return files 
\ No newline at end of file
+def get_pr_files(pr_files: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Yield modified files from the PR files API payload as pages arrive"""
+    for file in pr_files:
+        if file['status'] in ['modified', 'added'] and file.get('patch'):
+            yield {
+                'filename': file['filename'],
+                'sha': file['sha'],
+                'patch': file['patch'],
+                'additions': file['additions'],
+                'deletions': file['deletions']
+            }
\ No newline at end of file
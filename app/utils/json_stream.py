@@ -0,0 +1,86 @@
+"""
+Incremental extraction of array items from a JSON document that arrives in pieces
+"""
+import json
+from typing import Any, List, Optional
+
+class JSONArrayItemParser:
+    """Yield the objects of one array of a streamed JSON object, each as soon as its closing brace arrives"""
+    
+    def __init__(self, array_key: str):
+        """Track items of the array stored under array_key in the top-level object"""
+        self.array_key = array_key
+        self.finished = False  # The top-level object has closed
+        self._text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._in_target = False
+        self._item_start: Optional[int] = None
+    
+    def feed(self, text: str) -> List[Any]:
+        """Consume more of the document and return the array items completed by it"""
+        if self.finished:
+            return []
+        self._text += text
+        text = self._text
+        items = []
+        index = self._pos
+        while index < len(text):
+            char = text[index]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:index]
+            elif not self._stack:
+                # Anything before the document (prose, a Markdown fence) is skipped
+                if char == '{':
+                    self._stack.append(char)
+            elif char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in '{[':
+                if char == '[' and len(self._stack) == 1:
+                    # Keys are plain strings, so the last one read names this array
+                    self._in_target = self._last_string == self.array_key
+                self._stack.append(char)
+                if char == '{' and self._in_target and len(self._stack) == 3:
+                    self._item_start = index
+            elif char in '}]':
+                self._stack.pop()
+                if char == '}' and self._item_start is not None and len(self._stack) == 2:
+                    try:
+                        items.append(json.loads(text[self._item_start:index + 1]))
+                    except json.JSONDecodeError:
+                        # One malformed item should not cost the rest of the array
+                        pass
+                    self._item_start = None
+                elif char == ']' and len(self._stack) == 1:
+                    # Objects under later keys are not items
+                    self._in_target = False
+                elif not self._stack:
+                    self.finished = True
+                    break
+            index += 1
+        self._discard(index)
+        return items
+    
+    def _discard(self, index: int):
+        """Drop text that no open item or string still needs"""
+        keep = index
+        if self._item_start is not None:
+            keep = self._item_start
+        elif self._in_string:
+            keep = self._string_start
+        self._text = self._text[keep:]
+        self._pos = index - keep
+        self._string_start -= keep
+        if self._item_start is not None:
+            self._item_start -= keep
@@ -0,0 +1,252 @@
+"""
+In-process metrics (counters, gauges, histograms) rendered in the Prometheus text format
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ..config.settings import METRICS_NAMESPACE, METRICS_LATENCY_BUCKETS
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    """Escape a label value for the exposition format"""
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Render {name="value",...}, or nothing when there are no labels"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    """Render a sample value"""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base class for a named metric family with fixed label names"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        """Initialize metric metadata"""
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+    
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        """Label values in labelnames order"""
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """Yield (suffix, rendered labels, value) for every sample"""
+        raise NotImplementedError
+    
+    def render(self) -> List[str]:
+        """Exposition lines for this metric family"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+    
+    def inc(self, amount: float = 1, **labels: str):
+        """Add amount to the counter"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield "", _format_labels(self.labelnames, key), value
+
+class Gauge(Metric):
+    """Value that goes up and down, or is read from a callback at scrape time"""
+    
+    kind = "gauge"
+    
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], float]] = None
+    
+    def set(self, value: float, **labels: str):
+        """Set the gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+    
+    def inc(self, amount: float = 1, **labels: str):
+        """Increase the gauge"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount: float = 1, **labels: str):
+        """Decrease the gauge"""
+        self.inc(-amount, **labels)
+    
+    def set_function(self, function: Callable[[], float]):
+        """Read the (unlabelled) value from function on every scrape"""
+        self._function = function
+    
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        if self._function is not None:
+            yield "", "", self._function()
+            return
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield "", _format_labels(self.labelnames, key), value
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets"""
+    
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = METRICS_LATENCY_BUCKETS
+    ):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+    
+    def observe(self, value: float, **labels: str):
+        """Record one observation"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+    
+    @contextmanager
+    def time(self, **labels: str):
+        """Observe the duration of a block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+    
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                yield "_bucket", _format_labels(self.labelnames, key, le), cumulative
+            yield "_count", _format_labels(self.labelnames, key), cumulative
+            yield "_sum", _format_labels(self.labelnames, key), counts[-1]
+
+class MetricsRegistry:
+    """Named metrics of this process"""
+    
+    def __init__(self, namespace: str = METRICS_NAMESPACE):
+        """Initialize an empty registry; metric names are prefixed with namespace"""
+        self.namespace = namespace
+        self._metrics: List[Metric] = []
+    
+    def _register(self, metric: Metric) -> Metric:
+        """Add a metric to the registry"""
+        self._metrics.append(metric)
+        return metric
+    
+    def _name(self, name: str) -> str:
+        """Prefix a metric name with the namespace"""
+        return f"{self.namespace}_{name}" if self.namespace else name
+    
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create and register a counter"""
+        return self._register(Counter(self._name(name), help_text, labelnames))
+    
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        """Create and register a gauge"""
+        return self._register(Gauge(self._name(name), help_text, labelnames))
+    
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = METRICS_LATENCY_BUCKETS
+    ) -> Histogram:
+        """Create and register a histogram"""
+        return self._register(Histogram(self._name(name), help_text, labelnames, buckets))
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Global registry for easy importing
+metrics = MetricsRegistry()
+
+# Review pipeline
+REVIEWS = metrics.counter("reviews_total", "Finished reviews by outcome", ["status"])
+REVIEW_DURATION = metrics.histogram("review_duration_seconds", "End-to-end review time", ["status"])
+REVIEWS_IN_FLIGHT = metrics.gauge("reviews_in_flight", "Reviews currently being processed")
+REVIEW_QUEUE_DEPTH = metrics.gauge("review_queue_depth", "Reviews waiting for a worker")
+STAGE_DURATION = metrics.histogram("review_stage_duration_seconds", "Time spent per pipeline stage", ["stage"])
+STAGE_ERRORS = metrics.counter("review_stage_errors_total", "Pipeline stage failures", ["stage"])
+REVIEW_FILES = metrics.counter("review_files_total", "PR files seen by reviews", ["outcome"])
+FILES_SKIPPED = metrics.counter("review_files_skipped_total", "PR files kept from the model by the pre-filter", ["rule"])
+HUNKS_SKIPPED = metrics.counter("review_hunks_skipped_total", "Whitespace-only hunks removed from reviewed patches")
+
+# LLM
+LLM_REQUESTS = metrics.counter("llm_requests_total", "LLM completions by result", ["result"])
+LLM_REQUESTS_IN_FLIGHT = metrics.gauge("llm_requests_in_flight", "LLM completions awaiting a response")
+LLM_REQUEST_DURATION = metrics.histogram("llm_request_duration_seconds", "LLM completion latency")
+LLM_FIRST_COMMENT = metrics.histogram("llm_first_comment_seconds", "Time from sending a completion request to its first parsed comment")
+LLM_TOKENS = metrics.counter("llm_tokens_total", "LLM tokens used", ["type"])
+
+# GitHub
+GITHUB_REQUESTS = metrics.counter("github_requests_total", "GitHub API responses", ["method", "status"])
+GITHUB_REQUEST_DURATION = metrics.histogram("github_request_duration_seconds", "GitHub API latency", ["method"])
+GITHUB_RETRIES = metrics.counter("github_retries_total", "Repeated GitHub API requests", ["reason"])
+
+# Database
+DB_OPERATION_DURATION = metrics.histogram(
+    "db_operation_duration_seconds", "Database operation run time on the executor threads", ["operation"]
+)
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage and count it as failed if the block raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, stage=name)
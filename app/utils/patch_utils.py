@@ -0,0 +1,194 @@
+"""
+Unified diff utilities for splitting patches into LLM-sized chunks
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+
+HUNK_HEADER_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)$')
+
+# Rough characters-per-token ratio for code; avoids a tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+@dataclass
+class DiffLine:
+    """Single line of a hunk with its old/new file line numbers"""
+    marker: str  # '+', '-' or ' '
+    text: str
+    old_line: Optional[int]
+    new_line: Optional[int]
+    
+    def render(self) -> str:
+        """Render the line as it appears in a patch"""
+        return f"{self.marker}{self.text}"
+
+@dataclass
+class PatchChunk:
+    """A piece of a file patch that fits the token budget"""
+    patch: str
+    # New-file line numbers this chunk is responsible for (excludes borrowed context)
+    new_lines: List[int] = field(default_factory=list)
+    # New-file line number of each rendered line, in order, None for headers and deletions
+    positions: List[Optional[int]] = field(default_factory=list)
+    
+    def map_line(self, line_number: int) -> Optional[int]:
+        """Map a line number returned by the model back to a new-file line this chunk owns; None if there is none"""
+        if line_number in self.new_lines:
+            return line_number
+        
+        visible_lines = [line for line in self.positions if line is not None]
+        inside_chunk = visible_lines and min(visible_lines) <= line_number <= max(visible_lines)
+        
+        # Models sometimes answer with the line's position inside the chunk instead
+        if not inside_chunk and 1 <= line_number <= len(self.positions):
+            position_line = self.positions[line_number - 1]
+            if position_line in self.new_lines:
+                return position_line
+        
+        # Moving the comment to another line would attach it to code it is not about
+        return None
+
+def estimate_tokens(text: str) -> int:
+    """Estimate token count of text"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def parse_hunks(patch: str) -> List[Tuple[str, List[DiffLine]]]:
+    """Parse a unified diff patch into (section heading, lines) per hunk"""
+    hunks = []
+    lines: Optional[List[DiffLine]] = None
+    old_line = new_line = 0
+    
+    for raw_line in patch.split('\n'):
+        match = HUNK_HEADER_RE.match(raw_line)
+        if match:
+            old_line, new_line = int(match.group(1)), int(match.group(3))
+            lines = []
+            hunks.append((match.group(5), lines))
+            continue
+        if lines is None or raw_line.startswith('\\'):
+            # Preamble before the first hunk or "\ No newline at end of file"
+            continue
+        
+        marker, text = (raw_line[0], raw_line[1:]) if raw_line else (' ', '')
+        if marker == '+':
+            lines.append(DiffLine('+', text, None, new_line))
+            new_line += 1
+        elif marker == '-':
+            lines.append(DiffLine('-', text, old_line, None))
+            old_line += 1
+        else:
+            lines.append(DiffLine(' ', text, old_line, new_line))
+            old_line += 1
+            new_line += 1
+    
+    return hunks
+
+def _hunk_header(lines: List[DiffLine], section: str) -> str:
+    """Build a hunk header matching the given lines"""
+    old_count = sum(1 for line in lines if line.marker != '+')
+    new_count = sum(1 for line in lines if line.marker != '-')
+    old_start = next((line.old_line for line in lines if line.old_line is not None), 0)
+    new_start = next((line.new_line for line in lines if line.new_line is not None), 0)
+    return f"@@ -{old_start},{old_count} +{new_start},{new_count} @@{section}"
+
+def _split_hunk(section: str, lines: List[DiffLine], max_tokens: int, context_lines: int) -> List[Tuple[str, List[DiffLine], int]]:
+    """Split one hunk into pieces within budget as (section, lines, borrowed context count)"""
+    pieces = []
+    current: List[DiffLine] = []
+    current_tokens = 0
+    
+    for line in lines:
+        line_tokens = estimate_tokens(line.text)
+        if current and current_tokens + line_tokens > max_tokens:
+            pieces.append(current)
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append(current)
+    
+    result = []
+    for index, piece in enumerate(pieces):
+        borrowed: List[DiffLine] = []
+        if index > 0 and context_lines > 0:
+            # Carry the tail of the previous piece as unchanged context
+            for line in pieces[index - 1][-context_lines:]:
+                if line.marker == '-':
+                    continue
+                old_line = line.old_line if line.old_line is not None else _old_line_before(pieces[index - 1], line)
+                borrowed.append(DiffLine(' ', line.text, old_line, line.new_line))
+        result.append((section, borrowed + piece, len(borrowed)))
+    return result
+
+def _old_line_before(piece: List[DiffLine], target: DiffLine) -> int:
+    """Old-file line number an added line would sit at if it were context"""
+    old_line = 0
+    for line in piece:
+        if line.old_line is not None:
+            old_line = line.old_line + 1
+        if line is target:
+            break
+    return old_line
+
+def _whole_patch_chunk(patch: str) -> PatchChunk:
+    """Wrap an unmodified patch as a single chunk"""
+    chunk = PatchChunk(patch=patch)
+    new_line = None
+    for raw_line in patch.split('\n'):
+        match = HUNK_HEADER_RE.match(raw_line)
+        if match:
+            new_line = int(match.group(3))
+            chunk.positions.append(None)
+        elif new_line is None or raw_line.startswith(('-', '\\')):
+            chunk.positions.append(None)
+        else:
+            chunk.positions.append(new_line)
+            chunk.new_lines.append(new_line)
+            new_line += 1
+    return chunk
+
+def commentable_lines(patch: str) -> Set[int]:
+    """New-file line numbers GitHub accepts review comments on (added and context lines)"""
+    return set(_whole_patch_chunk(patch).new_lines)
+
+def split_patch(patch: str, max_tokens: int, context_lines: int = 3) -> List[PatchChunk]:
+    """Split a patch along hunk boundaries into chunks of at most max_tokens, splitting oversized hunks"""
+    if estimate_tokens(patch) <= max_tokens:
+        return [_whole_patch_chunk(patch)]
+    
+    pieces = []
+    for section, lines in parse_hunks(patch):
+        if estimate_tokens('\n'.join(line.render() for line in lines)) <= max_tokens:
+            pieces.append((section, lines, 0))
+        else:
+            pieces.extend(_split_hunk(section, lines, max_tokens, context_lines))
+    
+    if not pieces:
+        return [_whole_patch_chunk(patch)]
+    
+    chunks = []
+    current = PatchChunk(patch="")
+    rendered: List[str] = []
+    current_tokens = 0
+    
+    for section, lines, borrowed in pieces:
+        piece_lines = [_hunk_header(lines, section)] + [line.render() for line in lines]
+        piece_tokens = estimate_tokens('\n'.join(piece_lines))
+        
+        if rendered and current_tokens + piece_tokens > max_tokens:
+            current.patch = '\n'.join(rendered)
+            chunks.append(current)
+            current = PatchChunk(patch="")
+            rendered, current_tokens = [], 0
+        
+        rendered.extend(piece_lines)
+        current_tokens += piece_tokens
+        current.positions.append(None)
+        for index, line in enumerate(lines):
+            current.positions.append(line.new_line)
+            if index >= borrowed and line.new_line is not None:
+                current.new_lines.append(line.new_line)
+    
+    current.patch = '\n'.join(rendered)
+    chunks.append(current)
+    return chunks
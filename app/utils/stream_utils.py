@@ -0,0 +1,53 @@
+"""
+Helpers for streaming blocking iterators into async code
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import AsyncIterator, Iterable, TypeVar
+
+T = TypeVar("T")
+
+_END = object()
+
+async def iterate_in_thread(iterable: Iterable[T], maxsize: int) -> AsyncIterator[T]:
+    """Consume a blocking iterable in a worker thread, buffering at most maxsize items ahead of the consumer"""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, maxsize))
+    stopped = threading.Event()
+    
+    def put(item) -> bool:
+        """Hand an item to the event loop, blocking while the buffer is full"""
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stopped.is_set():
+                    future.cancel()
+                    return False
+    
+    def produce():
+        try:
+            for item in iterable:
+                if stopped.is_set() or not put((item, None)):
+                    return
+        except Exception as e:
+            put((_END, e))
+            return
+        put((_END, None))
+    
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is _END:
+                if error is not None:
+                    raise error
+                break
+            yield item
+        await producer
+    finally:
+        # Consumer stopped early (error or cancellation): let the worker thread exit
+        stopped.set()
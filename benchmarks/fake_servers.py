@@ -0,0 +1,283 @@
+"""
+Local stand-ins for the GitHub REST API and OpenAI chat completions used by the benchmarks
+
+The shape of each PR is derived from its repository name, so scenarios need no shared state:
+a PR in ``bench/files-300`` has 300 changed files.
+
+Usage:
+    python -m benchmarks.fake_servers --port 8900 --github-latency-ms 50 --openai-latency-ms 800
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+@dataclass
+class FakeServerConfig:
+    """Latency, payload and fault injection settings shared by both fake APIs"""
+    github_latency_ms: float = 50.0
+    openai_latency_ms: float = 500.0  # Until the whole completion has been sent
+    openai_first_token_ms: float = 100.0  # Until the first streamed token (stream=true requests)
+    latency_jitter: float = 0.1  # +/- fraction applied to every latency, drawn from a seeded RNG
+    patch_lines: int = 20  # Added lines per file patch
+    comments_per_file: int = 1  # Comments the fake model returns per reviewed file
+    github_error_rate: float = 0.0  # Share of GitHub requests answered 502
+    github_rate_limit_every: int = 0  # Every Nth GitHub request is answered 429 with Retry-After
+    openai_error_rate: float = 0.0  # Share of completions answered 500
+    seed: int = 1
+
+class FakeServers:
+    """aiohttp application serving the GitHub and OpenAI endpoints the review pipeline calls"""
+    
+    def __init__(self, config: FakeServerConfig):
+        """Initialize request counters and the seeded RNG"""
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.counters: Dict[str, int] = {}
+        self.github_requests = 0
+    
+    def app(self) -> web.Application:
+        """Build the aiohttp application"""
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.add_routes([
+            web.get("/github/repos/{owner}/{repo}/pulls/{number}", self.get_pull_request),
+            web.get("/github/repos/{owner}/{repo}/pulls/{number}/files", self.get_pull_request_files),
+            web.get("/github/repos/{owner}/{repo}/compare/{basehead}", self.compare),
+            web.post("/github/repos/{owner}/{repo}/pulls/{number}/reviews", self.create_review),
+            web.post("/github/repos/{owner}/{repo}/issues/{number}/comments", self.create_issue_comment),
+            web.post("/openai/v1/chat/completions", self.chat_completion),
+            web.get("/stats", self.stats),
+            web.post("/stats/reset", self.reset_stats),
+        ])
+        return app
+    
+    def _count(self, name: str):
+        """Increment a request counter"""
+        self.counters[name] = self.counters.get(name, 0) + 1
+    
+    async def _delay(self, latency_ms: float):
+        """Sleep for a jittered latency"""
+        jitter = 1 + self.random.uniform(-self.config.latency_jitter, self.config.latency_jitter)
+        await asyncio.sleep(max(0.0, latency_ms * jitter) / 1000)
+    
+    async def _github_fault(self) -> Optional[web.Response]:
+        """Apply GitHub latency and return an injected error response, if any"""
+        self.github_requests += 1
+        await self._delay(self.config.github_latency_ms)
+        every = self.config.github_rate_limit_every
+        if every and self.github_requests % every == 0:
+            self._count("github_rate_limited")
+            return web.json_response(
+                {"message": "You have exceeded a secondary rate limit"}, status=429, headers={"Retry-After": "1"}
+            )
+        if self.random.random() < self.config.github_error_rate:
+            self._count("github_errors")
+            return web.json_response({"message": "Server Error"}, status=502)
+        return None
+    
+    @staticmethod
+    def _file_count(repo: str) -> int:
+        """Files changed by PRs of a repository named like files-<n>"""
+        match = re.search(r"files-(\d+)", repo)
+        return int(match.group(1)) if match else 1
+    
+    @staticmethod
+    def _sha(*parts) -> str:
+        """Deterministic 40-character SHA"""
+        return hashlib.sha1("/".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    
+    def _patch(self, index: int) -> str:
+        """Unified diff adding patch_lines lines to a file"""
+        lines = self.config.patch_lines
+        body = "".join(f"+    value_{index}_{line} = compute({line})\n" for line in range(lines))
+        return f"@@ -1,1 +1,{lines + 1} @@\n def handler():\n{body}"
+    
+    def _files(self, repo: str, number: int) -> List[dict]:
+        """The changed files of a PR"""
+        return [
+            {
+                "sha": self._sha(repo, number, index),
+                "filename": f"src/module_{index}.py",
+                "status": "modified",
+                "additions": self.config.patch_lines,
+                "deletions": 0,
+                "changes": self.config.patch_lines,
+                "patch": self._patch(index)
+            }
+            for index in range(self._file_count(repo))
+        ]
+    
+    async def get_pull_request(self, request: web.Request) -> web.Response:
+        """GET /repos/{owner}/{repo}/pulls/{number}"""
+        self._count("github_get_pull_request")
+        fault = await self._github_fault()
+        if fault is not None:
+            return fault
+        owner, repo, number = request.match_info["owner"], request.match_info["repo"], int(request.match_info["number"])
+        full_name = f"{owner}/{repo}"
+        api_url = f"{request.url.origin()}/github/repos/{full_name}"
+        return web.json_response({
+            "url": f"{api_url}/pulls/{number}",
+            "html_url": f"https://github.com/{full_name}/pull/{number}",
+            "number": number,
+            "state": "open",
+            "title": f"Benchmark PR {number}",
+            "body": "Synthetic pull request used by the benchmark suite.",
+            "head": {"sha": self._sha(full_name, number, "head"), "ref": "feature"},
+            "base": {"sha": self._sha(full_name, "base"), "ref": "main", "repo": {"full_name": full_name, "url": api_url}}
+        })
+    
+    async def get_pull_request_files(self, request: web.Request) -> web.Response:
+        """GET /repos/{owner}/{repo}/pulls/{number}/files, paginated with a Link header"""
+        self._count("github_get_pr_files")
+        fault = await self._github_fault()
+        if fault is not None:
+            return fault
+        full_name = f"{request.match_info['owner']}/{request.match_info['repo']}"
+        number = int(request.match_info["number"])
+        per_page = int(request.query.get("per_page", 30))
+        page = int(request.query.get("page", 1))
+        files = self._files(full_name, number)
+        headers = {}
+        if page * per_page < len(files):
+            next_url = request.url.update_query({"per_page": per_page, "page": page + 1})
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return web.json_response(files[(page - 1) * per_page:page * per_page], headers=headers)
+    
+    async def compare(self, request: web.Request) -> web.Response:
+        """GET /repos/{owner}/{repo}/compare/{base}...{head}"""
+        self._count("github_compare")
+        fault = await self._github_fault()
+        if fault is not None:
+            return fault
+        return web.json_response({"files": []})
+    
+    async def create_review(self, request: web.Request) -> web.Response:
+        """POST /repos/{owner}/{repo}/pulls/{number}/reviews"""
+        self._count("github_create_review")
+        fault = await self._github_fault()
+        if fault is not None:
+            return fault
+        payload = await request.json()
+        self.counters["github_review_comments"] = self.counters.get("github_review_comments", 0) + len(payload.get("comments", []))
+        return web.json_response({"id": self.counters["github_create_review"], "state": "COMMENTED"})
+    
+    async def create_issue_comment(self, request: web.Request) -> web.Response:
+        """POST /repos/{owner}/{repo}/issues/{number}/comments"""
+        self._count("github_create_issue_comment")
+        fault = await self._github_fault()
+        if fault is not None:
+            return fault
+        return web.json_response({"id": self.counters["github_create_issue_comment"]}, status=201)
+    
+    async def chat_completion(self, request: web.Request) -> web.Response:
+        """POST /v1/chat/completions, answering with comments on the files named in the prompt"""
+        self._count("openai_chat_completions")
+        payload = await request.json()
+        await self._delay(self.config.openai_first_token_ms if payload.get("stream") else self.config.openai_latency_ms)
+        if self.random.random() < self.config.openai_error_rate:
+            self._count("openai_errors")
+            return web.json_response({"error": {"message": "The server had an error", "type": "server_error"}}, status=500)
+        
+        prompt = payload["messages"][-1]["content"]
+        comments = [
+            {"file_path": filename, "line_number": line + 2, "comment": f"Consider naming value {line} more descriptively."}
+            for filename in re.findall(r"^File: (.+)$", prompt, re.MULTILINE)
+            for line in range(self.config.comments_per_file)
+        ]
+        content = json.dumps({"comments": comments})
+        prompt_tokens = sum(len(message["content"]) for message in payload["messages"]) // 4
+        if payload.get("stream"):
+            return await self._stream_completion(request, payload, content, prompt_tokens)
+        return web.json_response({
+            "id": f"chatcmpl-{self.counters['openai_chat_completions']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_tokens + len(content) // 4
+            }
+        })
+    
+    async def _stream_completion(
+        self, request: web.Request, payload: dict, content: str, prompt_tokens: int
+    ) -> web.StreamResponse:
+        """Send the completion as server-sent chunks spread over the rest of the latency, like a generating model"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        completion_id = f"chatcmpl-{self.counters['openai_chat_completions']}"
+        
+        def event(choices: list, **extra) -> bytes:
+            data = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": payload.get("model"), "choices": choices, **extra}
+            return f"data: {json.dumps(data)}\n\n".encode("utf-8")
+        
+        # About 4 characters per token, sent in up to 20 bursts
+        pieces = [content[start:start + 4] for start in range(0, len(content), 4)]
+        bursts = max(1, min(20, len(pieces)))
+        per_burst = -(-len(pieces) // bursts)
+        remaining_ms = max(0.0, self.config.openai_latency_ms - self.config.openai_first_token_ms)
+        try:
+            for index in range(0, len(pieces), per_burst):
+                if index:
+                    await self._delay(remaining_ms / bursts)
+                for piece in pieces[index:index + per_burst]:
+                    await response.write(event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+            await response.write(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                completion_tokens = len(content) // 4
+                await response.write(event([], usage={
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }))
+            await response.write(b"data: [DONE]\n\n")
+        except ConnectionResetError:
+            # The client hung up early, e.g. after reaching its comment cap
+            self._count("openai_streams_aborted")
+        return response
+    
+    async def stats(self, request: web.Request) -> web.Response:
+        """GET /stats: request counters"""
+        return web.json_response({"config": asdict(self.config), "counters": self.counters})
+    
+    async def reset_stats(self, request: web.Request) -> web.Response:
+        """POST /stats/reset: clear counters and reseed, so every scenario sees the same fault sequence"""
+        self.counters = {}
+        self.github_requests = 0
+        self.random = random.Random(self.config.seed)
+        return web.json_response({"status": "reset"})
+
+def serve(port: int, config: FakeServerConfig):
+    """Run the fake servers until interrupted"""
+    web.run_app(FakeServers(config).app(), host="127.0.0.1", port=port, print=None, access_log=None)
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    """Add FakeServerConfig fields as command line options"""
+    for name, default in asdict(FakeServerConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+
+def config_from_args(args: argparse.Namespace) -> FakeServerConfig:
+    """Build a FakeServerConfig from parsed options"""
+    return FakeServerConfig(**{name: getattr(args, name) for name in asdict(FakeServerConfig())})
+
+def main():
+    """Parse arguments and serve"""
+    parser = argparse.ArgumentParser(description="Fake GitHub and OpenAI APIs for benchmarking")
+    parser.add_argument("--port", type=int, default=8900)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    serve(args.port, config_from_args(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+End-to-end benchmark of the review pipeline against local fake GitHub and OpenAI servers
+
+Reviews go through the real ReviewJobQueue, ReviewService, GitHub client, AI service and
+SQLite database; only the remote APIs are replaced (see benchmarks/fake_servers.py).
+
+Usage:
+    python -m benchmarks.pipeline --scenario all --output results.json
+    python -m benchmarks.pipeline --scenario large --baseline results.json --openai-latency-ms 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import urllib.request
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+from benchmarks.fake_servers import FakeServerConfig, add_config_arguments, config_from_args, serve
+
+@dataclass
+class Scenario:
+    """A workload: rounds of PRs submitted together, each round waited for before the next"""
+    name: str
+    files_per_pr: int
+    prs_per_round: int
+    rounds: int
+    description: str
+
+SCENARIOS = {
+    "single": Scenario("single", 1, 1, 20, "1-file PR reviewed 20 times in a row"),
+    "large": Scenario("large", 300, 1, 3, "300-file PR reviewed 3 times in a row"),
+    "concurrent": Scenario("concurrent", 10, 50, 1, "50 PRs of 10 files submitted at once"),
+}
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))]
+
+def rss_mb() -> Dict[str, float]:
+    """Current and peak resident set size of this process"""
+    with open("/proc/self/statm") as statm:
+        current = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    # ru_maxrss is in KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {"rss_mb": round(current / 2**20, 1), "rss_peak_mb": round(peak / 2**20, 1)}
+
+def fake_server_request(base_url: str, path: str, method: str = "GET") -> dict:
+    """Call the fake servers' control endpoints"""
+    request = urllib.request.Request(f"{base_url}{path}", method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+def start_fake_servers(port: int, config: FakeServerConfig) -> multiprocessing.Process:
+    """Run the fake servers in a separate process so they do not compete for this one's GIL"""
+    process = multiprocessing.get_context("spawn").Process(target=serve, args=(port, config), daemon=True)
+    process.start()
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            fake_server_request(base_url, "/stats")
+            return process
+        except OSError:
+            if time.monotonic() > deadline or not process.is_alive():
+                process.terminate()
+                raise RuntimeError(f"Fake servers did not start on port {port}")
+            time.sleep(0.1)
+
+def configure_environment(args: argparse.Namespace, base_url: str, workdir: str):
+    """Point the application at the fake servers; must run before app modules are imported"""
+    os.environ.update({
+        "GITHUB_TOKEN": "benchmark-token",
+        "OPENAI_API_KEY": "benchmark-key",
+        "GITHUB_API_URL": f"{base_url}/github",
+        "OPENAI_API_BASE": f"{base_url}/openai/v1",
+        # Caches would turn every repeat into a hit and hide regressions in the pipeline itself
+        "LLM_CACHE_ENABLED": "true" if args.llm_cache else "false",
+        "GITHUB_HTTP_CACHE_ENABLED": "true" if args.http_cache else "false",
+        "GITHUB_RATE_LIMIT_ENABLED": "true" if args.rate_limiter else "false",
+        "AI_STREAMING": "false" if args.no_streaming else "true",
+        "REVIEW_WORKERS": str(args.workers),
+    })
+    # DB_FILE and LOG_FILE are relative paths; keep them out of the working tree
+    os.chdir(workdir)
+
+async def run_scenario(scenario: Scenario, base_url: str, pr_offset: int) -> dict:
+    """Run one scenario on a fresh queue and report throughput, latency and memory"""
+    from app.services.job_service import ReviewJobQueue
+    from app.services.review_service import ReviewService
+    
+    finished: Dict[int, tuple] = {}
+    all_done = asyncio.Event()
+    expected = scenario.prs_per_round * scenario.rounds
+    
+    class TimedReviewService(ReviewService):
+        """ReviewService that records when each review finishes"""
+        
+        async def process_pr_review(self, pr_url: str, review_id: Optional[int] = None, **kwargs):
+            result = await super().process_pr_review(pr_url, review_id=review_id, **kwargs)
+            finished[review_id] = (time.perf_counter(), result["status"])
+            if len(finished) >= expected:
+                all_done.set()
+            return result
+    
+    service = TimedReviewService()
+    queue = ReviewJobQueue(service)
+    await queue.start()
+    
+    # Warm-up review: opens connections, DB threads and caches before anything is timed
+    warmup_url = f"https://github.com/bench/files-{scenario.files_per_pr}/pull/{pr_offset}"
+    await service.process_pr_review(warmup_url)
+    finished.clear()
+    all_done.clear()
+    fake_server_request(base_url, "/stats/reset", "POST")
+    
+    submitted: Dict[int, float] = {}
+    started = time.perf_counter()
+    try:
+        for round_index in range(scenario.rounds):
+            round_ids = []
+            for pr_index in range(scenario.prs_per_round):
+                # Distinct PR numbers, so single-flight deduplication never merges benchmark reviews
+                number = pr_offset + 1 + round_index * scenario.prs_per_round + pr_index
+                submit_time = time.perf_counter()
+                review_id, _ = await queue.submit(f"https://github.com/bench/files-{scenario.files_per_pr}/pull/{number}")
+                submitted[review_id] = submit_time
+                round_ids.append(review_id)
+            while not all(review_id in finished for review_id in round_ids):
+                await asyncio.sleep(0.005)
+        await asyncio.wait_for(all_done.wait(), timeout=600)
+    finally:
+        await queue.stop()
+        await service.ai_service.close()
+    wall_seconds = time.perf_counter() - started
+    
+    latencies = [finished[review_id][0] - submit_time for review_id, submit_time in submitted.items()]
+    failed = sum(1 for _, status in finished.values() if status != "completed")
+    fake_stats = fake_server_request(base_url, "/stats")["counters"]
+    return {
+        "scenario": scenario.name,
+        "description": scenario.description,
+        "reviews": len(submitted),
+        "failed": failed,
+        "files_reviewed": len(submitted) * scenario.files_per_pr,
+        "wall_seconds": round(wall_seconds, 3),
+        "reviews_per_sec": round(len(submitted) / wall_seconds, 3),
+        "files_per_sec": round(len(submitted) * scenario.files_per_pr / wall_seconds, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "latency_max_ms": round(max(latencies) * 1000, 1),
+        **rss_mb(),
+        "requests": fake_stats
+    }
+
+# Metrics compared against a baseline; True where higher is better
+COMPARED_METRICS = {
+    "reviews_per_sec": True,
+    "latency_p50_ms": False,
+    "latency_p99_ms": False,
+    "rss_peak_mb": False,
+}
+
+def compare(results: List[dict], baseline: dict, tolerance: float) -> bool:
+    """Print changes against a baseline run; return True if any metric regressed beyond tolerance"""
+    previous = {result["scenario"]: result for result in baseline.get("results", [])}
+    regressed = False
+    for result in results:
+        old = previous.get(result["scenario"])
+        if old is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if not old.get(metric):
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > tolerance:
+                flag = "  REGRESSION"
+                regressed = True
+            print(f"  {result['scenario']:<11} {metric:<16} {old[metric]:>10} -> {result[metric]:>10} ({change:+.1%}){flag}")
+    return regressed
+
+def print_result(result: dict):
+    """Print one scenario's summary"""
+    print(
+        f"{result['scenario']:<11} {result['reviews']:>4} reviews ({result['failed']} failed) in {result['wall_seconds']:.2f}s: "
+        f"{result['reviews_per_sec']:.2f} reviews/s, {result['files_per_sec']:.1f} files/s, "
+        f"p50 {result['latency_p50_ms']:.0f}ms, p99 {result['latency_p99_ms']:.0f}ms, "
+        f"RSS {result['rss_mb']:.0f}MB (peak {result['rss_peak_mb']:.0f}MB)"
+    )
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Start the fake servers, run the selected scenarios and report"""
+    parser = argparse.ArgumentParser(description="End-to-end review pipeline benchmark")
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="all")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--workers", type=int, default=4, help="REVIEW_WORKERS for the benchmarked queue")
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the LLM result cache enabled")
+    parser.add_argument("--http-cache", action="store_true", help="Keep the GitHub ETag cache enabled")
+    parser.add_argument("--rate-limiter", action="store_true", help="Keep the GitHub rate limiter enabled")
+    parser.add_argument("--no-streaming", action="store_true", help="Wait for whole LLM completions instead of streaming them")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results JSON from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative regression before failing")
+    add_config_arguments(parser)
+    args = parser.parse_args(argv)
+    
+    config = config_from_args(args)
+    # The benchmark runs in a temporary directory
+    output_path = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_fake_servers(args.port, config)
+    original_cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory(prefix="review-bench-") as workdir:
+            configure_environment(args, base_url, workdir)
+            logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+            from app.database.operations import DatabaseOperations
+            DatabaseOperations.init_database()
+            
+            names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+            results = []
+            for index, name in enumerate(names):
+                result = asyncio.run(run_scenario(SCENARIOS[name], base_url, pr_offset=(index + 1) * 10000))
+                print_result(result)
+                results.append(result)
+            
+            from app.database.connection import connection_pool
+            connection_pool.close_all()
+    finally:
+        os.chdir(original_cwd)
+        server.terminate()
+        server.join()
+    
+    report = {
+        "config": {**asdict(config), "workers": args.workers, "llm_cache": args.llm_cache,
+                   "http_cache": args.http_cache, "rate_limiter": args.rate_limiter, "streaming": not args.no_streaming},
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results
+    }
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+    if baseline_path:
+        with open(baseline_path, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("config") != report["config"]:
+            print("Warning: baseline was recorded with a different configuration")
+        print(f"Compared with {args.baseline}:")
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Microbenchmark of prompt rendering on the per-file path of a review
+
+Usage:
+    python -m benchmarks.prompt_rendering [--files 300] [--patch-lines 40] [--repeat 5]
+"""
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from app.prompts.prompt_loader import prompt_loader
+
+PROMPTS_DIR = Path(prompt_loader.prompts_dir)
+
+def legacy_render(pr_title: str, pr_body: str, filename: str, patch: str) -> tuple:
+    """Per-file work before templates were cached: read both files and str.format the review prompt"""
+    system_prompt = (PROMPTS_DIR / "system_prompt.txt").read_text(encoding='utf-8')
+    template = (PROMPTS_DIR / "code_review_prompt.txt").read_text(encoding='utf-8')
+    prompt = template.format(pr_title=pr_title, pr_body=pr_body, filename=filename, patch=patch)
+    return system_prompt, prompt
+
+def compiled_render(prompts, filename: str, patch: str) -> tuple:
+    """Per-file work with a review-bound compiled template"""
+    return prompts.system_prompt, prompts.single_file(filename, patch)
+
+def run(files: int, patch_lines: int, repeat: int):
+    """Time rendering the prompts of one review with each approach"""
+    pr_title = "Refactor request handling"
+    pr_body = "Moves parsing into a helper.\n" * 20
+    patch = "@@ -1,3 +1,%d @@\n" % patch_lines + "".join(f"+    value_{i} = compute({i})\n" for i in range(patch_lines))
+    filenames = [f"src/module_{i}.py" for i in range(files)]
+    
+    prompts = prompt_loader.bind_review(pr_title, pr_body)
+    assert compiled_render(prompts, filenames[0], patch) == legacy_render(pr_title, pr_body, filenames[0], patch)
+    
+    def time_review(render_review) -> float:
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            render_review()
+            samples.append((time.perf_counter() - started) * 1e6 / files)
+        return statistics.median(samples)
+    
+    def legacy_review():
+        for name in filenames:
+            legacy_render(pr_title, pr_body, name, patch)
+    
+    def compiled_review():
+        # Binding is part of the cost of a review
+        review_prompts = prompt_loader.bind_review(pr_title, pr_body)
+        for name in filenames:
+            compiled_render(review_prompts, name, patch)
+    
+    legacy = time_review(legacy_review)
+    compiled = time_review(compiled_review)
+    
+    print(f"{files} files, {patch_lines}-line patches, median of {repeat} runs")
+    print(f"  legacy (read + format per file): {legacy:8.2f} us/file")
+    print(f"  compiled (bound per review):     {compiled:8.2f} us/file")
+    print(f"  speedup: {legacy / compiled:.1f}x")
+
+def main():
+    """Parse arguments and run the benchmark"""
+    parser = argparse.ArgumentParser(description="Prompt rendering microbenchmark")
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--patch-lines", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.files, args.patch_lines, args.repeat)
+
+if __name__ == "__main__":
+    main()
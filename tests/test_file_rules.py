@@ -0,0 +1,172 @@
+"""
+Tests for the rules that keep files away from the model
+"""
+import base64
+import json
+import os
+import random
+import tempfile
+import time
+import unittest
+
+from app.utils.file_rules import (
+    FileRules, FileRulesLoader, evaluate_file, match_glob, shannon_entropy, strip_whitespace_hunks
+)
+
+def added_patch(lines: list) -> str:
+    """Patch of a new file made of the given lines"""
+    return '\n'.join([f"@@ -0,0 +1,{len(lines)} @@"] + [f"+{line}" for line in lines])
+
+def python_source(count: int) -> list:
+    """Plausible Python source lines"""
+    lines = []
+    for index in range(count):
+        lines.extend([
+            f"def handle_request_{index}(request, session):",
+            f"    \"\"\"Handle request number {index} and return the response\"\"\"",
+            "    user = session.get_user(request.user_id)",
+            "    if user is None:",
+            f"        raise PermissionError(f\"Unknown user {{request.user_id}}\")",
+            f"    return build_response(user, request.payload, retries={index % 3})",
+            "",
+        ])
+    return lines
+
+class MatchGlobTest(unittest.TestCase):
+    """match_glob"""
+    
+    def test_pattern_without_slash_matches_file_name_anywhere(self):
+        self.assertEqual(match_glob("web/package-lock.json", ["package-lock.json"]), "package-lock.json")
+        self.assertEqual(match_glob("static/app.min.js", ["*.min.js"]), "*.min.js")
+        self.assertIsNone(match_glob("static/app.js", ["*.min.js"]))
+    
+    def test_leading_double_star_also_matches_at_root(self):
+        self.assertEqual(match_glob("vendor/lib/x.go", ["**/vendor/**"]), "**/vendor/**")
+        self.assertEqual(match_glob("src/vendor/x.go", ["**/vendor/**"]), "**/vendor/**")
+        self.assertIsNone(match_glob("src/vendored.go", ["**/vendor/**"]))
+
+class EvaluateFileTest(unittest.TestCase):
+    """evaluate_file"""
+    
+    def setUp(self):
+        self.rules = FileRules()
+    
+    def test_source_file_is_reviewed(self):
+        patch = added_patch(python_source(40))
+        decision = evaluate_file("app/handlers.py", patch, self.rules)
+        self.assertEqual((decision.patch, decision.rule), (patch, None))
+    
+    def test_ignored_path(self):
+        decision = evaluate_file("frontend/yarn.lock", added_patch(["a@1:"]), self.rules)
+        self.assertEqual((decision.patch, decision.rule), (None, "ignored_path"))
+    
+    def test_include_overrides_other_rules(self):
+        rules = self.rules.merge({"include": ["frontend/yarn.lock"]})
+        patch = added_patch(["a@1:"])
+        self.assertEqual(evaluate_file("frontend/yarn.lock", patch, rules).patch, patch)
+    
+    def test_generated_marker_only_near_top(self):
+        top = added_patch(["# Code generated by protoc. DO NOT EDIT."] + python_source(2))
+        self.assertEqual(evaluate_file("api/types.py", top, self.rules).rule, "generated")
+        # The marker past FILE_RULES_MARKER_LINES is just a mention in ordinary code
+        late = added_patch(python_source(3) + ["# Code generated by hand"])
+        self.assertIsNone(evaluate_file("api/types.py", late, self.rules).rule)
+    
+    def test_minified_bundle(self):
+        bundle = ";".join(f"var a{index}=function(b){{return b*{index}}}" for index in range(400))
+        decision = evaluate_file("static/bundle.js", added_patch([bundle]), self.rules)
+        self.assertEqual(decision.rule, "minified")
+    
+    def test_encoded_data_has_high_entropy(self):
+        data = base64.b64encode(random.Random(0).randbytes(6000)).decode('ascii')
+        lines = [data[index:index + 76] for index in range(0, len(data), 76)]
+        decision = evaluate_file("assets/font.b64", added_patch(lines), self.rules)
+        self.assertEqual(decision.rule, "high_entropy")
+    
+    def test_non_latin_text_is_not_high_entropy(self):
+        text = "本ガイドではインストール手順と設定方法、よくある質問への回答を説明します。"
+        lines = [f"{text}（第{index}節）" for index in range(80)]
+        self.assertLess(shannon_entropy('\n'.join(lines)), self.rules.max_entropy)
+        self.assertIsNone(evaluate_file("docs/ja/guide.md", added_patch(lines), self.rules).rule)
+    
+    def test_short_additions_skip_heuristics(self):
+        data = base64.b64encode(random.Random(1).randbytes(300)).decode('ascii')
+        self.assertIsNone(evaluate_file("assets/icon.b64", added_patch([data]), self.rules).rule)
+    
+    def test_patch_size_limit_is_opt_in(self):
+        patch = added_patch(python_source(40))
+        self.assertIsNone(evaluate_file("app/handlers.py", patch, self.rules).rule)
+        rules = self.rules.merge({"max_patch_chars": 100})
+        self.assertEqual(evaluate_file("app/handlers.py", patch, rules).rule, "too_large")
+
+class WhitespaceHunksTest(unittest.TestCase):
+    """strip_whitespace_hunks and the whitespace_only rule"""
+    
+    WHITESPACE_HUNK = "@@ -1,3 +1,3 @@\n def f():\n-    return 1   \n+    return 1\n \n"
+    CODE_HUNK = "@@ -10,2 +10,2 @@\n x = 1\n-y = 2\n+y = 3"
+    REINDENT_HUNK = "@@ -20,2 +20,2 @@\n if a:\n-    b()\n+        b()"
+    
+    def test_whitespace_only_hunks_are_dropped(self):
+        patch, dropped = strip_whitespace_hunks(self.WHITESPACE_HUNK + self.CODE_HUNK)
+        self.assertEqual((patch, dropped), (self.CODE_HUNK, 1))
+    
+    def test_file_with_only_whitespace_changes_is_skipped(self):
+        decision = evaluate_file("docs/readme.md", self.WHITESPACE_HUNK.rstrip('\n'), FileRules())
+        self.assertEqual((decision.patch, decision.rule, decision.dropped_hunks), (None, "whitespace_only", 1))
+    
+    def test_reindenting_counts_in_indent_sensitive_files(self):
+        self.assertEqual(strip_whitespace_hunks(self.REINDENT_HUNK)[1], 1)
+        self.assertEqual(strip_whitespace_hunks(self.REINDENT_HUNK, indent_sensitive=True)[1], 0)
+        self.assertEqual(evaluate_file("app/main.py", self.REINDENT_HUNK, FileRules()).patch, self.REINDENT_HUNK)
+    
+    def test_lines_moved_across_context_are_not_whitespace(self):
+        patch = "@@ -1,3 +1,3 @@\n-a = 1\n b = 2\n+a = 1"
+        self.assertEqual(strip_whitespace_hunks(patch), (patch, 0))
+
+class FileRulesLoaderTest(unittest.TestCase):
+    """FileRulesLoader"""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "file_rules.json")
+        self.loader = FileRulesLoader(self.path, reload_interval=0)
+    
+    def write(self, config):
+        """Write the rules file with a new mtime"""
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(config if isinstance(config, str) else json.dumps(config))
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    
+    def test_missing_file_means_defaults(self):
+        self.assertEqual(self.loader.rules_for("org/repo"), FileRules())
+    
+    def test_entries_apply_in_order_and_reload_on_change(self):
+        self.write({"org/*": {"ignore": ["*.csv"], "max_entropy": 6.0}, "org/repo": {"max_entropy": 5.0}})
+        rules = self.loader.rules_for("org/repo")
+        self.assertEqual((rules.ignore[-1], rules.max_entropy), ("*.csv", 5.0))
+        self.assertEqual(self.loader.rules_for("other/repo"), FileRules())
+        
+        self.write({"org/*": {"enabled": False}})
+        self.assertFalse(self.loader.rules_for("org/repo").enabled)
+    
+    def test_invalid_file_keeps_previous_rules(self):
+        self.write({"org/*": {"max_entropy": 6.0}})
+        self.assertEqual(self.loader.rules_for("org/repo").max_entropy, 6.0)
+        for config in ("{not json", {"org/*": {"unknown_option": 1}}, {"org/*": {"max_entropy": "high"}}):
+            with self.subTest(config=config), self.assertLogs("app.utils.file_rules", "ERROR"):
+                self.write(config)
+                self.assertEqual(self.loader.rules_for("org/repo").max_entropy, 6.0)
+    
+    def test_reload_interval_limits_stat_calls(self):
+        loader = FileRulesLoader(self.path, reload_interval=3600)
+        self.write({"org/*": {"max_entropy": 6.0}})
+        self.assertEqual(loader.rules_for("org/repo").max_entropy, 6.0)
+        self.write({"org/*": {"max_entropy": 4.0}})
+        self.assertEqual(loader.rules_for("org/repo").max_entropy, 6.0)
+        loader._checked = time.monotonic() - 3600
+        self.assertEqual(loader.rules_for("org/repo").max_entropy, 4.0)
+
+if __name__ == "__main__":
+    unittest.main()
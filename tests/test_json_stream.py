@@ -0,0 +1,49 @@
+"""
+Tests for incremental JSON array item parsing
+"""
+import json
+import random
+import unittest
+
+from app.utils.json_stream import JSONArrayItemParser
+
+def feed_in_pieces(document: str, sizes) -> list:
+    """Feed document to a fresh parser in pieces of the given sizes, collecting the items"""
+    parser = JSONArrayItemParser("comments")
+    items = []
+    position = 0
+    for size in sizes:
+        items.extend(parser.feed(document[position:position + size]))
+        position += size
+    items.extend(parser.feed(document[position:]))
+    return items
+
+class JSONArrayItemParserTest(unittest.TestCase):
+    """JSONArrayItemParser"""
+    
+    def test_items_across_random_chunkings(self):
+        comments = [{"line_number": line, "comment": f"c{line} \"quoted\" {{braces}} [brackets]"} for line in range(5)]
+        document = "```json\n" + json.dumps({"comments": comments}) + "\n```"
+        rng = random.Random(0)
+        for _ in range(50):
+            sizes = [rng.randint(1, 15) for _ in range(len(document))]
+            self.assertEqual(feed_in_pieces(document, sizes), comments)
+    
+    def test_objects_under_trailing_keys_are_not_items(self):
+        document = json.dumps({
+            "comments": [{"line_number": 1, "comment": "real"}],
+            "meta": {"inner": {"line_number": 9, "comment": "not a comment"}},
+            "other": [{"line_number": 10, "comment": "not a comment either"}]
+        })
+        self.assertEqual(feed_in_pieces(document, [1] * len(document)), [{"line_number": 1, "comment": "real"}])
+    
+    def test_objects_under_leading_keys_are_not_items(self):
+        document = json.dumps({"meta": {"inner": {"comment": "no"}}, "comments": [{"comment": "yes"}]})
+        self.assertEqual(feed_in_pieces(document, [7] * len(document)), [{"comment": "yes"}])
+    
+    def test_malformed_item_is_skipped(self):
+        document = '{"comments": [{"comment": "a",}, {"comment": "b"}]}'
+        self.assertEqual(feed_in_pieces(document, []), [{"comment": "b"}])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Tests for patch chunking and mapping model line numbers back to the file
+"""
+import unittest
+
+from app.utils.patch_utils import HUNK_HEADER_RE, PatchChunk, commentable_lines, parse_hunks, split_patch
+
+def make_hunk(old_start: int, new_start: int, body: list) -> list:
+    """Hunk header and lines with counts matching the body"""
+    old_count = sum(1 for line in body if not line.startswith('+'))
+    new_count = sum(1 for line in body if not line.startswith('-'))
+    return [f"@@ -{old_start},{old_count} +{new_start},{new_count} @@ def f():"] + body
+
+# Two hunks: lines 1-2 context, 3-22 added, 23 context; then 50 context, 51 deleted, 51-52 added
+PATCH = '\n'.join(
+    make_hunk(1, 1, [" a = 1", " b = 2"] + [f"+value_{n} = compute({n}) + offset" for n in range(20)] + [" c = 3"])
+    + make_hunk(28, 50, [" x = 1", "-y = 2", "+y = 3", "+z = 4"])
+)
+
+class SplitPatchTest(unittest.TestCase):
+    """split_patch and commentable_lines"""
+    
+    def test_small_patch_is_one_unmodified_chunk(self):
+        chunks = split_patch(PATCH, max_tokens=10000)
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0].patch, PATCH)
+        self.assertEqual(chunks[0].new_lines, sorted(commentable_lines(PATCH)))
+    
+    def test_deleted_lines_are_not_commentable(self):
+        lines = commentable_lines(PATCH)
+        self.assertEqual(lines, set(range(1, 24)) | {50, 51, 52})
+    
+    def test_split_chunks_own_every_line_exactly_once(self):
+        chunks = split_patch(PATCH, max_tokens=60, context_lines=2)
+        self.assertGreater(len(chunks), 2)
+        owned = [line for chunk in chunks for line in chunk.new_lines]
+        self.assertEqual(sorted(owned), sorted(commentable_lines(PATCH)))
+        self.assertEqual(len(owned), len(set(owned)))
+    
+    def test_split_chunks_have_consistent_hunk_headers(self):
+        for chunk in split_patch(PATCH, max_tokens=60, context_lines=2):
+            rendered = chunk.patch.split('\n')
+            # Rendered lines and positions stay aligned, so position-style answers map correctly
+            self.assertEqual(len(chunk.positions), len(rendered))
+            hunks = []
+            for raw_line in rendered:
+                match = HUNK_HEADER_RE.match(raw_line)
+                if match:
+                    hunks.append((int(match.group(2)), int(match.group(4)), []))
+                else:
+                    hunks[-1][2].append(raw_line)
+            for old_count, new_count, body in hunks:
+                self.assertEqual(old_count, sum(1 for line in body if not line.startswith('+')))
+                self.assertEqual(new_count, sum(1 for line in body if not line.startswith('-')))
+    
+    def test_split_hunk_carries_borrowed_context_it_does_not_own(self):
+        chunks = split_patch(PATCH, max_tokens=60, context_lines=2)
+        later = chunks[1]
+        first_owned = min(later.new_lines)
+        borrowed = [line for line in later.positions if line is not None and line < first_owned]
+        self.assertEqual(len(borrowed), 2)
+        for line in borrowed:
+            self.assertIn(line, chunks[0].new_lines)
+            self.assertIsNone(later.map_line(line))
+    
+    def test_no_newline_marker_is_skipped(self):
+        patch = '\n'.join(make_hunk(1, 1, [" first", "-old last", "+new last", "\\ No newline at end of file"]))
+        self.assertEqual(commentable_lines(patch), {1, 2})
+        self.assertEqual([line.new_line for _, lines in parse_hunks(patch) for line in lines], [1, None, 2])
+        chunk = split_patch(patch, max_tokens=10000)[0]
+        self.assertEqual(chunk.positions, [None, 1, None, 2, None])
+
+class MapLineTest(unittest.TestCase):
+    """PatchChunk.map_line"""
+    
+    def setUp(self):
+        # Header, a borrowed context line 9, then owned lines 10-12 and a deletion
+        self.chunk = PatchChunk("", new_lines=[10, 11, 12], positions=[None, 9, 10, 11, None, 12])
+    
+    def test_owned_line_maps_to_itself(self):
+        for line in (10, 11, 12):
+            self.assertEqual(self.chunk.map_line(line), line)
+    
+    def test_line_chunk_does_not_own_is_dropped(self):
+        for line in (9, 13, 100, 0, -1):
+            self.assertIsNone(self.chunk.map_line(line))
+    
+    def test_position_inside_chunk_maps_to_its_line(self):
+        self.assertEqual(self.chunk.map_line(3), 10)
+        self.assertEqual(self.chunk.map_line(6), 12)
+        # Positions of the header, borrowed context and deletions own no line
+        self.assertIsNone(self.chunk.map_line(1))
+        self.assertIsNone(self.chunk.map_line(2))
+        self.assertIsNone(self.chunk.map_line(5))
+    
+    def test_empty_chunk_maps_nothing(self):
+        self.assertIsNone(PatchChunk("").map_line(1))
+
+if __name__ == "__main__":
+    unittest.main()
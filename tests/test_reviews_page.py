@@ -0,0 +1,81 @@
+"""
+Tests for keyset pagination of the reviews list
+"""
+import base64
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from app.database import operations
+from app.database.connection import ConnectionPool
+from app.database.operations import DatabaseOperations
+
+class ReviewsPageTest(unittest.TestCase):
+    """DatabaseOperations.get_reviews_page"""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        pool = ConnectionPool(os.path.join(directory.name, "reviews.db"))
+        self.addCleanup(pool.close_all)
+        patcher = mock.patch.object(operations, "connection_pool", pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        DatabaseOperations.init_database()
+        
+        # Three reviews share each timestamp, so pages must break ties on id
+        self.expected = []
+        for index in range(9):
+            repo_name = "org/a" if index % 2 else "org/b"
+            review_id = DatabaseOperations.create_review(f"https://github.com/{repo_name}/pull/{index}", repo_name, index)
+            created_at = f"2024-01-0{1 + index // 3} 00:00:00"
+            with pool.transaction() as cursor:
+                cursor.execute("UPDATE pr_reviews SET created_at = ? WHERE id = ?", (created_at, review_id))
+            self.expected.append((created_at, review_id, repo_name))
+        self.expected.sort(reverse=True)
+    
+    def collect(self, limit: int, **filters) -> list:
+        """Walk every page, returning the review ids in order"""
+        ids = []
+        cursor = None
+        while True:
+            page = DatabaseOperations.get_reviews_page(limit=limit, cursor=cursor, **filters)
+            self.assertLessEqual(len(page["reviews"]), limit)
+            ids.extend(review["id"] for review in page["reviews"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return ids
+    
+    def test_pages_break_created_at_ties_on_id(self):
+        for limit in (1, 2, 3, 4, 9, 20):
+            self.assertEqual(self.collect(limit), [review_id for _, review_id, _ in self.expected])
+    
+    def test_repo_filter_applies_to_every_page(self):
+        expected = [review_id for _, review_id, repo_name in self.expected if repo_name == "org/a"]
+        self.assertEqual(self.collect(2, repo_name="org/a"), expected)
+        self.assertEqual(self.collect(2, repo_name="org/missing"), [])
+    
+    def test_last_page_has_no_cursor(self):
+        page = DatabaseOperations.get_reviews_page(limit=9)
+        self.assertEqual(len(page["reviews"]), 9)
+        self.assertIsNone(page["next_cursor"])
+    
+    def test_cursor_round_trip(self):
+        cursor = DatabaseOperations._encode_cursor("2024-01-02 00:00:00", 5)
+        self.assertEqual(DatabaseOperations._decode_cursor(cursor), ("2024-01-02 00:00:00", 5))
+    
+    def test_invalid_cursors_are_rejected(self):
+        def encoded(text: str) -> str:
+            return base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+        
+        for cursor in (
+            "not base64!", "é", encoded("not json"), encoded("null"), encoded("[1, 2]"), encoded('["x", "1"]'),
+            encoded('["x", 1, 2]'), encoded('{"a": 1}'), base64.urlsafe_b64encode(b"\xff\xfe").decode('ascii')
+        ):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(ValueError):
+                    DatabaseOperations.get_reviews_page(cursor=cursor)
+
+if __name__ == "__main__":
+    unittest.main()
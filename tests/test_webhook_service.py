@@ -0,0 +1,138 @@
+"""
+Tests for webhook signature verification and push debouncing
+"""
+import asyncio
+import hashlib
+import hmac
+import time
+import unittest
+
+from app.services.webhook_service import WebhookDebouncer, verify_signature
+
+PR_URL = "https://github.com/org/repo/pull/7"
+
+def sign(secret: str, body: bytes) -> str:
+    """X-Hub-Signature-256 value GitHub would send"""
+    return "sha256=" + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+class VerifySignatureTest(unittest.TestCase):
+    """verify_signature"""
+    
+    BODY = b'{"action": "synchronize"}'
+    
+    def test_valid_signature_is_accepted(self):
+        self.assertTrue(verify_signature("s3cret", self.BODY, sign("s3cret", self.BODY)))
+    
+    def test_missing_header_or_secret_is_rejected(self):
+        self.assertFalse(verify_signature("s3cret", self.BODY, None))
+        self.assertFalse(verify_signature("s3cret", self.BODY, ""))
+        self.assertFalse(verify_signature("", self.BODY, sign("", self.BODY)))
+        self.assertFalse(verify_signature(None, self.BODY, sign("", self.BODY)))
+    
+    def test_wrong_prefix_is_rejected(self):
+        digest = sign("s3cret", self.BODY).split("=", 1)[1]
+        self.assertFalse(verify_signature("s3cret", self.BODY, digest))
+        self.assertFalse(verify_signature("s3cret", self.BODY, "sha1=" + digest))
+        self.assertFalse(verify_signature("s3cret", self.BODY, "SHA256=" + digest))
+    
+    def test_bad_digest_is_rejected(self):
+        self.assertFalse(verify_signature("s3cret", self.BODY, sign("other", self.BODY)))
+        self.assertFalse(verify_signature("s3cret", self.BODY + b" ", sign("s3cret", self.BODY)))
+        self.assertFalse(verify_signature("s3cret", self.BODY, sign("s3cret", self.BODY)[:-1]))
+
+class FakeReviewQueue:
+    """Records submissions with the time they were made"""
+    
+    def __init__(self):
+        self.submissions = []
+    
+    async def submit(self, pr_url: str, incremental: bool = False, head_sha: str = None):
+        self.submissions.append((time.monotonic(), pr_url, incremental, head_sha))
+        return len(self.submissions), True
+
+class FakeDatabase:
+    """Answers the last reviewed head lookup"""
+    
+    def __init__(self, head_sha: str = None):
+        self.head_sha = head_sha
+    
+    async def get_last_reviewed_head(self, repo_name: str, pr_number: int):
+        return {"head_sha": self.head_sha} if self.head_sha else None
+
+class WebhookDebouncerTest(unittest.IsolatedAsyncioTestCase):
+    """WebhookDebouncer"""
+    
+    WINDOW = 0.1
+    MAX_DELAY = 0.25
+    
+    def make_debouncer(self, reviewed_head: str = None) -> WebhookDebouncer:
+        self.queue = FakeReviewQueue()
+        debouncer = WebhookDebouncer(self.queue, window=self.WINDOW, max_delay=self.MAX_DELAY)
+        debouncer.db_ops = FakeDatabase(reviewed_head)
+        self.addAsyncCleanup(debouncer.stop)
+        return debouncer
+    
+    async def wait_idle(self, debouncer: WebhookDebouncer):
+        """Wait until every debounce window has closed"""
+        await asyncio.gather(*list(debouncer._timers.values()), return_exceptions=True)
+    
+    async def test_burst_is_reviewed_once_at_latest_head(self):
+        debouncer = self.make_debouncer()
+        debouncer.schedule(PR_URL, "org/repo", 7, "sha1", full_review=False)
+        debouncer.schedule(PR_URL, "org/repo", 7, "sha2", full_review=True)
+        debouncer.schedule(PR_URL, "org/repo", 7, "sha3", full_review=False)
+        await self.wait_idle(debouncer)
+        self.assertEqual([submission[1:] for submission in self.queue.submissions], [(PR_URL, False, "sha3")])
+        self.assertEqual((debouncer.received, debouncer.coalesced, debouncer.submitted), (3, 2, 1))
+    
+    async def test_window_restarts_on_each_push(self):
+        debouncer = self.make_debouncer()
+        started = time.monotonic()
+        for head_sha in ("sha1", "sha2", "sha3"):
+            delay = debouncer.schedule(PR_URL, "org/repo", 7, head_sha, full_review=False)
+            self.assertAlmostEqual(delay, self.WINDOW, delta=0.02)
+            await asyncio.sleep(self.WINDOW / 2)
+        last_push = time.monotonic() - self.WINDOW / 2
+        await self.wait_idle(debouncer)
+        submitted_at = self.queue.submissions[0][0]
+        self.assertGreaterEqual(submitted_at, last_push + self.WINDOW - 0.01)
+        self.assertGreater(submitted_at - started, self.WINDOW * 2)
+    
+    async def test_continuous_pushes_are_reviewed_after_max_delay(self):
+        debouncer = self.make_debouncer()
+        started = time.monotonic()
+        index = 0
+        while not self.queue.submissions:
+            self.assertLess(time.monotonic() - started, self.MAX_DELAY * 3, "debounce never fired")
+            debouncer.schedule(PR_URL, "org/repo", 7, f"sha{index}", full_review=False)
+            index += 1
+            await asyncio.sleep(self.WINDOW / 4)
+        submitted_at, _, _, head_sha = self.queue.submissions[0]
+        self.assertAlmostEqual(submitted_at - started, self.MAX_DELAY, delta=self.WINDOW / 2)
+        self.assertNotEqual(head_sha, "sha0")
+    
+    async def test_pull_requests_are_debounced_independently(self):
+        debouncer = self.make_debouncer()
+        debouncer.schedule(PR_URL, "org/repo", 7, "sha1", full_review=False)
+        debouncer.schedule("https://github.com/org/repo/pull/8", "org/repo", 8, "sha2", full_review=True)
+        await self.wait_idle(debouncer)
+        self.assertEqual(sorted(submission[3] for submission in self.queue.submissions), ["sha1", "sha2"])
+    
+    async def test_already_reviewed_head_is_skipped(self):
+        debouncer = self.make_debouncer(reviewed_head="sha1")
+        debouncer.schedule(PR_URL, "org/repo", 7, "sha1", full_review=False)
+        await self.wait_idle(debouncer)
+        self.assertEqual(self.queue.submissions, [])
+        self.assertEqual(debouncer.skipped, 1)
+    
+    async def test_stop_drops_open_windows(self):
+        debouncer = self.make_debouncer()
+        debouncer.schedule(PR_URL, "org/repo", 7, "sha1", full_review=False)
+        with self.assertLogs("app.services.webhook_service", "WARNING"):
+            await debouncer.stop()
+        await asyncio.sleep(self.WINDOW * 1.5)
+        self.assertEqual(self.queue.submissions, [])
+        self.assertEqual(debouncer.stats()["pending"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
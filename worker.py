@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Entry point for review workers, run separately from the API server
+
+Usage:
+    python worker.py --processes 4 --concurrency 8
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+
+from app.config.settings import REVIEW_WORKERS, REVIEW_ORPHAN_GRACE_SECONDS, setup_logging, validate_environment
+
+async def serve(concurrency: int):
+    """Process review jobs until SIGINT or SIGTERM"""
+    from app.database.connection import connection_pool
+    from app.database.async_operations import async_db_ops
+    from app.services.job_service import ReviewJobQueue
+    from app.services.review_service import ReviewService
+    
+    logger = logging.getLogger("worker")
+    await async_db_ops.init_database()
+    interrupted = await async_db_ops.fail_interrupted_reviews(REVIEW_ORPHAN_GRACE_SECONDS)
+    if interrupted:
+        logger.warning(f"Marked {interrupted} interrupted reviews as failed")
+    
+    review_service = ReviewService()
+    review_queue = ReviewJobQueue(review_service, worker_count=concurrency)
+    await review_queue.start()
+    
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    await stopping.wait()
+    
+    # Running reviews are handed back to the queue for another worker
+    await review_queue.stop()
+    await review_service.ai_service.close()
+    async_db_ops.shutdown()
+    connection_pool.close_all()
+    logger.info("Review worker stopped")
+
+def run_worker(concurrency: int):
+    """Run one worker process"""
+    setup_logging()
+    validate_environment()
+    asyncio.run(serve(concurrency))
+
+def main():
+    """Start the requested number of worker processes and wait for them"""
+    parser = argparse.ArgumentParser(description="Process queued PR reviews")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes to run on this host")
+    parser.add_argument("--concurrency", type=int, default=max(1, REVIEW_WORKERS), help="Concurrent reviews per process")
+    args = parser.parse_args()
+    
+    if args.processes <= 1:
+        run_worker(args.concurrency)
+        return
+    
+    # Children get SIGINT from the terminal and SIGTERM forwarded below, and stop on their own
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(args.concurrency,), name=f"review-worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()